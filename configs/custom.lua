@@ -19,10 +19,18 @@ suppress =
 alert_json = 
 {
     file = true,
-    limit = 0,
+    limit = 100,
     fields = 'seconds action dst_addr dst_port msg proto sid rev gid src_addr src_port',
 }
 
+-- alternative to alert_json: alerts are sent as datagrams to
+-- /var/log/snort/snort_alert, run receiver_unixsock.py instead of watcher
+-- alert_unixsock = { }
+
+-- alternative to alert_json: binary unified2.log.<timestamp> files,
+-- run watcher_alert.py --format unified2
+-- unified2 = { limit = 128 }
+
 perf_monitor =
 {
     modules = {},
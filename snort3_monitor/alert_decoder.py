@@ -0,0 +1,126 @@
+import json
+import socket
+import struct
+from typing import NamedTuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+JSON_LIBRARY = 'json' if orjson is None else 'orjson'
+loads = json.loads if orjson is None else orjson.loads
+
+# struct Alertpkt of Snort 3 alert_unixsock with native sizes and alignment:
+# alertmsg[256], pcap_pkthdr (timeval ts, caplen, len), dlthdr, nethdr,
+# transhdr, data, val, pkt[65535], gid, sid, rev, class_id, priority,
+# event_id, event_ref, timeval ref_time
+ALERT_PKT = struct.Struct('@256sllII5I65535x7Ill')
+PKT_OFFSET = struct.calcsize('@256sllII5I')
+NOPACKET_STRUCT = 0x1
+NO_TRANSHDR = 0x2
+PORTS = struct.Struct('!HH')
+IP_PROTOCOLS = {1: 'ICMP', 6: 'TCP', 17: 'UDP', 58: 'ICMP'}
+
+
+class Alert(NamedTuple):
+    """Fields of alert_json line which are used by watcher
+
+    msg and action are needed only to create placeholder Rule
+    for an alert of unknown rule.
+    """
+    seconds: int
+    sid: int
+    rev: int
+    gid: int
+    src_addr: str
+    src_port: int
+    dst_addr: str
+    dst_port: int
+    proto: str
+    msg: str
+    action: str
+
+
+def decode_alert(line: bytes, loads=loads) -> Alert:
+    """Decode one alert_json line into Alert
+
+    Line is decoded as bytes (orjson is used when installed),
+    only fields of Alert are taken from it.
+    Raise KeyError if seconds, sid, rev or gid is missing
+    and ValueError (JSONDecodeError) if line is not valid JSON,
+    a number field is not an integer or an address is not
+    a valid IP address.
+    :param line: Line of alert_json file
+    :param loads: JSON decoding function
+    """
+    data = loads(line)
+    if not isinstance(data, dict):
+        raise KeyError('seconds')
+    get = data.get
+    src_port, dst_port = get('src_port'), get('dst_port')
+    return Alert(
+        check_integer(data['seconds']), check_integer(data['sid']), check_integer(data['rev']),
+        check_integer(data['gid']), check_address(get('src_addr', '')),
+        src_port if src_port is None else check_integer(src_port), check_address(get('dst_addr', '')),
+        dst_port if dst_port is None else check_integer(dst_port), get('proto', ''), get('msg', ''), get('action', ''),
+    )
+
+
+def check_integer(value: int) -> int:
+    """Return value if it is an integer, raise ValueError otherwise"""
+    if type(value) is not int:
+        raise ValueError(f'Not an integer: {value!r}')
+    return value
+
+
+def check_address(address: str) -> str:
+    """Return address if it is empty or valid IPv4 or IPv6 address, raise ValueError otherwise"""
+    if address:
+        try:
+            socket.inet_pton(socket.AF_INET6 if ':' in address else socket.AF_INET, address)
+        except OSError:
+            raise ValueError(f'Invalid IP address: {address!r}') from None
+    return address
+
+
+def decode_alert_packet(datagram: bytes) -> Alert:
+    """Decode Alertpkt datagram of Snort alert_unixsock into Alert
+
+    Addresses, ports and protocol are taken from IP and
+    TCP/UDP headers of the packet, action is not sent by Snort.
+    Raise ValueError if datagram is not Alertpkt.
+    """
+    if len(datagram) != ALERT_PKT.size:
+        raise ValueError(f'Datagram of {len(datagram)} bytes is not Alertpkt.')
+    (alertmsg, ts_sec, _, caplen, _, _, nethdr, transhdr, _, val,
+     gid, sid, rev, _, _, _, _, ref_sec, _) = ALERT_PKT.unpack(datagram)
+    msg = alertmsg.split(b'\0', 1)[0].decode('utf-8', 'replace')
+    if val & NOPACKET_STRUCT or not caplen:
+        return Alert(ref_sec, sid, rev, gid, '', None, '', None, '', msg, '')
+
+    src_addr = dst_addr = proto = ''
+    src_port = dst_port = None
+    ip = PKT_OFFSET + nethdr
+    version = datagram[ip] >> 4
+    if version == 4:
+        protocol = datagram[ip + 9]
+        src_addr = socket.inet_ntop(socket.AF_INET, datagram[ip + 12:ip + 16])
+        dst_addr = socket.inet_ntop(socket.AF_INET, datagram[ip + 16:ip + 20])
+        proto = IP_PROTOCOLS.get(protocol, 'IP')
+    elif version == 6:
+        protocol = datagram[ip + 6]
+        src_addr = socket.inet_ntop(socket.AF_INET6, datagram[ip + 8:ip + 24])
+        dst_addr = socket.inet_ntop(socket.AF_INET6, datagram[ip + 24:ip + 40])
+        proto = IP_PROTOCOLS.get(protocol, 'IP')
+    if proto in ('TCP', 'UDP') and not val & NO_TRANSHDR:
+        src_port, dst_port = PORTS.unpack_from(datagram, PKT_OFFSET + transhdr)
+    return Alert(ts_sec, sid, rev, gid, src_addr, src_port, dst_addr, dst_port, proto, msg, '')
+
+
+def to_text(line) -> str:
+    """Represent undecoded line in messages"""
+    if isinstance(line, bytes):
+        return line.decode('latin-1')
+    return line
@@ -0,0 +1,63 @@
+import argparse
+import logging
+import os
+import statistics
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "snort3_monitor.settings")
+django.setup()
+from rest_framework import generics
+from rest_framework.test import APIRequestFactory
+
+from benchmark_ingest import measure_save, prepare_rules
+from monitor.models import Event
+from monitor.views import EventListUpdate
+from rule.models import Rule
+
+
+logger = logging.getLogger('monitor')
+
+
+class SerializerEventList(EventListUpdate):
+    """Events list serialized by EventSerializer, rule of each event is a query"""
+    list = generics.ListAPIView.list
+
+
+def measure_page(view, params: dict, repeat: int) -> float:
+    """Get median latency of a rendered page of events in milliseconds"""
+    factory = APIRequestFactory()
+    latencies = []
+    for _ in range(repeat):
+        request = factory.get('/api/v1/events/', params)
+        started = time.perf_counter()
+        response = view(request)
+        response.render()
+        latencies.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f'Events list responded {response.status_code}: {response.content[:200]}')
+    return statistics.median(latencies)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure latency of events list pages.')
+    parser.add_argument('--events', type=int, default=100000, help='minimal count of events in database')
+    parser.add_argument('--rules', type=int, default=1000, help='count of distinct rules of synthetic events')
+    parser.add_argument('--page-sizes', type=int, nargs='+', default=[100, 1000], help='page sizes to measure')
+    parser.add_argument('--page', type=int, default=1, help='number of page in page-number mode')
+    parser.add_argument('--repeat', type=int, default=20, help='count of requests per measurement')
+    args = parser.parse_args()
+
+    missing = args.events - Event.objects.filter(mark_as_deleted=False).count()
+    if missing > 0:
+        prepare_rules(args.rules)
+        measure_save(missing, 1000, list(Rule.objects.values_list('id', flat=True)[:args.rules]), use_copy=True)
+        logger.info(f'{missing} synthetic events are added.')
+
+    views = {'EventSerializer': SerializerEventList.as_view(), 'flat rows': EventListUpdate.as_view()}
+    for page_size in args.page_sizes:
+        for mode, params in (('page', {'page': args.page}), ('cursor', {'pagination': 'cursor'})):
+            for name, view in views.items():
+                latency = measure_page(view, {'page_size': page_size, **params}, args.repeat)
+                logger.info(f'{name}, {mode} mode, {page_size} events per page: {latency:.1f} ms.')
@@ -0,0 +1,223 @@
+import argparse
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+
+import django
+from django.db import connection
+from django.utils import timezone
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "snort3_monitor.settings")
+django.setup()
+from alert_decoder import decode_alert, orjson
+from monitor.ingest import EVENT_COLUMNS, copy_events, parse_alerts, parse_unified2
+from monitor.models import Event
+from rule.models import Rule
+from unified2 import pack_event, pack_packet
+from unixsock_harness import PROTOCOL_NUMBERS, build_packet
+from watcher_alert import OnMyWatch, Unified2Watch
+
+
+logger = logging.getLogger('monitor')
+
+
+def prepare_rules(count: int) -> list:
+    """Create synthetic rules if there are not enough of them
+
+    :return: List of (sid, rev, gid) keys
+    """
+    keys = list(Rule.objects.values_list('sid', 'rev', 'gid')[:count])
+    missing = count - len(keys)
+    if missing > 0:
+        first_sid = 9000000
+        new_rules = [Rule(sid=first_sid + i, rev=1, gid=1, action='alert', message=f'Synthetic rule {i}')
+                     for i in range(missing)]
+        Rule.objects.bulk_create(new_rules)
+        keys += [(rule.sid, rule.rev, rule.gid) for rule in new_rules]
+    return keys
+
+
+def generate_alerts(file: str, count: int, keys: list) -> None:
+    """Write synthetic alert_json lines into a file"""
+    protocols = ['TCP', 'UDP', 'ICMP']
+    start = int(time.time()) - count
+    with open(file, 'w') as f:
+        for i in range(count):
+            sid, rev, gid = random.choice(keys)
+            f.write(json.dumps({
+                'seconds': start + i, 'action': 'allow', 'proto': random.choice(protocols),
+                'src_addr': f'10.0.{i % 256}.{i % 200 + 1}', 'src_port': 1024 + i % 60000,
+                'dst_addr': f'192.168.1.{i % 250 + 1}', 'dst_port': 80,
+                'msg': 'Synthetic alert', 'sid': sid, 'rev': rev, 'gid': gid,
+            }) + '\n')
+
+
+def generate_unified2(file: str, count: int, keys: list) -> None:
+    """Write synthetic unified2 file with event and packet record per alert"""
+    protocols = ['TCP', 'UDP', 'ICMP']
+    start = int(time.time()) - count
+    with open(file, 'wb') as f:
+        for i in range(count):
+            sid, rev, gid = random.choice(keys)
+            proto = random.choice(protocols)
+            src_addr, src_port = f'10.0.{i % 256}.{i % 200 + 1}', 1024 + i % 60000
+            dst_addr = f'192.168.1.{i % 250 + 1}'
+            packet, _, _ = build_packet(src_addr, src_port, dst_addr, 80, proto)
+            f.write(pack_event(sid, rev, gid, start + i, src_addr, src_port, dst_addr, 80,
+                               PROTOCOL_NUMBERS[proto], event_id=i))
+            f.write(pack_packet(start + i, packet, event_id=i))
+
+
+def measure_ingest(file: str, batch_size: int, workers: int, watcher_class: type = OnMyWatch) -> float:
+    """Ingest alert file through watcher and return events per second
+
+    Watcher spools into a temporary directory, spool of the
+    running watcher is not touched.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        class BenchmarkWatch(watcher_class):
+            watch_file = file
+            checkpoint_name = 'benchmark'
+            spool_dir = directory
+
+        watcher = BenchmarkWatch(batch_size=batch_size, workers=workers)
+        if workers > 1:
+            watcher.start_pool()
+        watcher.rules.load()
+        started = time.perf_counter()
+        saved = watcher.read_data()
+        elapsed = time.perf_counter() - started
+        watcher.stop_pool()
+    return saved / elapsed
+
+
+def decode_alert_text(line: bytes) -> tuple:
+    """Decode alert line the way watcher did before alert_decoder"""
+    allowed_fields = ('src_addr', 'src_port', 'dst_addr', 'dst_port', 'proto', 'seconds', 'sid', 'rev', 'gid')
+    event_data = json.loads(line.decode('latin-1'))
+    event_data = {key: value for key, value in event_data.items() if key in allowed_fields}
+    return (
+        event_data.pop('seconds'), event_data.pop('sid'), event_data.pop('rev'), event_data.pop('gid'),
+        event_data.get('src_addr', ''), event_data.get('src_port'),
+        event_data.get('dst_addr', ''), event_data.get('dst_port'), event_data.get('proto', ''),
+    )
+
+
+def measure_decoders(count: int) -> dict:
+    """Decode synthetic alert lines with each decoder and return lines per second
+
+    Database is not used.
+    """
+    with tempfile.NamedTemporaryFile(suffix='.txt') as alert_file:
+        generate_alerts(alert_file.name, count, [(1, 1, 1), (2000, 3, 1), (29456, 1, 116)])
+        with open(alert_file.name, 'rb') as f:
+            lines = f.read().splitlines()
+
+    decoders = {
+        'json on latin-1 str, all fields': decode_alert_text,
+        'alert_decoder with json': lambda line: decode_alert(line, json.loads),
+    }
+    if orjson is not None:
+        decoders['alert_decoder with orjson'] = lambda line: decode_alert(line, orjson.loads)
+
+    rates = {}
+    for name, decode in decoders.items():
+        started = time.perf_counter()
+        for line in lines:
+            decode(line)
+        rates[name] = count / (time.perf_counter() - started)
+    return rates
+
+
+def measure_formats(count: int) -> dict:
+    """Parse the same synthetic alerts as alert_json lines and as unified2 records
+
+    Database is not used.
+    :return: Alerts per second of each format
+    """
+    keys = [(1, 1, 1), (2000, 3, 1), (29456, 1, 116)]
+    with tempfile.TemporaryDirectory() as directory:
+        generate_alerts(os.path.join(directory, 'alert_json.txt'), count, keys)
+        generate_unified2(os.path.join(directory, 'unified2.log'), count, keys)
+        with open(os.path.join(directory, 'alert_json.txt'), 'rb') as f:
+            lines = f.read().splitlines()
+        with open(os.path.join(directory, 'unified2.log'), 'rb') as f:
+            records = f.read()
+
+    rates = {}
+    for name, parse in (('alert_json', lambda: parse_alerts(lines)), ('unified2', lambda: parse_unified2(records))):
+        started = time.perf_counter()
+        alerts, _ = parse()
+        rates[name] = len(alerts) / (time.perf_counter() - started)
+    return rates
+
+
+def measure_save(count: int, batch_size: int, rule_ids: list, use_copy: bool) -> float:
+    """Save synthetic events with COPY or bulk_create and return events per second
+
+    Events are built and saved in parts of 100000, building is not measured.
+    """
+    elapsed = 0.0
+    part_size = 100000
+    for part_start in range(0, count, part_size):
+        now = timezone.now()
+        rows = [
+            (random.choice(rule_ids), now, f'10.0.{i % 256}.{i % 200 + 1}', 1024 + i % 60000, '192.168.1.1', 80, 'TCP')
+            for i in range(part_start, min(part_start + part_size, count))
+        ]
+        started = time.perf_counter()
+        if use_copy:
+            copy_events(rows)
+        else:
+            Event.objects.bulk_create([Event(**dict(zip(EVENT_COLUMNS, row))) for row in rows], batch_size=batch_size)
+        elapsed += time.perf_counter() - started
+    return count / elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure alert ingest throughput on a synthetic alert file.')
+    parser.add_argument('--events', type=int, default=50000, help='count of synthetic alerts')
+    parser.add_argument('--rules', type=int, default=1000, help='count of distinct rules in alerts')
+    parser.add_argument('--batch-size', type=int, default=1000, help='count of events per INSERT statement')
+    parser.add_argument('--workers', type=int, default=1, help='count of parser processes of watcher')
+    parser.add_argument('--compare-copy', action='store_true', help='compare COPY with bulk_create')
+    parser.add_argument('--compare-decoders', action='store_true', help='compare alert line decoders only')
+    parser.add_argument('--compare-formats', action='store_true', help='compare parsing of alert_json and unified2')
+    parser.add_argument('--format', choices=['json', 'unified2'], default='json', help='format of alert file to ingest')
+    args = parser.parse_args()
+
+    if args.compare_decoders:
+        for decoder, rate in measure_decoders(args.events).items():
+            logger.info(f'{decoder}: {rate:.0f} lines/sec.')
+        raise SystemExit
+    if args.compare_formats:
+        for alert_format, rate in measure_formats(args.events).items():
+            logger.info(f'Parsing {alert_format}: {rate:.0f} alerts/sec.')
+        raise SystemExit
+
+    # synthetic rules and events go to a test database which is dropped at the end
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        keys = prepare_rules(args.rules)
+        if args.compare_copy:
+            rule_ids = list(Rule.objects.values_list('id', flat=True)[:args.rules])
+            for use_copy in (False, True):
+                rate = measure_save(args.events, args.batch_size, rule_ids, use_copy)
+                logger.info(f'{"COPY" if use_copy else "bulk_create"} of {args.events} events: {rate:.0f} events/sec.')
+                Event.objects.all().delete()
+        elif args.format == 'unified2':
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'unified2.log')
+                generate_unified2(f'{path}.{int(time.time())}', args.events, keys)
+                rate = measure_ingest(path, args.batch_size, args.workers, Unified2Watch)
+            logger.info(f'Ingested {args.events} unified2 events with {args.workers} workers: {rate:.0f} events/sec.')
+        else:
+            with tempfile.NamedTemporaryFile(suffix='.txt') as alert_file:
+                generate_alerts(alert_file.name, args.events, keys)
+                rate = measure_ingest(alert_file.name, args.batch_size, args.workers)
+            logger.info(f'Ingested {args.events} events with {args.workers} workers: {rate:.0f} events/sec.')
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
@@ -1,6 +1,11 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_save
 
 
 class MonitorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'monitor'
+
+    def ready(self):
+        from snort3_monitor.cache import bump_on_save
+        post_save.connect(bump_on_save, sender=self.get_model('Event'))
@@ -0,0 +1,91 @@
+import csv
+import json
+import zlib
+
+from django.db import transaction
+from django.db.models.query import QuerySet
+
+from .serializers import EVENT_ROW_FIELDS, serialize_event_rows
+
+
+# Columns of exported events, the same as EventSerializer fields
+EXPORT_FIELDS = ('id', 'timestamp', 'sid', 'action', 'src_addr', 'src_port', 'dst_addr', 'dst_port', 'proto',
+                 'message')
+
+
+class Line:
+    """File-like object of csv.writer which gives the written line back"""
+
+    @staticmethod
+    def write(value: str) -> str:
+        return value
+
+
+def iter_event_chunks(queryset: QuerySet, chunk_size: int):
+    """Read events of queryset with a server-side cursor
+
+    Rows are fetched chunk_size at a time and serialized like
+    serialize_event_rows with a query of rules for each chunk.
+    Reading is done in a transaction, so PostgreSQL streams the
+    cursor instead of materializing it for WITH HOLD, and the
+    export is a consistent snapshot of events. The transaction
+    lasts as long as the client reads, drop of expired partitions
+    skips partitions locked by it. Closing of the stream before
+    its end rolls the transaction back.
+    """
+    with transaction.atomic():
+        chunk = []
+        for row in queryset.values(*EVENT_ROW_FIELDS).iterator(chunk_size=chunk_size):
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                yield serialize_event_rows(chunk)
+                chunk = []
+        if chunk:
+            yield serialize_event_rows(chunk)
+
+
+def iter_ndjson(chunks):
+    """Encode chunks of rows as JSON objects, one per line"""
+    for rows in chunks:
+        yield ''.join(json.dumps(row, separators=(',', ':')) + '\n' for row in rows).encode()
+
+
+def iter_csv(chunks):
+    """Encode chunks of rows as CSV with a header line"""
+    writer = csv.writer(Line())
+    yield writer.writerow(EXPORT_FIELDS).encode()
+    for rows in chunks:
+        yield ''.join(writer.writerow([row[field] for field in EXPORT_FIELDS]) for row in rows).encode()
+
+
+def iter_gzip(parts):
+    """Compress parts of content into gzip stream on the fly"""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for part in parts:
+        compressed = compressor.compress(part)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+FORMATS = {
+    'ndjson': ('application/x-ndjson', iter_ndjson),
+    'csv': ('text/csv', iter_csv),
+}
+
+
+def export_events(queryset: QuerySet, output: str, compress: bool, chunk_size: int) -> tuple:
+    """Get content type, file name and stream of exported events
+
+    Memory use does not depend on count of events, only one
+    chunk of them is kept at a time.
+    :param output: Format of export, ndjson or csv
+    :param compress: Compress with gzip
+    :return: Content type, file name, iterator of bytes
+    """
+    content_type, encode = FORMATS[output]
+    filename = f'events.{output}'
+    stream = encode(iter_event_chunks(queryset, chunk_size))
+    if compress:
+        return 'application/gzip', f'{filename}.gz', iter_gzip(stream)
+    return content_type, filename, stream
@@ -0,0 +1,356 @@
+import io
+import json
+import logging
+import time
+from datetime import datetime, timezone
+
+from django.db import DataError, IntegrityError, connection, transaction
+from django.db.models import F
+from django.http import Http404
+
+from alert_decoder import Alert, decode_alert, to_text
+from monitor.models import DeadLetter, Event, LogCheckpoint, ProtocolField
+from rule.models import Rule
+from snort3_monitor.cache import bump_data_version
+from unified2 import decode_events
+
+
+logger = logging.getLogger('monitor')
+COPY_THRESHOLD = 500
+EVENT_COLUMNS = ('rule_id', 'timestamp', 'src_addr', 'src_port', 'dst_addr', 'dst_port', 'proto')
+# errors of values which database does not take, psycopg2 raises
+# ValueError for strings with NUL characters
+DATA_ERRORS = (DataError, ValueError)
+
+
+class RuleCache:
+    """Process-local map of (sid, rev, gid) to Rule id
+
+    Warmed with all rules at start, so ingesting an alert
+    does not cost a SELECT. When a key is missed, the whole
+    map is reloaded (rules dump adds them in bulk), but not
+    more often than min_reload_interval seconds. Keys which
+    are still missing after reload are remembered for
+    negative_ttl seconds and do not cause reloads meanwhile.
+    """
+
+    def __init__(self, min_reload_interval: float = 5.0, negative_ttl: float = 60.0):
+        self.rules = {}
+        self.missing = {}
+        self.min_reload_interval = min_reload_interval
+        self.negative_ttl = negative_ttl
+        self.loaded_at = None
+
+    def load(self):
+        """Load all rules keys from database"""
+        self.rules = {
+            (sid, rev, gid): pk
+            for pk, sid, rev, gid in Rule.objects.values_list('id', 'sid', 'rev', 'gid')
+        }
+        self.loaded_at = time.monotonic()
+        logger.info(f'Rule cache loaded {len(self.rules)} rules.')
+
+    def get_rule_id(self, sid: int, rev: int, gid: int) -> int:
+        """Get id of Rule, reloading cache on miss
+
+        Raise Http404 like Rule.get_rule when rule does not exist.
+        """
+        key = (sid, rev, gid)
+        rule_id = self.rules.get(key)
+        if rule_id is not None:
+            return rule_id
+        if not self.is_known_missing(key) and self.is_reload_allowed():
+            self.load()
+            rule_id = self.rules.get(key)
+        if rule_id is None:
+            self.missing.setdefault(key, time.monotonic())
+            raise Http404(f'There is no Rule with sid {sid}, rev {rev} and gid {gid}.')
+        return rule_id
+
+    def is_known_missing(self, key: tuple) -> bool:
+        """Check if key was missing in database recently"""
+        missed_at = self.missing.get(key)
+        if missed_at is None:
+            return False
+        if time.monotonic() - missed_at >= self.negative_ttl:
+            del self.missing[key]
+            return False
+        return True
+
+    def is_reload_allowed(self) -> bool:
+        """Check if enough time passed since last load"""
+        if self.loaded_at is None:
+            return True
+        return time.monotonic() - self.loaded_at >= self.min_reload_interval
+
+    def call_with_reload(self, func, *args):
+        """Call func, again with reloaded cache if rules of cache were deleted
+
+        update_rules deletes replaced rules, which cached ids can
+        point to, events of such ids fail with IntegrityError.
+        """
+        try:
+            return func(*args)
+        except IntegrityError as e:
+            logger.warning(f'Rule cache is outdated, it is reloaded: {e}')
+            self.load()
+            return func(*args)
+
+    def provision(self, sid: int, rev: int, gid: int, message: str, action: str) -> int:
+        """Get id of Rule, creating placeholder Rule if it does not exist
+
+        Placeholder is made from msg and action of the alert
+        and is filled in by the next rules dump.
+        :return: Id of Rule
+        """
+        key = (sid, rev, gid)
+        # (sid, gid, rev) is unique, so concurrent watchers get the same rule
+        defaults = {'action': (action or '')[:50], 'message': message, 'placeholder': True}
+        rule, created = Rule.objects.get_or_create(sid=sid, rev=rev, gid=gid, defaults=defaults)
+        rule_id = rule.id
+        if created:
+            logger.info(f'Placeholder Rule created for sid {sid}, rev {rev}, gid {gid}.')
+        self.rules[key] = rule_id
+        self.missing.pop(key, None)
+        return rule_id
+
+
+def parse_alert(line) -> tuple:
+    """Parse alert line into alert row
+
+    :param line: Line of alert_json file, bytes or str
+    :return: Alert row (timestamp, sid, rev, gid, src_addr, src_port,
+    dst_addr, dst_port, proto, msg, action) and None, or None and
+    DeadLetter reason if line is rejected
+    """
+    try:
+        return make_alert_row(decode_alert(line)), None
+    except (KeyError, TypeError):
+        return None, DeadLetter.Reason.INCOMPLETE
+    except (ValueError, OverflowError, OSError):
+        # seconds out of range of datetime
+        return None, DeadLetter.Reason.DECODE
+
+
+def make_alert_row(alert: Alert) -> tuple:
+    """Make alert row of decoded Alert, with timestamp instead of seconds"""
+    return (datetime.fromtimestamp(alert.seconds, timezone.utc),) + alert[1:]
+
+
+def parse_alerts(lines: list) -> tuple:
+    """Parse alert lines into compact rows
+
+    Does not touch database, so it can run in parser workers.
+    :param lines: Lines of alert_json file, bytes or str
+    :return: List of alert rows (see parse_alert) and list of
+    rejected lines as (reason, line) pairs
+    """
+    alerts = []
+    rejected = []
+    for line in lines:
+        alert, reason = parse_alert(line)
+        if reason is None:
+            alerts.append(alert)
+        else:
+            rejected.append((reason, to_text(line)))
+    return alerts, rejected
+
+
+def parse_unified2(data: bytes) -> tuple:
+    """Parse unified2 records into alert rows like parse_alerts
+
+    Only event records are taken, packet and extra-data
+    records carry nothing which is stored for events.
+    :param data: Complete unified2 records
+    :return: List of alert rows and list of rejected records
+    as (reason, description) pairs
+    """
+    alerts, errors = decode_events(data)
+    rejected = [(DeadLetter.Reason.DECODE,
+                 f'Unified2 record of type {record_type}, {len(body)} bytes: {body[:64].hex()}')
+                for record_type, body in errors]
+    return [make_alert_row(alert) for alert in alerts], rejected
+
+
+def dump_alert(alert: tuple) -> str:
+    """Represent alert row as alert_json line for dead-letter table"""
+    timestamp, sid, rev, gid, src_addr, src_port, dst_addr, dst_port, proto, msg, action = alert
+    return json.dumps({
+        'seconds': int(timestamp.timestamp()), 'action': action, 'dst_addr': dst_addr, 'dst_port': dst_port,
+        'msg': msg, 'proto': proto, 'sid': sid, 'rev': rev, 'gid': gid, 'src_addr': src_addr, 'src_port': src_port,
+    })
+
+
+def save_events(rows: list, batch_size: int, checkpoint_name: str = None, checkpoint=None,
+                copy_threshold: int = COPY_THRESHOLD, rejected: list = ()) -> int:
+    """Insert events in one transaction
+
+    Batches bigger than copy_threshold are streamed with COPY
+    on PostgreSQL, smaller ones are saved with bulk_create.
+    Checkpoint (position in log file after these events) and
+    rejected lines are saved in the same transaction, so events
+    are stored exactly once and no line is lost. NUL characters
+    of rejected lines are escaped, text columns can not keep them.
+    Deferred foreign keys of events are checked before the end of
+    the block, so events of deleted rules raise IntegrityError
+    here even inside an outer transaction.
+    :param rows: Tuples of event values in order of EVENT_COLUMNS
+    :param batch_size: Count of rows per INSERT statement
+    :param checkpoint_name: Name of LogCheckpoint to update
+    :param checkpoint: tailer.Checkpoint after the events
+    :param copy_threshold: Minimal count of events to use COPY
+    :param rejected: (reason, line) pairs to save as DeadLetter
+    :return: Count of saved events
+    """
+    if not rows and not rejected and checkpoint is None:
+        return 0
+    with transaction.atomic():
+        if len(rows) >= copy_threshold and connection.vendor == 'postgresql':
+            copy_events(rows)
+        else:
+            events = [Event(**dict(zip(EVENT_COLUMNS, row))) for row in rows]
+            Event.objects.bulk_create(events, batch_size=batch_size)
+        if rows:
+            check_constraints()
+            bump_data_version(Event)
+        if rejected:
+            DeadLetter.objects.bulk_create([DeadLetter(reason=reason, line=line.replace('\x00', '\\x00'))
+                                            for reason, line in rejected], batch_size=batch_size)
+        if checkpoint is not None:
+            LogCheckpoint.save_position(checkpoint_name, checkpoint.to_dict())
+    return len(rows)
+
+
+def check_constraints() -> None:
+    """Check deferred constraints of the transaction now, on PostgreSQL"""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+            cursor.execute('SET CONSTRAINTS ALL DEFERRED')
+
+
+def reprocess_dead_letters(rules: RuleCache, batch_size: int = 1000, reason: str = None,
+                           provision_rules: bool = True) -> tuple:
+    """Save dead letters which can be parsed now as events
+
+    Letters are walked once in order of id, batch by batch,
+    each batch in its own transaction: reprocessed letters are
+    deleted, others stay with increased count of attempts.
+    If database rejects values of a batch, its letters are
+    reprocessed one by one and only rejected letters stay.
+    :param rules: Rule cache to map alerts to rules
+    :param batch_size: Count of letters per batch
+    :param reason: Reprocess only letters with this reason
+    :param provision_rules: Create placeholder Rule for unknown rules
+    :return: Count of saved events and count of letters left
+    """
+    letters = DeadLetter.objects.order_by('id')
+    if reason is not None:
+        letters = letters.filter(reason=reason)
+
+    saved = 0
+    left = 0
+    last_id = 0
+    while True:
+        batch = list(letters.filter(id__gt=last_id).values_list('id', 'line')[:batch_size])
+        if not batch:
+            return saved, left
+        last_id = batch[-1][0]
+
+        try:
+            batch_saved, done = rules.call_with_reload(save_dead_letters, batch, rules, batch_size, provision_rules)
+        except DATA_ERRORS as e:
+            logger.error(f'Database rejected values of dead letters {batch[0][0]}-{last_id}, '
+                         f'they are reprocessed one by one: {e}')
+            # placeholder rules made for the batch are rolled back
+            rules.load()
+            batch_saved, done = save_dead_letters_one_by_one(batch, rules, batch_size, provision_rules)
+
+        done_ids = set(done)
+        failed = [letter_id for letter_id, _ in batch if letter_id not in done_ids]
+        DeadLetter.objects.filter(id__in=failed).update(attempts=F('attempts') + 1)
+        saved += batch_saved
+        left += len(failed)
+
+
+def save_dead_letters(batch: list, rules: RuleCache, batch_size: int, provision_rules: bool) -> tuple:
+    """Save dead letters of batch which can be parsed now as events
+
+    Saved letters are deleted in the same transaction.
+    :param batch: (id, line) pairs of letters
+    :return: Count of saved events and ids of saved letters
+    """
+    rows = []
+    done = []
+    with transaction.atomic():
+        for letter_id, line in batch:
+            alert, _ = parse_alert(line)
+            if alert is None:
+                continue
+            timestamp, sid, rev, gid, src_addr, src_port, dst_addr, dst_port, proto, msg, action = alert
+            try:
+                rule_id = rules.get_rule_id(sid, rev, gid)
+            except Http404:
+                if not provision_rules:
+                    continue
+                rule_id = rules.provision(sid, rev, gid, msg, action)
+            rows.append((rule_id, timestamp, src_addr, src_port, dst_addr, dst_port, proto))
+            done.append(letter_id)
+        save_events(rows, batch_size)
+        DeadLetter.objects.filter(id__in=done).delete()
+    return len(rows), done
+
+
+def save_dead_letters_one_by_one(batch: list, rules: RuleCache, batch_size: int, provision_rules: bool) -> tuple:
+    """Save dead letters like save_dead_letters, each in its own transaction"""
+    saved = 0
+    done = []
+    for letter in batch:
+        try:
+            letter_saved, letter_done = rules.call_with_reload(save_dead_letters, [letter], rules, batch_size,
+                                                               provision_rules)
+        except DATA_ERRORS as e:
+            logger.error(f'Database rejected values of dead letter {letter[0]}: {e}')
+            rules.load()
+            continue
+        saved += letter_saved
+        done += letter_done
+    return saved, done
+
+
+def copy_events(rows: list) -> None:
+    """Stream events into Event table with COPY FROM STDIN (CSV)
+
+    Values are converted like fields of Event do: empty
+    addresses are NULL, protocol names are stored as codes.
+    :param rows: Tuples of event values in order of EVENT_COLUMNS
+    """
+    get_code = ProtocolField.get_code
+    buffer = io.StringIO()
+    for rule_id, timestamp, src_addr, src_port, dst_addr, dst_port, proto in rows:
+        buffer.write(','.join(map(format_csv_value, (rule_id, timestamp, src_addr or None, src_port,
+                                                     dst_addr or None, dst_port, get_code(proto)))))
+        buffer.write(',f\n')
+    buffer.seek(0)
+
+    columns = ', '.join(EVENT_COLUMNS + ('mark_as_deleted',))
+    sql = f'COPY {Event._meta.db_table} ({columns}) FROM STDIN WITH (FORMAT csv)'
+    with connection.cursor() as cursor:
+        cursor.copy_expert(sql, buffer)
+
+
+def format_csv_value(value) -> str:
+    """Format value for COPY in CSV format
+
+    Unquoted empty value is NULL, strings are always quoted,
+    so empty string stays empty string.
+    """
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, int):
+        return str(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return '"' + str(value).replace('"', '""') + '"'
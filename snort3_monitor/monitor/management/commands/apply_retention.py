@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from monitor.partitions import drop_expired_partitions
+from snort3_monitor.retention import apply_retention
+
+
+class Command(BaseCommand):
+    help = 'Delete rows which are not kept by RETENTION_POLICIES in small chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=settings.RETENTION_CHUNK_SIZE,
+                            help='count of rows deleted in one transaction')
+        parser.add_argument('--pause', type=float, default=settings.RETENTION_PAUSE,
+                            help='seconds to wait between chunks')
+
+    def handle(self, *args, **options):
+        # expired partitions go first, so only rows of default partition are deleted one by one
+        dropped = drop_expired_partitions(settings.EVENT_RETENTION_DAYS)
+        report = apply_retention(chunk_size=options['chunk_size'], pause=options['pause'])
+        for policy in report:
+            self.stdout.write(f'{policy["model"]}: {policy["deleted"]} rows deleted in {policy["seconds"]:.1f} sec.')
+        total = sum(policy['seconds'] for policy in report)
+        self.stdout.write(f'{len(dropped)} event partitions dropped, '
+                          f'{sum(policy["deleted"] for policy in report)} rows deleted in {total:.1f} sec.')
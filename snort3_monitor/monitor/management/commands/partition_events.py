@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from monitor.partitions import create_partitions, drop_expired_partitions
+
+
+class Command(BaseCommand):
+    help = 'Create partitions of events for the next days and drop expired ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=7, help='count of days to create partitions for')
+        parser.add_argument('--retention', type=int, default=settings.EVENT_RETENTION_DAYS,
+                            help='count of days to keep events for')
+
+    def handle(self, *args, **options):
+        created = create_partitions(options['ahead'])
+        dropped = drop_expired_partitions(options['retention'])
+        self.stdout.write(f'{len(created)} partitions created, {len(dropped)} partitions dropped.')
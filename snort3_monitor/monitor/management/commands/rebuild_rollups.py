@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from monitor.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Count hourly rollups of events again, after events were changed bypassing triggers.'
+
+    def handle(self, *args, **options):
+        counted = rebuild_rollups()
+        self.stdout.write(f'Rollups are rebuilt from {counted} events.')
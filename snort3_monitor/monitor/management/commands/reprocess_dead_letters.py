@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from monitor.ingest import RuleCache, reprocess_dead_letters
+from monitor.models import DeadLetter
+
+
+class Command(BaseCommand):
+    help = 'Save rejected alert lines as events once the cause of rejection is fixed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reason', choices=DeadLetter.Reason.values, help='reprocess only letters of this reason')
+        parser.add_argument('--batch-size', type=int, default=1000, help='count of letters per transaction')
+        parser.add_argument('--no-provision', action='store_true',
+                            help='keep alerts of unknown rules instead of creating placeholder rules')
+
+    def handle(self, *args, **options):
+        rules = RuleCache()
+        rules.load()
+        saved, left = reprocess_dead_letters(rules, options['batch_size'], options['reason'],
+                                             provision_rules=not options['no_provision'])
+        self.stdout.write(f'{saved} events saved, {left} dead letters left.')
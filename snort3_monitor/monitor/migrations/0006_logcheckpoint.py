@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0005_alter_event_rule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LogCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=128, unique=True)),
+                ('device', models.BigIntegerField(default=0)),
+                ('inode', models.BigIntegerField(default=0)),
+                ('offset', models.BigIntegerField(default=0)),
+                ('fingerprint', models.CharField(blank=True, default='', max_length=40)),
+            ],
+        ),
+    ]
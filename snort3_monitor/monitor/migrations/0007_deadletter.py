@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0006_logcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeadLetter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('line', models.TextField()),
+                ('reason', models.CharField(choices=[
+                    ('decode', 'There is decoding error'),
+                    ('incomplete', 'Event has no full required information'),
+                    ('no_rule', 'There is no Rule matches with event'),
+                ], max_length=16)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('attempts', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,63 @@
+from django.db import migrations
+
+
+PARTITION_EVENT = '''
+ALTER TABLE monitor_event RENAME TO monitor_event_default;
+ALTER TABLE monitor_event_default DROP CONSTRAINT monitor_event_pkey;
+ALTER INDEX monitor_event_rule_id_10ee2728 RENAME TO monitor_event_default_rule_id;
+ALTER TABLE monitor_event_default
+    RENAME CONSTRAINT monitor_event_rule_id_10ee2728_fk_rule_rule_id TO monitor_event_default_rule_id_fk;
+
+ALTER TABLE monitor_event_default ALTER COLUMN id DROP IDENTITY;
+CREATE SEQUENCE monitor_event_id_seq AS bigint;
+SELECT setval('monitor_event_id_seq', COALESCE(max(id), 0) + 1, false) FROM monitor_event_default;
+
+CREATE TABLE monitor_event (
+    id bigint NOT NULL DEFAULT nextval('monitor_event_id_seq'),
+    "timestamp" timestamp with time zone NOT NULL,
+    src_addr varchar(128) NOT NULL,
+    src_port integer NULL,
+    dst_addr varchar(128) NOT NULL,
+    dst_port integer NULL,
+    proto varchar(128) NOT NULL,
+    mark_as_deleted boolean NOT NULL,
+    rule_id bigint NOT NULL,
+    CONSTRAINT monitor_event_pkey PRIMARY KEY (id, "timestamp")
+) PARTITION BY RANGE ("timestamp");
+ALTER SEQUENCE monitor_event_id_seq OWNED BY monitor_event.id;
+CREATE INDEX monitor_event_rule_id_10ee2728 ON monitor_event (rule_id);
+ALTER TABLE monitor_event ADD CONSTRAINT monitor_event_rule_id_10ee2728_fk_rule_rule_id
+    FOREIGN KEY (rule_id) REFERENCES rule_rule (id) DEFERRABLE INITIALLY DEFERRED;
+ALTER TABLE monitor_event ATTACH PARTITION monitor_event_default DEFAULT;
+'''
+
+UNPARTITION_EVENT = '''
+CREATE TABLE monitor_event_plain (LIKE monitor_event);
+INSERT INTO monitor_event_plain SELECT * FROM monitor_event;
+DROP TABLE monitor_event;
+ALTER TABLE monitor_event_plain RENAME TO monitor_event;
+ALTER TABLE monitor_event ADD CONSTRAINT monitor_event_pkey PRIMARY KEY (id);
+ALTER TABLE monitor_event ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY;
+SELECT setval(pg_get_serial_sequence('monitor_event', 'id'), COALESCE(max(id), 0) + 1, false) FROM monitor_event;
+CREATE INDEX monitor_event_rule_id_10ee2728 ON monitor_event (rule_id);
+ALTER TABLE monitor_event ADD CONSTRAINT monitor_event_rule_id_10ee2728_fk_rule_rule_id
+    FOREIGN KEY (rule_id) REFERENCES rule_rule (id) DEFERRABLE INITIALLY DEFERRED;
+'''
+
+
+class Migration(migrations.Migration):
+    """Turn Event table into range partitions by timestamp
+
+    Existing table becomes the default partition, so its rows
+    are not copied. Primary key of partitioned table has to
+    include timestamp, ids still come from one sequence.
+    """
+
+    dependencies = [
+        ('monitor', '0007_deadletter'),
+        ('rule', '0004_rule_placeholder'),
+    ]
+
+    operations = [
+        migrations.RunSQL(PARTITION_EVENT, UNPARTITION_EVENT),
+    ]
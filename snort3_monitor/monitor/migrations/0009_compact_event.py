@@ -0,0 +1,165 @@
+from django.db import migrations, models, transaction
+
+import monitor.models
+
+
+BATCH_SIZE = 50000
+CODES = monitor.models.ProtocolField.CODES
+PROTOCOL_CODE = 'CASE upper(proto) {} ELSE {} END'.format(
+    ' '.join(f"WHEN '{name}' THEN {code}" for name, code in CODES.items()), CODES['OTHER'])
+PROTOCOL_NAME = 'CASE proto_code {} END'.format(
+    ' '.join(f"WHEN {code} THEN '{name}'" for name, code in CODES.items()))
+TO_INET = '''
+CREATE FUNCTION pg_temp.to_inet(address text) RETURNS inet AS $$
+BEGIN
+    RETURN NULLIF(address, '')::inet;
+EXCEPTION WHEN invalid_text_representation THEN
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql IMMUTABLE
+'''
+COPY_COLUMNS = ('UPDATE monitor_event SET src_inet = pg_temp.to_inet(src_addr), '
+                f'dst_inet = pg_temp.to_inet(dst_addr), proto_code = {PROTOCOL_CODE} ')
+
+
+def copy_columns(connection) -> int:
+    """Fill new columns in batches of ids, each batch is committed on its own
+
+    Addresses which are not valid IP addresses become NULL.
+    :return: The last copied id, None if there are no events
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(TO_INET)
+        cursor.execute('SELECT min(id), max(id) FROM monitor_event')
+        first, last = cursor.fetchone()
+        if first is None:
+            return None
+        for start in range(first, last + 1, BATCH_SIZE):
+            cursor.execute(COPY_COLUMNS + 'WHERE id >= %s AND id < %s', [start, start + BATCH_SIZE])
+    return last
+
+
+def copy_columns_back(connection):
+    """Fill old text columns from new ones"""
+    with connection.cursor() as cursor:
+        cursor.execute("UPDATE monitor_event SET src_addr = COALESCE(host(src_inet), ''), "
+                       f"dst_addr = COALESCE(host(dst_inet), ''), proto = {PROTOCOL_NAME}")
+
+
+class SwapColumns(migrations.SeparateDatabaseAndState):
+    """Copy old columns into new ones and replace old columns by them
+
+    Events saved while batches are copied are copied again with the
+    replacement in one transaction under SHARE lock, which holds off
+    inserts, so no event is left with empty new columns.
+    """
+
+    def __init__(self, operations: list):
+        super().__init__(database_operations=operations, state_operations=operations)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        connection = schema_editor.connection
+        last = copy_columns(connection)
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute('LOCK TABLE monitor_event IN SHARE MODE')
+                if last is not None:
+                    cursor.execute(COPY_COLUMNS + 'WHERE id > %s', [last])
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        with transaction.atomic(using=schema_editor.connection.alias):
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+            copy_columns_back(schema_editor.connection)
+
+    def describe(self):
+        return 'Copy old columns of event into new ones and replace old columns by them'
+
+
+class Migration(migrations.Migration):
+    """Store addresses as inet and protocol as small integer
+
+    New columns are added next to old ones and filled in batches,
+    so the table is not rewritten under an exclusive lock.
+    """
+    atomic = False
+
+    dependencies = [
+        ('monitor', '0008_partition_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='src_inet',
+            field=models.GenericIPAddressField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='dst_inet',
+            field=models.GenericIPAddressField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='proto_code',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        # old columns are added back with a default when the migration is reversed
+        migrations.AlterField(
+            model_name='event',
+            name='src_addr',
+            field=models.CharField(default='', max_length=128),
+        ),
+        migrations.AlterField(
+            model_name='event',
+            name='dst_addr',
+            field=models.CharField(default='', max_length=128),
+        ),
+        migrations.AlterField(
+            model_name='event',
+            name='proto',
+            field=models.CharField(default='', max_length=128),
+        ),
+        SwapColumns([
+            migrations.RemoveField(
+                model_name='event',
+                name='src_addr',
+            ),
+            migrations.RemoveField(
+                model_name='event',
+                name='dst_addr',
+            ),
+            migrations.RemoveField(
+                model_name='event',
+                name='proto',
+            ),
+            migrations.RenameField(
+                model_name='event',
+                old_name='src_inet',
+                new_name='src_addr',
+            ),
+            migrations.RenameField(
+                model_name='event',
+                old_name='dst_inet',
+                new_name='dst_addr',
+            ),
+            migrations.RenameField(
+                model_name='event',
+                old_name='proto_code',
+                new_name='proto',
+            ),
+            migrations.AlterField(
+                model_name='event',
+                name='proto',
+                field=monitor.models.ProtocolField(default=''),
+            ),
+        ]),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['src_addr'], name='monitor_event_src_addr'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['dst_addr'], name='monitor_event_dst_addr'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:43
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0009_compact_event'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deadletter',
+            index=models.Index(fields=['reason', 'id'], name='monitor_deadletter_reason_id'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('mark_as_deleted', False)), fields=['id'],
+                               name='monitor_event_not_deleted'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['timestamp'], name='monitor_event_timestamp_brin'),
+        ),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:54
+
+from django.db import migrations, models
+
+
+# rows added to (sign 1) and removed from (sign -1) counts by a statement
+CHANGES = {
+    'insert': 'SELECT "timestamp", rule_id, src_addr, dst_addr, 1 AS sign FROM new_rows WHERE NOT mark_as_deleted',
+    'delete': 'SELECT "timestamp", rule_id, src_addr, dst_addr, -1 AS sign FROM old_rows WHERE NOT mark_as_deleted',
+}
+CHANGES['update'] = f"{CHANGES['insert']} UNION ALL {CHANGES['delete']}"
+TRANSITION_TABLES = {
+    'insert': 'NEW TABLE AS new_rows',
+    'delete': 'OLD TABLE AS old_rows',
+    'update': 'OLD TABLE AS old_rows NEW TABLE AS new_rows',
+}
+
+
+def upsert_rollups(changes: str) -> str:
+    """Get SQL adding counts of changed events to rollups
+
+    Keys are upserted in order, so concurrent statements
+    lock rollup rows in the same order.
+    """
+    return f"""
+        INSERT INTO monitor_sidrollup (bucket, sid, count)
+        SELECT date_trunc('hour', c."timestamp", 'UTC'), r.sid, SUM(c.sign)
+        FROM ({changes}) c JOIN rule_rule r ON r.id = c.rule_id
+        GROUP BY 1, 2 HAVING SUM(c.sign) <> 0 ORDER BY 1, 2
+        ON CONFLICT (bucket, sid) DO UPDATE SET count = monitor_sidrollup.count + EXCLUDED.count;
+        INSERT INTO monitor_addressrollup (bucket, src_addr, dst_addr, count)
+        SELECT date_trunc('hour', c."timestamp", 'UTC'), COALESCE(HOST(c.src_addr), ''),
+               COALESCE(HOST(c.dst_addr), ''), SUM(c.sign)
+        FROM ({changes}) c
+        GROUP BY 1, 2, 3 HAVING SUM(c.sign) <> 0 ORDER BY 1, 2, 3
+        ON CONFLICT (bucket, src_addr, dst_addr) DO UPDATE SET count = monitor_addressrollup.count + EXCLUDED.count;
+    """
+
+
+def create_triggers() -> str:
+    """Get SQL of statement triggers keeping rollups of Event table"""
+    sql = []
+    for operation, changes in CHANGES.items():
+        sql.append(f"""
+            CREATE FUNCTION monitor_event_rollup_{operation}() RETURNS trigger LANGUAGE plpgsql AS $$
+            BEGIN
+                {upsert_rollups(changes)}
+                RETURN NULL;
+            END $$;
+            CREATE TRIGGER monitor_event_rollup_{operation} AFTER {operation.upper()} ON monitor_event
+            REFERENCING {TRANSITION_TABLES[operation]} FOR EACH STATEMENT
+            EXECUTE FUNCTION monitor_event_rollup_{operation}();
+        """)
+    return '\n'.join(sql)
+
+
+def drop_triggers() -> str:
+    """Get SQL dropping triggers of rollups"""
+    return '\n'.join(f'DROP TRIGGER monitor_event_rollup_{operation} ON monitor_event; '
+                     f'DROP FUNCTION monitor_event_rollup_{operation}();' for operation in CHANGES)
+
+
+# triggers lock the table from writes till commit, so no event is counted twice or missed
+BACKFILL = upsert_rollups(
+    'SELECT "timestamp", rule_id, src_addr, dst_addr, 1 AS sign FROM monitor_event WHERE NOT mark_as_deleted'
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0010_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AddressRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('src_addr', models.CharField(blank=True, max_length=39)),
+                ('dst_addr', models.CharField(blank=True, max_length=39)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SidRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('sid', models.IntegerField()),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='sidrollup',
+            constraint=models.UniqueConstraint(fields=('bucket', 'sid'), name='monitor_sidrollup_bucket_sid'),
+        ),
+        migrations.AddConstraint(
+            model_name='addressrollup',
+            constraint=models.UniqueConstraint(fields=('bucket', 'src_addr', 'dst_addr'),
+                                               name='monitor_addressrollup_bucket_addrs'),
+        ),
+        migrations.RunSQL(create_triggers(), drop_triggers()),
+        migrations.RunSQL(BACKFILL, migrations.RunSQL.noop),
+    ]
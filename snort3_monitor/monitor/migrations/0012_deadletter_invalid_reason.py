@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0011_rollups'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='deadletter',
+            name='reason',
+            field=models.CharField(choices=[
+                ('decode', 'There is decoding error'),
+                ('incomplete', 'Event has no full required information'),
+                ('no_rule', 'There is no Rule matches with event'),
+                ('invalid', 'Database rejected values of event'),
+            ], max_length=16),
+        ),
+    ]
@@ -1,14 +1,154 @@
+from django.contrib.postgres.indexes import BrinIndex
 from django.db import models
+from django.db.models import Lookup
 
 from rule.models import Rule
 
 
+class ProtocolField(models.PositiveSmallIntegerField):
+    """Name of protocol stored as small integer code
+
+    Codes are IANA protocol numbers, Snort pseudo protocols
+    get codes from 250. Unknown names are stored as OTHER.
+    """
+    CODES = {'': 0, 'ICMP': 1, 'TCP': 6, 'UDP': 17, 'IP': 250, 'PDU': 251, 'FILE': 252, 'STREAM': 253, 'USER': 254,
+             'OTHER': 255}
+    NAMES = {code: name for name, code in CODES.items()}
+
+    @classmethod
+    def get_code(cls, name: str) -> int:
+        """Get code of protocol name"""
+        return cls.CODES.get(str(name).upper(), cls.CODES['OTHER'])
+
+    def from_db_value(self, value, expression, connection):
+        return value if value is None else self.NAMES.get(value, 'OTHER')
+
+    def to_python(self, value):
+        if isinstance(value, int):
+            return self.NAMES.get(value, 'OTHER')
+        return value
+
+    def get_prep_value(self, value):
+        if isinstance(value, str):
+            return self.get_code(value)
+        return super().get_prep_value(value)
+
+
+@models.GenericIPAddressField.register_lookup
+class NetContainedOrEqual(Lookup):
+    """Address is in network, like src_addr__net_contained_or_equal='10.0.0.0/8'"""
+    lookup_name = 'net_contained_or_equal'
+    prepare_rhs = False
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} <<= {rhs}::inet', lhs_params + rhs_params
+
+
 class Event(models.Model):
     rule = models.ForeignKey(Rule, on_delete=models.PROTECT)
     timestamp = models.DateTimeField()
-    src_addr = models.CharField(max_length=128)
+    src_addr = models.GenericIPAddressField(null=True, blank=True)
     src_port = models.IntegerField(null=True, blank=True)
-    dst_addr = models.CharField(max_length=128)
+    dst_addr = models.GenericIPAddressField(null=True, blank=True)
     dst_port = models.IntegerField(null=True, blank=True)
-    proto = models.CharField(max_length=128)
+    proto = ProtocolField(default='')
     mark_as_deleted = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['src_addr'], name='monitor_event_src_addr'),
+            models.Index(fields=['dst_addr'], name='monitor_event_dst_addr'),
+            # lists skip events marked as deleted, which can be most of the table
+            models.Index(fields=['id'], condition=models.Q(mark_as_deleted=False), name='monitor_event_not_deleted'),
+            # events are appended in order of time, BRIN stays tiny
+            BrinIndex(fields=['timestamp'], name='monitor_event_timestamp_brin'),
+        ]
+
+
+class SidRollup(models.Model):
+    """Count of events of a sid in an hour
+
+    Kept by triggers of Event table (migration 0011), events
+    marked as deleted are not counted.
+    """
+    bucket = models.DateTimeField()
+    sid = models.IntegerField()
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['bucket', 'sid'], name='monitor_sidrollup_bucket_sid'),
+        ]
+
+
+class AddressRollup(models.Model):
+    """Count of events between two addresses in an hour
+
+    Addresses are text like HOST() gives it and empty when
+    unknown, as unique constraint of PostgreSQL 14 does not
+    take NULLs as equal.
+    """
+    bucket = models.DateTimeField()
+    src_addr = models.CharField(max_length=39, blank=True)
+    dst_addr = models.CharField(max_length=39, blank=True)
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['bucket', 'src_addr', 'dst_addr'],
+                                    name='monitor_addressrollup_bucket_addrs'),
+        ]
+
+
+class LogCheckpoint(models.Model):
+    """Position of a watcher in its log file
+
+    Saved in the same transaction as data read before it,
+    so after restart nothing is lost or saved twice.
+    """
+    name = models.CharField(max_length=128, unique=True)
+    device = models.BigIntegerField(default=0)
+    inode = models.BigIntegerField(default=0)
+    offset = models.BigIntegerField(default=0)
+    fingerprint = models.CharField(max_length=40, blank=True, default='')
+
+    @classmethod
+    def get_position(cls, name: str):
+        """Get fields of position or None if it was never saved"""
+        return (
+            cls.objects
+            .filter(name=name)
+            .values('device', 'inode', 'offset', 'fingerprint')
+            .first()
+        )
+
+    @classmethod
+    def save_position(cls, name: str, position: dict):
+        """Create or update position"""
+        cls.objects.update_or_create(name=name, defaults=position)
+
+
+class DeadLetter(models.Model):
+    """Alert line which was not saved as an event
+
+    Kept with the reason of rejection, so it can be
+    reprocessed once the cause is fixed.
+    """
+
+    class Reason(models.TextChoices):
+        DECODE = 'decode', 'There is decoding error'
+        INCOMPLETE = 'incomplete', 'Event has no full required information'
+        NO_RULE = 'no_rule', 'There is no Rule matches with event'
+        INVALID = 'invalid', 'Database rejected values of event'
+
+    line = models.TextField()
+    reason = models.CharField(max_length=16, choices=Reason.choices)
+    created = models.DateTimeField(auto_now_add=True)
+    attempts = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['reason', 'id'], name='monitor_deadletter_reason_id'),
+        ]
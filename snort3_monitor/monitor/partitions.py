@@ -0,0 +1,126 @@
+import logging
+import re
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+
+from monitor.models import Event
+from monitor.rollups import delete_rollups
+from snort3_monitor.cache import bump_data_version
+
+
+logger = logging.getLogger('monitor')
+EVENT_TABLE = Event._meta.db_table
+DEFAULT_PARTITION = f'{EVENT_TABLE}_default'
+EPOCH = datetime.fromtimestamp(0, timezone.utc)
+PARTITION_BOUND = re.compile(r"FROM \('(.+?)'\) TO \('(.+?)'\)")
+# SQLSTATE of lock_timeout expiry
+LOCK_NOT_AVAILABLE = '55P03'
+
+
+def get_partitions() -> list:
+    """Get (name, start, end) of range partitions of Event table ordered by start
+
+    Default partition is not included.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) '
+            'FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE pg_inherits.inhparent = %s::regclass',
+            [EVENT_TABLE],
+        )
+        rows = cursor.fetchall()
+    partitions = []
+    for name, bound in rows:
+        match = PARTITION_BOUND.search(bound)
+        if match is not None:
+            partitions.append((name, datetime.fromisoformat(match[1]), datetime.fromisoformat(match[2])))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def get_partition_range(moment: datetime, days: int) -> tuple:
+    """Get start and end of partition of moment, partitions are aligned to epoch in UTC"""
+    interval = timedelta(days=days)
+    start = EPOCH + (moment - EPOCH) // interval * interval
+    return start, start + interval
+
+
+def create_partition(start: datetime, end: datetime) -> str:
+    """Create partition of Event table for [start, end)
+
+    Events of this range which were saved into default
+    partition before are moved into the new partition.
+    :return: Name of partition
+    """
+    name = f'{EVENT_TABLE}_p{start:%Y%m%d}'
+    quoted_name = connection.ops.quote_name(name)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} '
+                       f'WHERE "timestamp" >= %s AND "timestamp" < %s)', [start, end])
+        if not cursor.fetchone()[0]:
+            cursor.execute(f'CREATE TABLE {quoted_name} PARTITION OF {EVENT_TABLE} FOR VALUES FROM (%s) TO (%s)',
+                           [start, end])
+            return name
+
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in Event._meta.concrete_fields)
+        cursor.execute(f'CREATE TABLE {quoted_name} (LIKE {EVENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE "timestamp" >= %s AND "timestamp" < %s '
+            f'RETURNING {columns}) INSERT INTO {quoted_name} ({columns}) SELECT {columns} FROM moved',
+            [start, end],
+        )
+        logger.info(f'{cursor.rowcount} events are moved from default partition into {name}.')
+        cursor.execute(f'ALTER TABLE {EVENT_TABLE} ATTACH PARTITION {quoted_name} FOR VALUES FROM (%s) TO (%s)',
+                       [start, end])
+    return name
+
+
+def create_partitions(ahead: int = 7, now: datetime = None) -> list:
+    """Create missing partitions from the current one to ahead days in future
+
+    Ranges which overlap existing partitions (made with other
+    EVENT_PARTITION_DAYS) are skipped.
+    :return: Names of created partitions
+    """
+    now = now or datetime.now(timezone.utc)
+    existing = get_partitions()
+    created = []
+    start, end = get_partition_range(now, settings.EVENT_PARTITION_DAYS)
+    while start <= now + timedelta(days=ahead):
+        if not any(start < existing_end and existing_start < end for _, existing_start, existing_end in existing):
+            created.append(create_partition(start, end))
+        start, end = end, end + (end - start)
+    return created
+
+
+def drop_expired_partitions(retention: int, now: datetime = None) -> list:
+    """Drop partitions which end more than retention days ago
+
+    Expired events of default partition are left for
+    chunked deletion of apply_retention. Rollups of dropped
+    events are deleted, as DROP does not fire triggers.
+    A partition which is locked longer than PARTITION_LOCK_TIMEOUT
+    (by an export reading it, for example) is left for the next
+    run, so inserts of events do not queue behind the DROP.
+    :return: Names of dropped partitions
+    """
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=retention)
+    dropped = []
+    for name, start, end in get_partitions():
+        if end <= cutoff:
+            try:
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL lock_timeout = %s', [int(settings.PARTITION_LOCK_TIMEOUT * 1000)])
+                    cursor.execute(f'DROP TABLE {connection.ops.quote_name(name)}')
+                    # partitions are aligned to days in UTC, so buckets of the range have no other events
+                    delete_rollups(start, end)
+                    bump_data_version(Event)
+            except OperationalError as e:
+                if getattr(e.__cause__, 'pgcode', None) != LOCK_NOT_AVAILABLE:
+                    raise
+                logger.warning(f'Partition {name} is in use, it is left till the next run.')
+                continue
+            dropped.append(name)
+    return dropped
@@ -0,0 +1,243 @@
+import logging
+from datetime import datetime, timedelta, timezone
+
+from django.db import connection, transaction
+from django.db.models import CharField, Count, DateTimeField, F, Func, Value
+from django.db.models.functions import Concat
+
+from monitor.models import AddressRollup, Event, SidRollup
+from rule.models import Rule
+from snort3_monitor.cache import bump_data_version
+
+
+logger = logging.getLogger('monitor')
+BUCKET = timedelta(hours=1)
+EPOCH = datetime.fromtimestamp(0, timezone.utc)
+
+
+def get_host(field: str) -> Func:
+    """Get address of inet field as text without network mask"""
+    return Func(field, function='HOST', output_field=CharField())
+
+
+def get_bucket(moment: datetime, interval: timedelta = BUCKET) -> datetime:
+    """Get start of interval of moment, intervals are aligned to epoch in UTC"""
+    return EPOCH + (moment - EPOCH) // interval * interval
+
+
+def get_next_bucket(moment: datetime) -> datetime:
+    """Get the first bucket which starts at moment or later"""
+    bucket = get_bucket(moment)
+    return bucket if bucket == moment else bucket + BUCKET
+
+
+class AggregateList:
+    """Rows of aggregate SQL query for a paginator
+
+    Count and slices of rows are separate queries, like a
+    queryset makes them, rows are dicts of columns.
+    """
+
+    def __init__(self, sql: str, params: list):
+        self.sql = sql
+        self.params = params
+
+    def fetch(self, sql: str, params: list) -> list:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            columns = [column.name for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def count(self) -> int:
+        return self.fetch(f'SELECT COUNT(*) AS count FROM ({self.sql}) rows', self.params)[0]['count']
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def __iter__(self):
+        return iter(self.fetch(self.sql, self.params))
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step is not None:
+            raise TypeError('Rows are taken only by slices without step.')
+        start, stop = key.start or 0, key.stop
+        limit = 'ALL' if stop is None else max(stop - start, 0)
+        return self.fetch(f'{self.sql} LIMIT {limit} OFFSET {start}', self.params)
+
+
+def count_events(columns: dict, raw_queryset, rollup_table: str = None, start: datetime = None,
+                 stop: datetime = None, top: int = None) -> AggregateList:
+    """Count events of [start, stop] grouped by columns
+
+    Full buckets of the range are summed from rollups, events
+    of incomplete hours at its edges are counted from the table.
+    :param columns: SQL expressions of columns over rollup table by their names
+    :param raw_queryset: Aggregate of events giving the same columns in order and count
+    :param rollup_table: Table of rollups, all events are counted from the table if None
+    :param start: Events from this moment are counted, from the first one if None
+    :param stop: Events till this moment are counted, till the last one if None
+    :param top: Only top groups by count are taken, in descending order
+    """
+    start_edge = EPOCH if start is None else get_next_bucket(start)
+    stop_edge = None if stop is None else get_bucket(stop)
+    bounds = [('timestamp__gte', start), ('timestamp__lte', stop)]
+    if rollup_table is None or (stop_edge is not None and stop_edge <= start_edge):
+        parts = [raw_queryset.filter(**{lookup: moment for lookup, moment in bounds if moment is not None})]
+    else:
+        rollup_sql = f'SELECT {", ".join(columns.values())}, count FROM {rollup_table} WHERE bucket >= %s'
+        params = [start_edge]
+        if stop_edge is not None:
+            rollup_sql += ' AND bucket < %s'
+            params.append(stop_edge)
+        parts = [(rollup_sql, params)]
+        if start is not None and start < start_edge:
+            parts.append(raw_queryset.filter(timestamp__gte=start, timestamp__lt=start_edge))
+        if stop is not None:
+            parts.append(raw_queryset.filter(timestamp__gte=stop_edge, timestamp__lte=stop))
+
+    sql, params = [], []
+    for part in parts:
+        part_sql, part_params = part if isinstance(part, tuple) else part.query.sql_with_params()
+        sql.append(part_sql)
+        params += part_params
+    names = ', '.join(columns)
+    order = f'count, {names}' if top is None else f'count DESC, {names}'
+    sql = (f'SELECT {names}, SUM(count)::bigint AS count FROM ({" UNION ALL ".join(sql)}) counts({names}, count) '
+           f'GROUP BY {names} HAVING SUM(count) > 0 ORDER BY {order}')
+    if top is not None:
+        # pages are sliced with LIMIT too
+        sql = f'SELECT * FROM ({sql} LIMIT {int(top)}) top_counts ORDER BY {order}'
+    return AggregateList(sql, params)
+
+
+def get_raw_counts(expressions: dict):
+    """Get aggregate of events counted by expressions, in their order"""
+    aliases = {f'group_{name}': expression for name, expression in expressions.items()}
+    return (
+        Event.objects.filter(mark_as_deleted=False)
+        .annotate(**aliases)
+        .values(*aliases)
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+
+
+def count_by_sid(start: datetime = None) -> AggregateList:
+    """Count events by sid from start, rows have sid and count"""
+    raw_queryset = get_raw_counts({'sid': F('rule__sid')})
+    return count_events({'sid': 'sid'}, raw_queryset, SidRollup._meta.db_table, start)
+
+
+def count_by_address(start: datetime = None) -> AggregateList:
+    """Count events by pair of addresses from start, rows have addr_pair and count"""
+    raw_queryset = get_raw_counts({'addr_pair': Concat(get_host('src_addr'), Value('/'), get_host('dst_addr'))})
+    columns = {'addr_pair': "src_addr || '/' || dst_addr"}
+    return count_events(columns, raw_queryset, AddressRollup._meta.db_table, start)
+
+
+GROUP_FIELDS = ('sid', 'src_addr', 'dst_addr', 'dst_port', 'proto')
+
+
+def count_by_fields(fields: list, start: datetime = None, stop: datetime = None, top: int = None):
+    """Count events of [start, stop] grouped by fields of GROUP_FIELDS
+
+    Groups of sid are summed from rollups. Other groups are
+    aggregated over columns of events as they are, which is
+    faster than over text addresses of AddressRollup when
+    pairs of addresses seldom repeat within an hour. Top
+    groups are taken at once, as a list, other groups are
+    sliced into pages by queries.
+    :return: Rows with the fields and count
+    """
+    if fields == ['sid']:
+        raw_queryset = get_raw_counts({'sid': F('rule__sid')})
+        rows = count_events({'sid': 'sid'}, raw_queryset, SidRollup._meta.db_table, start, stop, top)
+    else:
+        events = Event.objects.filter(mark_as_deleted=False)
+        if start is not None:
+            events = events.filter(timestamp__gte=start)
+        if stop is not None:
+            events = events.filter(timestamp__lte=stop)
+        columns = [field for field in fields if field != 'sid']
+        rows = events.values(*columns, **({'sid': F('rule__sid')} if 'sid' in fields else {}))
+        rows = rows.annotate(count=Count('id'))
+        rows = rows.order_by('count', *fields) if top is None else rows.order_by('-count', *fields)[:top]
+    return rows if top is None else list(rows)
+
+
+def count_by_time(interval: timedelta, start: datetime, stop: datetime, filters: dict) -> dict:
+    """Count events of [start, stop] in buckets of interval
+
+    Buckets are aligned to epoch in UTC, like date_bin does.
+    Rollups are summed for intervals of whole hours, when
+    events are filtered by sid or by addresses only.
+    :param filters: Lookups of Event, like rule__sid or src_addr
+    :return: Counts of non-empty buckets by their start
+    """
+    events = Event.objects.filter(mark_as_deleted=False, **filters)
+    rollup, columns = None, {}
+    if interval % BUCKET == timedelta(0):
+        if set(filters) <= {'rule__sid'}:
+            rollup, columns = SidRollup, {'rule__sid': 'sid'}
+        elif set(filters) <= {'src_addr', 'dst_addr'}:
+            rollup, columns = AddressRollup, {'src_addr': 'src_addr', 'dst_addr': 'dst_addr'}
+
+    start_edge, stop_edge = get_next_bucket(start), get_bucket(stop)
+    if rollup is None or stop_edge <= start_edge:
+        parts = [events.filter(timestamp__gte=start, timestamp__lte=stop)]
+    else:
+        conditions = ''.join(f' AND {columns[lookup]} = %s' for lookup in filters)
+        rollup_sql = (f'SELECT date_bin(%s, bucket, %s), count FROM {rollup._meta.db_table} '
+                      f'WHERE bucket >= %s AND bucket < %s{conditions}')
+        parts = [(rollup_sql, [interval, EPOCH, start_edge, stop_edge, *filters.values()]),
+                 events.filter(timestamp__gte=start, timestamp__lt=start_edge),
+                 events.filter(timestamp__gte=stop_edge, timestamp__lte=stop)]
+
+    sql, params = [], []
+    date_bin = Func(Value(interval), 'timestamp', Value(EPOCH), function='date_bin', output_field=DateTimeField())
+    for part in parts:
+        if not isinstance(part, tuple):
+            part = part.annotate(moment=date_bin).values('moment').annotate(count=Count('id')).order_by()
+            part = part.query.sql_with_params()
+        sql.append(part[0])
+        params += part[1]
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT moment, SUM(count)::bigint FROM ({" UNION ALL ".join(sql)}) counts(moment, count) '
+                       f'GROUP BY moment', params)
+        return dict(cursor.fetchall())
+
+
+def delete_rollups(start: datetime, end: datetime) -> None:
+    """Delete rollups of buckets in [start, end), for events dropped without triggers"""
+    for model in (SidRollup, AddressRollup):
+        model.objects.filter(bucket__gte=start, bucket__lt=end).delete()
+
+
+def rebuild_rollups() -> int:
+    """Count rollups again from events
+
+    Rollups are repaired after events were changed bypassing
+    triggers of Event table, the table is locked from writes
+    meanwhile. Cached counts are dropped on commit.
+    :return: Count of counted events
+    """
+    event_table, rule_table = Event._meta.db_table, Rule._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {event_table} IN SHARE ROW EXCLUSIVE MODE')
+        for model in (SidRollup, AddressRollup):
+            cursor.execute(f'DELETE FROM {model._meta.db_table}')
+        cursor.execute(
+            f"INSERT INTO {SidRollup._meta.db_table} (bucket, sid, count) "
+            f"SELECT date_trunc('hour', e.\"timestamp\", 'UTC'), r.sid, COUNT(*) "
+            f"FROM {event_table} e JOIN {rule_table} r ON r.id = e.rule_id WHERE NOT e.mark_as_deleted GROUP BY 1, 2"
+        )
+        cursor.execute(
+            f"INSERT INTO {AddressRollup._meta.db_table} (bucket, src_addr, dst_addr, count) "
+            f"SELECT date_trunc('hour', \"timestamp\", 'UTC'), COALESCE(HOST(src_addr), ''), "
+            f"COALESCE(HOST(dst_addr), ''), COUNT(*) FROM {event_table} WHERE NOT mark_as_deleted GROUP BY 1, 2, 3"
+        )
+        cursor.execute(f'SELECT COALESCE(SUM(count), 0) FROM {AddressRollup._meta.db_table}')
+        counted = cursor.fetchone()[0]
+        bump_data_version(Event)
+    logger.info(f'Rollups are rebuilt from {counted} events.')
+    return counted
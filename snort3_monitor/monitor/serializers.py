@@ -1,9 +1,25 @@
+from django.utils import timezone
 from rest_framework import serializers
 
-from .models import Event
+from rule.models import Rule
+from .models import DeadLetter, Event
+
+
+# Columns of event rows taken by Event.objects.values()
+EVENT_ROW_FIELDS = ('id', 'timestamp', 'rule_id', 'src_addr', 'src_port', 'dst_addr', 'dst_port', 'proto')
+
+
+class AddressField(serializers.IPAddressField):
+    """IP address which is represented as empty string when it is unknown"""
+
+    def get_attribute(self, instance):
+        return super().get_attribute(instance) or ''
 
 
 class EventSerializer(serializers.ModelSerializer):
+    src_addr = AddressField()
+    dst_addr = AddressField()
+    proto = serializers.CharField(max_length=16)
     sid = serializers.SerializerMethodField()
     action = serializers.SerializerMethodField()
     message = serializers.SerializerMethodField()
@@ -26,6 +42,28 @@ class EventSerializer(serializers.ModelSerializer):
         return obj.rule.message
 
 
+def serialize_event_rows(rows) -> list:
+    """Represent event rows like EventSerializer does
+
+    Rows are dicts of EVENT_ROW_FIELDS, rules of all rows are
+    taken with one query and there is no per-field overhead,
+    current time zone is looked up once rather than per row.
+    """
+    rows = list(rows)
+    rules = Rule.objects.filter(id__in={row['rule_id'] for row in rows}).values_list('id', 'sid', 'action', 'message')
+    rules = {rule_id: rule for rule_id, *rule in rules}
+    to_timestamp = serializers.DateTimeField(default_timezone=timezone.get_current_timezone()).to_representation
+    data = []
+    for row in rows:
+        sid, action, message = rules[row['rule_id']]
+        data.append({
+            'id': row['id'], 'timestamp': to_timestamp(row['timestamp']), 'sid': sid, 'action': action,
+            'src_addr': row['src_addr'] or '', 'src_port': row['src_port'], 'dst_addr': row['dst_addr'] or '',
+            'dst_port': row['dst_port'], 'proto': row['proto'], 'message': message,
+        })
+    return data
+
+
 class EventCountAddressSerializer(serializers.Serializer):
     addr_pair = serializers.CharField(max_length=128)
     count = serializers.IntegerField()
@@ -34,3 +72,19 @@ class EventCountAddressSerializer(serializers.Serializer):
 class EventCountRuleSerializer(serializers.Serializer):
     sid = serializers.CharField(max_length=128)
     count = serializers.IntegerField()
+
+
+class EventCountGroupSerializer(serializers.Serializer):
+    """Count of a group of events, only fields of the grouping are present"""
+    sid = serializers.IntegerField(required=False)
+    src_addr = AddressField(required=False)
+    dst_addr = AddressField(required=False)
+    dst_port = serializers.IntegerField(required=False)
+    proto = serializers.CharField(required=False)
+    count = serializers.IntegerField()
+
+
+class DeadLetterSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DeadLetter
+        fields = ('id', 'reason', 'line', 'created', 'attempts')
@@ -5,6 +5,8 @@ from rest_framework import status
 from django.urls import reverse
 from collections import OrderedDict
 from datetime import timedelta
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 
@@ -54,6 +56,36 @@ class EventAPIListViewTest(APITestCase):
         self.assertIn('192.168.1.1', item.get('src_addr', []))
         self.assertEqual(len(results), 1)
 
+    def test_rules_are_taken_once(self):
+        url = reverse('event-list-update')
+        Event.objects.bulk_create([Event(rule=self.rule, timestamp=timezone.now(), proto='TCP') for _ in range(10)])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['results']), 12)
+        self.assertEqual(response.data['results'][0]['message'], 'Test Message')
+        selects = [query['sql'] for query in queries if query['sql'].startswith('SELECT')]
+        # count of events, page of events and their rules
+        self.assertEqual(len(selects), 3)
+
+    def test_filter_src_net(self):
+        url = reverse('event-list-update')
+        response = self.client.get(url, {'src_net': '192.168.1.0/31'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['src_addr'] for item in response.data['results']], ['192.168.1.1'])
+
+        response = self.client.get(url, {'src_net': '192.168.0.0/16', 'dst_net': '10.0.0.2/32'})
+        self.assertEqual([item['dst_addr'] for item in response.data['results']], ['10.0.0.2'])
+
+    def test_invalid_addr_filters(self):
+        url = reverse('event-list-update')
+        response = self.client.get(url, {'src_addr': '192.168.1'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {"error": "'src_addr' should be an IP address."})
+
+        response = self.client.get(url, {'dst_net': '10.0.0.0/33'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('dst_net', response.data['error'])
+
     def test_filter_proto(self):
         url = reverse('event-list-update')
         response = self.client.get(url, {'proto': 'UDP'})
@@ -127,7 +159,7 @@ class EventAPIListViewTest(APITestCase):
         url = reverse('event-count-list')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
-        self.assertEqual(response.data, {"error": "You should define 'type' of filter (sid or addr)"})
+        self.assertEqual(response.data, {"error": "You should define 'type' of filter (sid or addr) or 'group_by'"})
 
     def test_disallowed_parameters(self):
         url = reverse('event-count-list')
@@ -139,7 +171,8 @@ class EventAPIListViewTest(APITestCase):
         # Assert error message structure and content
         error_data = response.data
         self.assertIsInstance(error_data, dict)
-        self.assertEqual(response.data, {"error": "You can use only type, period, page as query filters."})
+        self.assertEqual(response.data, {"error": "You can use only type, period, group_by, top, period_start, "
+                                                  "period_stop, page as query filters."})
 
     def test_valid_sid_params_and_period(self):
         url = reverse('event-count-list')
@@ -175,7 +208,8 @@ class EventAPIListViewTest(APITestCase):
         response = self.client.get(url, {'type': 'add', 'period': 'all'})
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         expected_error = {
-            "error": "You can use only src_addr, src_port, dst_addr, dst_port, sid, proto, page as query filters."
+            "error": "You can use only src_addr, src_port, dst_addr, dst_port, sid, proto, src_net, dst_net, page "
+                     "as query filters."
         }
         self.assertEqual(response.data, expected_error)
 
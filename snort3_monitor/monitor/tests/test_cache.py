@@ -0,0 +1,102 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from monitor.ingest import save_events
+from monitor.models import Event
+from monitor.rollups import rebuild_rollups
+from rule.models import Rule
+from snort3_monitor.retention import RetentionPolicy, apply_retention
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ResponseCacheTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.rule = Rule.objects.create(sid=1, rev=1, gid=1, action='alert')
+        Event.objects.create(rule=cls.rule, timestamp=timezone.now(), src_addr='10.0.0.1', dst_addr='10.0.0.2',
+                             proto='TCP')
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, url: str, params: dict, **headers) -> tuple:
+        """Get response and SQL queries of data made for it"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params, headers=headers)
+        return response, [query['sql'] for query in queries if 'request_log_request' not in query['sql']]
+
+    def test_count_is_cached(self):
+        url, params = reverse('event-count-list'), {'type': 'sid', 'period': 'day'}
+        response, queries = self.get(url, params)
+        self.assertTrue(queries)
+        self.assertEqual(response.data['results'], [{'sid': '1', 'count': 1}])
+
+        cached, queries = self.get(url, {'period': 'day', 'type': 'sid'})
+        self.assertFalse(queries)
+        self.assertEqual(cached.data, response.data)
+        self.assertEqual(cached['ETag'], response['ETag'])
+
+        not_modified, queries = self.get(url, params, If_None_Match=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b'')
+        self.assertFalse(queries)
+
+        other, _ = self.get(url, {'type': 'addr', 'period': 'day'})
+        self.assertNotEqual(other['ETag'], response['ETag'])
+
+    def test_ingest_bumps_version(self):
+        url, params = reverse('event-count-list'), {'type': 'sid'}
+        response, _ = self.get(url, params)
+        with self.captureOnCommitCallbacks(execute=True):
+            save_events([(self.rule.id, timezone.now(), '10.0.0.1', 1, '10.0.0.2', 2, 'TCP')], 100)
+
+        changed, queries = self.get(url, params, If_None_Match=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertTrue(queries)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+        self.assertEqual(changed.data['results'], [{'sid': '1', 'count': 2}])
+
+    def test_mark_as_deleted_bumps_version(self):
+        url, params = reverse('event-count-list'), {'type': 'addr'}
+        self.get(url, params)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('event-list-update'))
+        response, _ = self.get(url, params)
+        self.assertEqual(response.data['results'], [])
+
+    def test_rebuild_rollups_bumps_version(self):
+        url, params = reverse('event-count-list'), {'type': 'sid'}
+        response, _ = self.get(url, params)
+        with self.captureOnCommitCallbacks(execute=True), self.assertLogs('monitor', level='INFO'):
+            rebuild_rollups()
+        rebuilt, queries = self.get(url, params, If_None_Match=response['ETag'])
+        self.assertEqual(rebuilt.status_code, 200)
+        self.assertTrue(queries)
+
+    def test_rules_are_cached(self):
+        url = reverse('rules-list')
+        response, _ = self.get(url, {'sid': 2})
+        self.assertEqual(response.data['count'], 0)
+        _, queries = self.get(url, {'sid': 2})
+        self.assertFalse(queries)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Rule.objects.create(sid=2, rev=1, gid=1, action='alert')
+        response, _ = self.get(url, {'sid': 2})
+        self.assertEqual(response.data['count'], 1)
+
+    def test_retention_bumps_version(self):
+        url, params = reverse('event-count-list'), {'type': 'sid'}
+        Event.objects.update(timestamp=timezone.now() - timedelta(days=40))
+        self.get(url, params)
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_retention([RetentionPolicy('monitor.Event', date_field='timestamp', max_age_days=30)], pause=0)
+        response, _ = self.get(url, params)
+        self.assertEqual(response.data['results'], [])
@@ -0,0 +1,91 @@
+import json
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from monitor.ingest import RuleCache, reprocess_dead_letters
+from monitor.models import DeadLetter, Event
+from monitor.views import DeadLetterReprocess
+from rule.models import Rule
+
+
+def make_line(sid: int) -> str:
+    return json.dumps({'seconds': 1705152575, 'action': 'allow', 'proto': 'TCP', 'src_addr': '10.0.0.1',
+                       'src_port': 1234, 'dst_addr': '10.0.0.2', 'dst_port': 80, 'msg': 'Test',
+                       'sid': sid, 'rev': 1, 'gid': 1})
+
+
+class ReprocessDeadLettersTest(APITestCase):
+    def setUp(self):
+        self.rule = Rule.objects.create(sid=1, rev=1, gid=1, action='alert')
+        DeadLetter.objects.bulk_create([
+            DeadLetter(reason='no_rule', line=make_line(1)),
+            DeadLetter(reason='no_rule', line=make_line(2)),
+            DeadLetter(reason='decode', line='{"seconds'),
+        ])
+        self.rules = RuleCache()
+        self.rules.load()
+
+    def test_reprocess_in_batches(self):
+        saved, left = reprocess_dead_letters(self.rules, batch_size=2, provision_rules=False)
+        self.assertEqual((saved, left), (1, 2))
+        self.assertEqual(Event.objects.get().rule, self.rule)
+        self.assertEqual(list(DeadLetter.objects.values_list('attempts', flat=True)), [1, 1])
+
+    def test_reprocess_by_reason_with_provisioning(self):
+        with self.assertLogs('monitor', level='INFO'):
+            saved, left = reprocess_dead_letters(self.rules, reason='no_rule')
+        self.assertEqual((saved, left), (2, 0))
+        self.assertTrue(Rule.objects.get(sid=2).placeholder)
+        self.assertEqual(DeadLetter.objects.get().reason, 'decode')
+
+    def test_reprocess_reloads_replaced_rules(self):
+        self.rule.delete()
+        new_rule = Rule.objects.create(sid=1, rev=1, gid=1, action='block')
+        with self.assertLogs('monitor', level='WARNING'):
+            saved, left = reprocess_dead_letters(self.rules, provision_rules=False)
+        self.assertEqual((saved, left), (1, 2))
+        self.assertEqual(Event.objects.get().rule, new_rule)
+
+    def test_rejected_batch_stays(self):
+        DeadLetter.objects.create(reason='invalid', line=make_line(3).replace('Test', 'Test\\u0000'))
+        with self.assertLogs('monitor', level='INFO'):
+            saved, left = reprocess_dead_letters(self.rules, reason='invalid')
+        self.assertEqual((saved, left), (0, 1))
+        self.assertEqual(DeadLetter.objects.get(reason='invalid').attempts, 1)
+        self.assertFalse(Event.objects.exists())
+
+    def test_rejected_letter_does_not_take_batch(self):
+        DeadLetter.objects.bulk_create([DeadLetter(reason='invalid', line=make_line(1)) for _ in range(5)])
+        bad_letter = DeadLetter.objects.create(reason='invalid', line=make_line(3).replace('Test', 'Test\\u0000'))
+        with self.assertLogs('monitor', level='ERROR'):
+            saved, left = reprocess_dead_letters(self.rules, reason='invalid')
+        self.assertEqual((saved, left), (5, 1))
+        self.assertEqual(Event.objects.filter(rule=self.rule).count(), 5)
+        self.assertEqual(DeadLetter.objects.get(reason='invalid'), bad_letter)
+        self.assertFalse(Rule.objects.filter(sid=3).exists())
+
+    def test_command(self):
+        out = StringIO()
+        with self.assertLogs('monitor', level='INFO'):
+            call_command('reprocess_dead_letters', '--no-provision', stdout=out)
+        self.assertIn('1 events saved, 2 dead letters left.', out.getvalue())
+
+    def test_list(self):
+        response = self.client.get(reverse('dead-letter-list') + '?reason=decode')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([letter['line'] for letter in response.data['results']], ['{"seconds'])
+
+    def test_list_unknown_reason(self):
+        response = self.client.get(reverse('dead-letter-list') + '?reason=other')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @patch.object(DeadLetterReprocess, 'background_reprocess')
+    def test_post_reprocess(self, patched_reprocess):
+        response = self.client.post(reverse('dead-letter-reprocess'), {'reason': 'no_rule'})
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        patched_reprocess.assert_called_once_with('no_rule')
@@ -0,0 +1,57 @@
+import json
+from json import JSONDecodeError
+from unittest import TestCase
+
+from alert_decoder import Alert, decode_alert, to_text
+from watcher_alert import parse_chunk
+
+
+class DecodeAlertTest(TestCase):
+    line = (b'{ "seconds" : 1705152575, "action" : "allow", "dst_addr" : "10.0.0.2", "dst_port" : 80, '
+            b'"msg" : "(http_inspect) \\"quoted\\" \xc3\xa9", "proto" : "TCP", "sid" : 1, "rev" : 2, "gid" : 3, '
+            b'"src_addr" : "10.0.0.1", "src_port" : 1234 }')
+
+    def test_decode_alert(self):
+        alert = decode_alert(self.line)
+        self.assertEqual(alert, Alert(1705152575, 1, 2, 3, '10.0.0.1', 1234, '10.0.0.2', 80, 'TCP',
+                                      '(http_inspect) "quoted" \xe9', 'allow'))
+        self.assertEqual(alert.sid, 1)
+
+    def test_decode_alert_with_stdlib(self):
+        self.assertEqual(decode_alert(self.line, json.loads), decode_alert(self.line))
+
+    def test_optional_fields(self):
+        alert = decode_alert(b'{"seconds": 1, "sid": 1, "rev": 1, "gid": 1}')
+        self.assertEqual(alert[4:], ('', None, '', None, '', '', ''))
+
+    def test_wrong_lines(self):
+        with self.assertRaises(KeyError):
+            decode_alert(b'{"seconds": 1}')
+        with self.assertRaises(KeyError):
+            decode_alert(b'[1, 2]')
+        with self.assertRaises(JSONDecodeError):
+            decode_alert(b'{"seconds": 1, "sid"')
+        with self.assertRaises(ValueError):
+            decode_alert(b'{"seconds": 1, "sid": 1, "rev": 1, "gid": 1, "src_addr": "10.0.0.256"}')
+        for line in (b'{"seconds": "x", "sid": 1, "rev": 1, "gid": 1}',
+                     b'{"seconds": 1.5, "sid": 1, "rev": 1, "gid": 1}',
+                     b'{"seconds": 1, "sid": 1, "rev": 1, "gid": 1, "dst_port": "80"}'):
+            with self.subTest(line=line):
+                with self.assertRaises(ValueError):
+                    decode_alert(line)
+
+    def test_parse_chunk(self):
+        alerts, errors = parse_chunk(self.line + b'\n{"sid": 1}\n\xff\n')
+        self.assertEqual(alerts[0][1:9], (1, 2, 3, '10.0.0.1', 1234, '10.0.0.2', 80, 'TCP'))
+        self.assertEqual(errors, [('incomplete', '{"sid": 1}'), ('decode', '\xff')])
+
+    def test_parse_chunk_with_wrong_seconds(self):
+        alerts, errors = parse_chunk(b'{"seconds": "x", "sid": 1, "rev": 1, "gid": 1}\n'
+                                     b'{"seconds": 1e20, "sid": 1, "rev": 1, "gid": 1}\n'
+                                     b'{"seconds": 100000000000000000000, "sid": 1, "rev": 1, "gid": 1}\n')
+        self.assertEqual(alerts, [])
+        self.assertEqual([reason for reason, _ in errors], ['decode', 'decode', 'decode'])
+
+    def test_to_text(self):
+        self.assertEqual(to_text(b'\xff'), '\xff')
+        self.assertEqual(to_text('line'), 'line')
@@ -0,0 +1,112 @@
+import csv
+import gzip
+import io
+import json
+from datetime import datetime, timedelta, timezone
+
+from django.db import connection
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone as django_timezone
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from monitor.models import Event
+from rule.models import Rule
+
+
+START = datetime(2024, 1, 13, tzinfo=timezone.utc)
+
+
+class EventExportTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        rules = Rule.objects.bulk_create([Rule(sid=sid, rev=1, gid=1, action='alert', message=f'rule, "{sid}"')
+                                          for sid in (1, 2)])
+        Event.objects.bulk_create([
+            Event(rule=rules[i % 2], timestamp=START + timedelta(minutes=10 * i), src_addr=f'10.0.0.{i % 3}',
+                  src_port=1000 + i, dst_addr=None if i % 5 == 0 else '10.0.1.1', dst_port=80, proto='TCP',
+                  mark_as_deleted=i == 7)
+            for i in range(20)
+        ])
+
+    def export(self, params: dict) -> tuple:
+        """Get streamed response and its content"""
+        # rows are serialized while the content is streamed
+        with django_timezone.override(timezone.utc):
+            response = self.client.get(reverse('event-export'), params)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.streaming)
+            return response, b''.join(response.streaming_content)
+
+    def get_list(self, params: dict) -> list:
+        """Get the same events from the events list"""
+        with django_timezone.override(timezone.utc):
+            response = self.client.get(reverse('event-list-update'), {**params, 'page_size': 100})
+        return response.data['results']
+
+    def test_ndjson(self):
+        response, content = self.export({})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="events.ndjson"')
+        rows = [json.loads(line) for line in content.decode().splitlines()]
+        self.assertEqual(len(rows), 19)
+        self.assertEqual(rows, self.get_list({}))
+
+    @override_settings(EXPORT_CHUNK_SIZE=3)
+    def test_chunks(self):
+        _, content = self.export({'sid': 2, 'src_net': '10.0.0.0/31'})
+        rows = [json.loads(line) for line in content.decode().splitlines()]
+        self.assertEqual(rows, self.get_list({'sid': 2, 'src_net': '10.0.0.0/31'}))
+
+    def test_csv(self):
+        params = {'output': 'csv', 'period_start': '2024-01-13 01:00', 'period_stop': '2024-01-13 02:00'}
+        response, content = self.export(params)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(content.decode())))
+        self.assertEqual([row['id'] for row in rows], [str(event.id) for event in Event.objects.filter(
+            timestamp__range=(START + timedelta(hours=1), START + timedelta(hours=2)), mark_as_deleted=False)])
+        self.assertEqual(rows[0]['message'], 'rule, "1"')
+        self.assertEqual(rows[0]['timestamp'], '2024-01-13T01:00:00Z')
+        self.assertEqual(rows[3]['dst_addr'], '')
+
+    def test_gzip(self):
+        for output in ('ndjson', 'csv'):
+            with self.subTest(output=output):
+                response, content = self.export({'output': output, 'gzip': 'true'})
+                self.assertEqual(response['Content-Type'], 'application/gzip')
+                self.assertEqual(response['Content-Disposition'], f'attachment; filename="events.{output}.gz"')
+                self.assertEqual(gzip.decompress(content), self.export({'output': output})[1])
+
+    def test_invalid_params(self):
+        errors = {
+            'output': ('xml', "Unknown 'output', use ndjson, csv"),
+            'gzip': ('yes', "'gzip' should be true or false"),
+            'period_start': ('13.01.2024', "Use format YYYY-MM-DD HH:MM:SS (you can skip SS, MM, HH)"),
+            'sid': ('a', "'sid' should be an integer."),
+            'type': ('sid', "You can use only src_addr, src_port, dst_addr, dst_port, sid, proto, src_net, dst_net, "
+                            "period_start, period_stop, output, gzip, page as query filters."),
+        }
+        for param, (value, error) in errors.items():
+            with self.subTest(param=param):
+                response = self.client.get(reverse('event-export'), {param: value})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.data['error'], error)
+
+
+class AbandonedExportTest(APITransactionTestCase):
+    def test_closed_stream_rolls_back(self):
+        rule = Rule.objects.create(sid=1, rev=1, gid=1, action='alert')
+        Event.objects.bulk_create([Event(rule=rule, timestamp=START, src_addr='10.0.0.1', proto='TCP')] * 10)
+
+        with override_settings(EXPORT_CHUNK_SIZE=3):
+            response = self.client.get(reverse('event-export'))
+            content = iter(response.streaming_content)
+            self.assertEqual(len(next(content).splitlines()), 3)
+        self.assertTrue(connection.in_atomic_block)
+
+        # client went away in the middle of the export
+        response.close()
+        self.assertFalse(connection.in_atomic_block)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM pg_cursors')
+            self.assertEqual(cursor.fetchone()[0], 0)
@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta, timezone
+
+from django.db import connection
+from django.test import SimpleTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone as django_timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APITestCase
+
+from monitor.models import Event
+from monitor.views import get_event_filters
+from rule.models import Rule
+
+
+START = datetime(2024, 1, 13, tzinfo=timezone.utc)
+
+
+class EventHistogramTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        rules = Rule.objects.bulk_create([Rule(sid=sid, rev=1, gid=1, action='alert') for sid in (1, 2)])
+        # an event every 7 minutes for 10 hours
+        cls.events = Event.objects.bulk_create([
+            Event(rule=rules[i % 2], timestamp=START + timedelta(minutes=7 * i), src_addr=f'10.0.0.{i % 3}',
+                  dst_addr='10.0.1.1', proto='TCP')
+            for i in range(86)
+        ])
+
+    def get_histogram(self, params: dict) -> dict:
+        with django_timezone.override(timezone.utc):
+            response = self.client.get(reverse('event-histogram'), params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def get_expected(self, start: datetime, stop: datetime, interval: timedelta, condition=lambda event: True) -> list:
+        """Count events into buckets in Python"""
+        counts = {}
+        for event in self.events:
+            if start <= event.timestamp <= stop and condition(event):
+                bucket = START + (event.timestamp - START) // interval * interval
+                counts[bucket] = counts.get(bucket, 0) + 1
+        bucket = START + (start - START) // interval * interval
+        expected = []
+        while bucket <= stop:
+            expected.append(counts.get(bucket, 0))
+            bucket += interval
+        return expected
+
+    def test_dense_buckets(self):
+        data = self.get_histogram({'start': '2024-01-13 00:00', 'stop': '2024-01-13 00:30', 'interval': '5m'})
+        self.assertEqual(data['interval'], '5m')
+        self.assertEqual([bucket['timestamp'] for bucket in data['buckets']],
+                         [f'2024-01-13T00:{minute:02}:00Z' for minute in range(0, 31, 5)])
+        self.assertEqual([bucket['count'] for bucket in data['buckets']], [1, 1, 1, 0, 1, 1, 0])
+        self.assertEqual(data['count'], 5)
+
+    def test_raw_buckets(self):
+        start, stop = START + timedelta(minutes=13), START + timedelta(hours=9, minutes=2)
+        params = {'start': '2024-01-13 00:13', 'stop': '2024-01-13 09:02'}
+        for interval, minutes in (('1m', 1), ('15m', 15), ('2h', 120), ('1d', 1440)):
+            with self.subTest(interval=interval):
+                data = self.get_histogram({**params, 'interval': interval, 'src_net': '10.0.0.0/31'})
+                expected = self.get_expected(start, stop, timedelta(minutes=minutes),
+                                             lambda event: event.src_addr in ('10.0.0.0', '10.0.0.1'))
+                self.assertEqual([bucket['count'] for bucket in data['buckets']], expected)
+
+    def test_rollup_buckets(self):
+        start, stop = START + timedelta(minutes=13), START + timedelta(hours=9, minutes=2)
+        params = {'start': '2024-01-13 00:13', 'stop': '2024-01-13 09:02', 'interval': '1h'}
+        cases = (
+            ({}, 'monitor_sidrollup', lambda event: True),
+            ({'sid': 2}, 'monitor_sidrollup', lambda event: event.rule.sid == 2),
+            ({'src_addr': '10.0.0.2', 'dst_addr': '10.0.1.1'}, 'monitor_addressrollup',
+             lambda event: event.src_addr == '10.0.0.2'),
+        )
+        for filters, table, condition in cases:
+            with self.subTest(filters=filters), CaptureQueriesContext(connection) as queries:
+                data = self.get_histogram({**params, **filters})
+                self.assertTrue([query for query in queries if table in query['sql']])
+                self.assertEqual([bucket['count'] for bucket in data['buckets']],
+                                 self.get_expected(start, stop, timedelta(hours=1), condition))
+
+    def test_pagination_params_are_ignored(self):
+        params = {'start': '2024-01-13 00:00', 'stop': '2024-01-13 00:30', 'interval': '5m'}
+        self.assertEqual(self.get_histogram({**params, 'page': 2, 'page_size': 10}), self.get_histogram(params))
+
+    def test_invalid_params(self):
+        errors = {
+            (('start', '2024-01-13'),): "You should define 'start' and 'stop'.",
+            (('start', '2024-01-13'), ('stop', '2024-01-12')): "'start' should be before 'stop'",
+            (('start', '2024-01-13'), ('stop', '2024-01-14'), ('interval', '30s')):
+                "'interval' should be from 1m to 1d, like 5m, 1h or 1d",
+            (('start', '2024-01-13'), ('stop', '2024-01-14'), ('interval', '2d')):
+                "'interval' should be from 1m to 1d, like 5m, 1h or 1d",
+            (('start', '2024-01-13'), ('stop', '2024-01-14'), ('interval', '999999999999d')):
+                "'interval' should be from 1m to 1d, like 5m, 1h or 1d",
+            (('start', '2024-01-01'), ('stop', '2024-01-14'), ('interval', '1m')):
+                "The range has to be less than 10000 intervals",
+            (('start', '2024-01-13'), ('stop', '2024-01-14'), ('sid', 'x')): "'sid' should be an integer.",
+        }
+        for params, error in errors.items():
+            with self.subTest(params=params):
+                response = self.client.get(reverse('event-histogram'), dict(params))
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.data['error'], error)
+
+
+class EventFiltersTest(SimpleTestCase):
+    def test_sid(self):
+        self.assertEqual(get_event_filters({'sid': '12'}), {'rule__sid': '12'})
+        for sid in ('x', '-1', '1.0', '\u00b2', '\u0663'):
+            with self.subTest(sid=sid):
+                with self.assertRaises(ValidationError):
+                    get_event_filters({'sid': sid})
@@ -0,0 +1,91 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from monitor.models import DeadLetter, Event
+from performance_log.models import Performance
+from rule.models import Rule
+
+
+class IndexPlansTest(APITestCase):
+    """Hot queries of endpoints use the designed indexes
+
+    Tables get a month of rows in order of time and fresh
+    statistics, sequential scans are disabled to see which
+    index the planner would take on a big table.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.rule = Rule.objects.create(sid=1, rev=1, gid=1, action='alert')
+        start = timezone.now() - timedelta(days=30)
+        moments = [start + timedelta(minutes=15 * i) for i in range(30 * 24 * 4)]
+        Event.objects.bulk_create([
+            Event(rule=cls.rule, timestamp=moment, src_addr='10.0.0.1', dst_addr='10.0.0.2', proto='TCP')
+            for moment in moments
+        ])
+        Performance.objects.bulk_create([
+            Performance(timestamp=moment, module=module, pegcounts={})
+            for moment in moments for module in ('binder', 'stream_tcp')
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE monitor_event, performance_log_performance')
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def get_plan(self, url: str, params: dict, table: str) -> str:
+        """Get EXPLAIN of the last SELECT from table made by GET request"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        selects = [query['sql'] for query in queries
+                   if query['sql'].startswith('SELECT') and f'FROM "{table}"' in query['sql']]
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {selects[-1]}')
+            return '\n'.join(row[0] for row in cursor.fetchall())
+
+    def test_event_list(self):
+        plan = self.get_plan(reverse('event-list-update'), {}, 'monitor_event')
+        # partition index of monitor_event_not_deleted
+        self.assertIn('Index Scan using monitor_event_default_id_idx', plan)
+        self.assertNotIn('Sort', plan)
+
+    def test_event_count(self):
+        plan = self.get_plan(reverse('event-count-list'), {'type': 'sid', 'period': 'day'}, 'monitor_event')
+        # partition index of monitor_event_timestamp_brin
+        self.assertIn('Bitmap Index Scan on monitor_event_default_timestamp_idx', plan)
+
+    def test_dead_letter_list(self):
+        DeadLetter.objects.create(reason=DeadLetter.Reason.DECODE, line='\xff')
+        plan = self.get_plan(reverse('dead-letter-list'), {'reason': 'decode'}, 'monitor_deadletter')
+        self.assertIn('monitor_deadletter_reason_id', plan)
+        self.assertNotIn('Sort', plan)
+
+    def test_performance_list_by_module(self):
+        params = {'period_start': f'{timezone.now() - timedelta(days=1):%Y-%m-%d %H:%M}',
+                  'period_stop': f'{timezone.now():%Y-%m-%d %H:%M}', 'module': 'bind'}
+        plan = self.get_plan(reverse('performance-list'), params, 'performance_log_performance')
+        self.assertRegex(plan, r'Index Scan (on|using) performance_module_timestamp')
+        # prefix of module is a range condition of the index, not a filter after it
+        self.assertRegex(plan, r"Index Cond: .*module.* ~>=~ 'bind'")
+
+    def test_performance_list(self):
+        params = {'period_start': f'{timezone.now() - timedelta(days=1):%Y-%m-%d %H:%M}',
+                  'period_stop': f'{timezone.now():%Y-%m-%d %H:%M}'}
+        plan = self.get_plan(reverse('performance-list'), params, 'performance_log_performance')
+        self.assertIn('Bitmap Index Scan on performance_timestamp_brin', plan)
+
+    def test_request_list(self):
+        params = {'period_start': '2024-01-01', 'period_stop': '2024-01-07'}
+        plan = self.get_plan(reverse('request-list'), params, 'request_log_request')
+        self.assertIn('Bitmap Index Scan on request_timestamp_brin', plan)
+
+    def test_get_rule(self):
+        plan = Rule.objects.filter(sid=1, rev=1, gid=1).explain()
+        self.assertIn('Index Scan using rule_rule_sid_gid_rev_unique', plan)
@@ -0,0 +1,350 @@
+import json
+import multiprocessing
+import os
+import tempfile
+from unittest.mock import patch
+
+from django.db import OperationalError
+from django.http import Http404
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from monitor.ingest import RuleCache, copy_events, format_csv_value, save_events
+from monitor.models import DeadLetter, Event, LogCheckpoint
+from rule.models import Rule
+from spool import Spool
+from tailer import Checkpoint
+from watcher_alert import OnMyWatch, parse_alerts
+
+
+class RuleCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.rule = Rule.objects.create(sid=1, rev=2, gid=3, action='alert', message='Test Message')
+
+    def test_get_rule_id_from_warm_cache(self):
+        cache = RuleCache()
+        cache.load()
+        with self.assertNumQueries(0):
+            self.assertEqual(cache.get_rule_id(1, 2, 3), self.rule.id)
+
+    def test_miss_reloads_cache(self):
+        cache = RuleCache(min_reload_interval=0)
+        cache.load()
+        new_rule = Rule.objects.create(sid=5, rev=1, gid=1, action='alert')
+        self.assertEqual(cache.get_rule_id(5, 1, 1), new_rule.id)
+
+    def test_miss_does_not_reload_too_often(self):
+        cache = RuleCache(min_reload_interval=60)
+        cache.load()
+        with self.assertNumQueries(0):
+            with self.assertRaises(Http404):
+                cache.get_rule_id(7, 7, 7)
+
+    def test_missing_key_does_not_reload(self):
+        cache = RuleCache(min_reload_interval=0, negative_ttl=60)
+        with self.assertRaises(Http404):
+            cache.get_rule_id(7, 7, 7)
+        with self.assertNumQueries(0):
+            with self.assertRaises(Http404):
+                cache.get_rule_id(7, 7, 7)
+        cache.negative_ttl = 0
+        with self.assertNumQueries(1):
+            with self.assertRaises(Http404):
+                cache.get_rule_id(7, 7, 7)
+
+    def test_provision_placeholder(self):
+        cache = RuleCache()
+        with self.assertLogs('monitor', level='INFO'):
+            rule_id = cache.provision(116, 1, 150, '(decode) loopback IP', 'allow')
+        rule = Rule.objects.get(id=rule_id)
+        self.assertTrue(rule.placeholder)
+        self.assertEqual((rule.message, rule.action), ('(decode) loopback IP', 'allow'))
+        with self.assertNumQueries(0):
+            self.assertEqual(cache.get_rule_id(116, 1, 150), rule_id)
+
+    def test_provision_existing_rule(self):
+        cache = RuleCache()
+        self.assertEqual(cache.provision(1, 2, 3, 'Other', 'allow'), self.rule.id)
+        self.assertFalse(Rule.objects.get(id=self.rule.id).placeholder)
+
+
+class SaveEventsTest(TestCase):
+    def test_save_events_in_batches(self):
+        rule = Rule.objects.create(sid=1, rev=1, gid=1, action='alert')
+        rows = [(rule.id, timezone.now(), '10.0.0.1', 1234, '10.0.0.2', 80, 'TCP') for _ in range(5)]
+        # savepoint, 3 inserts, 2 queries of constraint check, release
+        with self.assertNumQueries(7):
+            self.assertEqual(save_events(rows, batch_size=2), 5)
+        self.assertEqual(Event.objects.filter(rule=rule, src_port=1234, dst_addr='10.0.0.2').count(), 5)
+
+    def test_big_batch_is_copied(self):
+        rule = Rule.objects.create(sid=1, rev=1, gid=1, action='alert')
+        rows = [(rule.id, timezone.now(), '10.0.0.1', None, '', None, 'TCP') for _ in range(3)]
+        with patch('monitor.ingest.copy_events') as patched_copy_events:
+            save_events(rows, batch_size=2, copy_threshold=3)
+        patched_copy_events.assert_called_once_with(rows)
+
+    def test_copy_events(self):
+        rule = Rule.objects.create(sid=1, rev=1, gid=1, action='alert')
+        timestamp = timezone.now()
+        copy_events([(rule.id, timestamp, 'fe80::1', None, '', 80, 'udp'),
+                     (rule.id, timestamp, '10.0.0.1', None, '', 80, '"TCP", ok')])
+        event = Event.objects.get(src_addr='10.0.0.1')
+        self.assertEqual(event.rule, rule)
+        self.assertEqual(event.timestamp, timestamp)
+        self.assertIsNone(event.src_port)
+        self.assertIsNone(event.dst_addr)
+        self.assertEqual(event.dst_port, 80)
+        self.assertEqual(event.proto, 'OTHER')
+        self.assertEqual(Event.objects.get(src_addr='fe80::1').proto, 'UDP')
+        self.assertFalse(event.mark_as_deleted)
+
+    def test_format_csv_value(self):
+        self.assertEqual(format_csv_value(None), '')
+        self.assertEqual(format_csv_value(''), '""')
+        self.assertEqual(format_csv_value(True), 't')
+        self.assertEqual(format_csv_value(80), '80')
+
+    def test_save_no_events(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(save_events([], batch_size=2), 0)
+
+    def test_nul_of_rejected_line_is_escaped(self):
+        line = parse_alerts([b'\x00\x00\x00{"seconds": 1}'])[1][0][1]
+        save_events([], batch_size=2, rejected=[(DeadLetter.Reason.DECODE, line)])
+        self.assertEqual(DeadLetter.objects.get().line, '\\x00\\x00\\x00{"seconds": 1}')
+
+
+class AlertWatcherSaveDataTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.rule = Rule.objects.create(sid=1, rev=1, gid=1, action='alert')
+
+    def setUp(self):
+        self.watcher = OnMyWatch(batch_size=100)
+        self.watcher.rules.load()
+
+    @staticmethod
+    def make_line(sid: int = 1) -> str:
+        return json.dumps({'seconds': 1705152575, 'action': 'allow', 'proto': 'TCP',
+                           'src_addr': '10.0.0.1', 'src_port': 1234, 'dst_addr': '10.0.0.2', 'dst_port': 80,
+                           'msg': 'Test', 'sid': sid, 'rev': 1, 'gid': 1})
+
+    def test_save_data_creates_events(self):
+        saved = self.watcher.save_data([self.make_line() for _ in range(3)])
+        self.assertEqual(saved, 3)
+        self.assertEqual(Event.objects.filter(rule=self.rule, src_port=1234).count(), 3)
+
+    def test_save_data_skips_wrong_lines(self):
+        with patch.object(OnMyWatch, 'provision_rules', False):
+            with self.assertLogs('monitor', level='ERROR') as log:
+                saved = self.watcher.save_data([self.make_line(), self.make_line(sid=2), '{"seconds": 1}', 'not json'])
+        self.assertEqual(saved, 1)
+        self.assertEqual(len(log.output), 3)
+        reasons = sorted(DeadLetter.objects.values_list('reason', flat=True))
+        self.assertEqual(reasons, ['decode', 'incomplete', 'no_rule'])
+        self.assertEqual(json.loads(DeadLetter.objects.get(reason='no_rule').line)['sid'], 2)
+
+    def test_save_data_rejects_wrong_seconds(self):
+        lines = [self.make_line().replace('1705152575', seconds) for seconds in ('"x"', '1e20', '10' * 10)]
+        with self.assertLogs('monitor', level='ERROR'):
+            saved = self.watcher.save_data(lines + [self.make_line()])
+        self.assertEqual(saved, 1)
+        self.assertEqual(list(DeadLetter.objects.values_list('reason', flat=True)), ['decode'] * 3)
+
+    def test_dead_letters_are_not_saved_when_events_fail(self):
+        with patch('monitor.ingest.Event.objects.bulk_create', side_effect=RuntimeError('Database error')):
+            with self.assertRaises(RuntimeError):
+                with self.assertLogs('monitor', level='ERROR'):
+                    self.watcher.save_data([self.make_line(), 'not json'], Checkpoint(1, 2, 300, 'abc'))
+        self.assertFalse(DeadLetter.objects.exists())
+
+    def test_save_data_reloads_replaced_rules(self):
+        old_rule = Rule.objects.create(sid=3, rev=1, gid=1, action='alert')
+        self.watcher.rules.load()
+        old_rule.delete()
+        new_rule = Rule.objects.create(sid=3, rev=1, gid=1, action='block')
+        with self.assertLogs('monitor', level='WARNING') as log:
+            saved = self.watcher.save_data([self.make_line(sid=3)])
+        self.assertEqual(saved, 1)
+        self.assertEqual(Event.objects.get().rule, new_rule)
+        self.assertIn('Rule cache is outdated', log.output[0])
+
+    def test_save_data_provisions_unknown_rules(self):
+        with self.assertLogs('monitor', level='INFO') as log:
+            saved = self.watcher.save_data([self.make_line(sid=2), self.make_line(sid=2)])
+        self.assertEqual(saved, 2)
+        rule = Rule.objects.get(sid=2)
+        self.assertTrue(rule.placeholder)
+        self.assertEqual((rule.message, rule.action), ('Test', 'allow'))
+        self.assertEqual(Event.objects.filter(rule=rule).count(), 2)
+        self.assertEqual(len(log.output), 1)
+
+    def test_rejected_batch_is_saved_as_dead_letters(self):
+        line = self.make_line(sid=2).replace('Test', 'Test\\u0000')
+        checkpoint = Checkpoint(1, 2, 300, 'abc')
+        with self.assertLogs('monitor', level='ERROR'):
+            saved = self.watcher.save_data([self.make_line(), line, 'not json'], checkpoint)
+        self.assertEqual(saved, 1)
+        self.assertEqual(Event.objects.get().rule, self.rule)
+        self.assertFalse(Rule.objects.filter(sid=2).exists())
+        self.assertEqual(sorted(DeadLetter.objects.values_list('reason', flat=True)), ['decode', 'invalid'])
+        self.assertEqual(json.loads(DeadLetter.objects.get(reason='invalid').line)['sid'], 2)
+        self.assertEqual(OnMyWatch.get_current_position(), checkpoint)
+
+        # the next batch is saved
+        self.assertEqual(self.watcher.save_data([self.make_line()]), 1)
+
+    def test_rejected_alert_does_not_take_batch(self):
+        lines = [self.make_line() for _ in range(50)]
+        lines.insert(20, self.make_line().replace('"dst_port": 80', f'"dst_port": {2 ** 40}'))
+        with self.assertLogs('monitor', level='ERROR') as log:
+            saved = self.watcher.save_data(lines)
+        self.assertEqual(saved, 50)
+        self.assertEqual(Event.objects.count(), 50)
+        self.assertEqual(json.loads(DeadLetter.objects.get(reason='invalid').line)['dst_port'], 2 ** 40)
+        self.assertEqual(len(log.output), 2)
+
+    def test_save_data_saves_checkpoint_with_events(self):
+        checkpoint = Checkpoint(1, 2, 300, 'abc')
+        self.watcher.save_data([self.make_line()], checkpoint)
+        self.assertEqual(OnMyWatch.get_current_position(), checkpoint)
+
+    def test_checkpoint_is_not_saved_when_events_fail(self):
+        with patch('monitor.ingest.Event.objects.bulk_create', side_effect=RuntimeError('Database error')):
+            with self.assertRaises(RuntimeError):
+                self.watcher.save_data([self.make_line()], Checkpoint(1, 2, 300, 'abc'))
+        self.assertIsNone(LogCheckpoint.get_position(OnMyWatch.checkpoint_name))
+
+    def test_checkpoint_is_saved_without_valid_lines(self):
+        self.watcher.save_data(['not json'], Checkpoint(1, 2, 9, 'abc'))
+        self.assertEqual(OnMyWatch.get_current_position().offset, 9)
+
+    def test_position_of_old_version_is_used(self):
+        with tempfile.TemporaryDirectory() as directory:
+            position_file = os.path.join(directory, 'current_alerts.txt')
+            with open(position_file, 'w') as f:
+                f.write('120')
+            with patch.object(OnMyWatch, 'current_position_file', position_file):
+                self.assertEqual(OnMyWatch.get_current_position(), Checkpoint(offset=120))
+
+    def test_save_in_pipeline(self):
+        chunks = [
+            ((self.make_line() + '\n') * 3).encode('latin-1'),
+            (self.make_line() + '\nnot json\n').encode('latin-1'),
+        ]
+        checkpoints = [Checkpoint(1, 2, 100, 'abc'), Checkpoint(1, 2, 200, 'abc')]
+        self.watcher.workers = 2
+        self.watcher.pool = multiprocessing.Pool(2)
+        try:
+            with self.assertLogs('monitor', level='ERROR'):
+                saved = self.watcher.save_in_pipeline(zip(chunks, checkpoints))
+        finally:
+            self.watcher.stop_pool()
+        self.assertEqual(saved, 4)
+        self.assertEqual(Event.objects.count(), 4)
+        self.assertEqual(OnMyWatch.get_current_position(), checkpoints[-1])
+
+
+class AlertWatcherSpoolTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.rule = Rule.objects.create(sid=1, rev=1, gid=1, action='alert')
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        with patch.object(OnMyWatch, 'spool_dir', self.directory.name):
+            self.watcher = OnMyWatch(batch_size=100)
+        self.watcher.rules.load()
+
+    def tearDown(self):
+        self.watcher.spool.close()
+        self.directory.cleanup()
+
+    def spool_on_failure(self):
+        original_save_alerts = OnMyWatch.save_alerts
+        with patch.object(OnMyWatch, 'save_alerts', side_effect=OperationalError('connection refused')):
+            with self.assertLogs('monitor', level='WARNING'):
+                saved = self.watcher.save_data([AlertWatcherSaveDataTest.make_line()] * 2, Checkpoint(1, 2, 100, 'a'))
+        self.assertEqual(saved, 0)
+        return original_save_alerts
+
+    def test_alerts_are_spooled_when_database_fails(self):
+        self.spool_on_failure()
+        self.assertEqual(self.watcher.spool.records, 1)
+        self.assertEqual(self.watcher.get_position(), Checkpoint(1, 2, 100, 'a'))
+        self.assertFalse(Event.objects.exists())
+        self.assertEqual(Spool.read_status(self.directory.name)['records'], 1)
+
+    def test_new_alerts_follow_spooled_ones(self):
+        self.spool_on_failure()
+        self.watcher.save_data([AlertWatcherSaveDataTest.make_line()], Checkpoint(1, 2, 150, 'a'))
+        self.assertEqual(self.watcher.spool.records, 2)
+        self.assertFalse(Event.objects.exists())
+
+    def test_drain_spool(self):
+        self.spool_on_failure()
+        self.watcher.save_data([AlertWatcherSaveDataTest.make_line()], Checkpoint(1, 2, 150, 'a'))
+        self.watcher.retry_at = 0
+        with self.assertLogs('monitor', level='INFO') as log:
+            saved = self.watcher.drain_spool()
+        self.assertEqual(saved, 3)
+        self.assertIn('Drained 3 events from spool', log.output[0])
+        self.assertEqual(Event.objects.count(), 3)
+        self.assertTrue(self.watcher.spool.is_empty())
+        self.assertEqual(OnMyWatch.get_current_position(), Checkpoint(1, 2, 150, 'a'))
+        self.assertEqual(Spool.read_status(self.directory.name)['records'], 0)
+
+    def test_drained_records_are_not_saved_twice(self):
+        self.spool_on_failure()
+        LogCheckpoint.save_position(self.watcher.spool_checkpoint_name, {'offset': self.watcher.spool.sequence})
+        self.watcher.retry_at = 0
+        self.assertEqual(self.watcher.drain_spool(), 0)
+        self.assertFalse(Event.objects.exists())
+        self.assertTrue(self.watcher.spool.is_empty())
+
+    def test_position_is_taken_from_spool_after_restart(self):
+        self.spool_on_failure()
+        self.watcher.spool.close()
+        with patch.object(OnMyWatch, 'spool_dir', self.directory.name):
+            watcher = OnMyWatch()
+        self.assertEqual(watcher.get_position(), Checkpoint(1, 2, 100, 'a'))
+
+    def test_run_starts_while_database_is_down(self):
+        self.watcher.rules = RuleCache()
+        with patch.object(RuleCache, 'load', side_effect=OperationalError('connection refused')), \
+                patch.object(self.watcher.tailer, 'get_status', return_value=None), \
+                patch.object(self.watcher.tailer, 'wait', side_effect=KeyboardInterrupt):
+            with self.assertLogs('monitor', level='INFO') as log:
+                self.watcher.run()
+        self.assertIn('rules are not loaded', log.output[1])
+        self.assertIn('Alert watcher stopped.', log.output[-1])
+
+        # rules are loaded when the first alert misses the cache
+        with self.assertLogs('monitor', level='INFO'):
+            self.assertEqual(self.watcher.save_data([AlertWatcherSaveDataTest.make_line()]), 1)
+
+    def test_spool_status_api(self):
+        self.spool_on_failure()
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(ALERT_SPOOL_DIR=self.directory.name, UNIFIED2_SPOOL_DIR=directory,
+                                   UNIXSOCK_SPOOL_DIR=os.path.join(directory, 'missing')):
+                response = self.client.get(reverse('spool-status'))
+        self.assertEqual(set(response.data), {'alert_json', 'unified2', 'alert_unixsock'})
+        self.assertEqual(response.data['alert_json']['records'], 1)
+        self.assertEqual(response.data['unified2']['records'], 0)
+        self.assertEqual(response.data['alert_unixsock']['records'], 0)
+
+
+class ParseAlertsTest(TestCase):
+    def test_parse_alerts(self):
+        line = json.dumps({'seconds': 1705152575, 'sid': 1, 'rev': 2, 'gid': 3, 'msg': 'Test', 'proto': 'UDP',
+                           'src_addr': '10.0.0.1', 'dst_addr': '10.0.0.2', 'src_port': 53, 'dst_port': 5353})
+        alerts, errors = parse_alerts([line, '{"sid": 1}', '{'])
+        self.assertEqual(alerts, [(
+            timezone.make_aware(timezone.datetime.fromtimestamp(1705152575)),
+            1, 2, 3, '10.0.0.1', 53, '10.0.0.2', 5353, 'UDP', 'Test', '',
+        )])
+        self.assertEqual(errors, [('incomplete', '{"sid": 1}'), ('decode', '{')])
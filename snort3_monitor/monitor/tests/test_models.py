@@ -2,6 +2,7 @@ from django.test import TestCase
 from monitor.models import Event
 from rule.models import Rule
 from django.core.exceptions import ValidationError
+from django.db import connection
 from django.db.utils import DataError
 from django.utils import timezone
 
@@ -35,7 +36,19 @@ class EventModelTest(TestCase):
 
     def test_max_lengh_src_addr(self):
         max_lengh = self.event._meta.get_field('src_addr').max_length
-        self.assertEqual(max_lengh, 128)
+        self.assertEqual(max_lengh, 39)
+
+    def test_compact_columns(self):
+        self.assertEqual(self.event._meta.get_field('src_addr').db_type(connection), 'inet')
+        self.assertEqual(Event.objects.values_list('proto', flat=True).get(), 'TCP')
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT proto, dst_addr FROM monitor_event WHERE id = %s', [self.event.id])
+            self.assertEqual(cursor.fetchone(), (6, None))
+
+    def test_unknown_proto(self):
+        event = Event.objects.create(rule=self.rule, timestamp=timezone.now(), proto='sctp')
+        event.refresh_from_db()
+        self.assertEqual(event.proto, 'OTHER')
 
     def test_dst_port_null_blank(self):
         self.event.dst_port = None
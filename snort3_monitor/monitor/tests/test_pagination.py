@@ -0,0 +1,84 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from monitor.models import Event
+from performance_log.models import Performance
+from rule.models import Rule
+
+
+class ListPaginationTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.rules = Rule.objects.bulk_create([Rule(sid=sid, rev=1, gid=1, action='alert') for sid in range(1, 6)])
+        cls.events = Event.objects.bulk_create([
+            Event(rule=cls.rules[i % 5], timestamp=timezone.now(), src_addr=f'10.0.0.{i}', dst_addr='10.0.0.254',
+                  proto='TCP')
+            for i in range(1, 8)
+        ])
+        cls.start = timezone.localtime().replace(microsecond=0) - timedelta(days=1)
+        Performance.objects.bulk_create([
+            Performance(timestamp=cls.start + timedelta(minutes=i // 2), module=f'module_{i % 2}', pegcounts={'a': i})
+            for i in range(7)
+        ])
+
+    def walk(self, url: str, params: dict) -> list:
+        """Get results of all pages following next links"""
+        results = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            results += response.data['results']
+            if response.data['next'] is None:
+                return results
+            response = self.client.get(response.data['next'])
+
+    def test_page_number_mode_is_default(self):
+        response = self.client.get(reverse('event-list-update'), {'page_size': 3, 'page': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 7)
+        self.assertEqual([event['id'] for event in response.data['results']], [event.id for event in self.events[3:6]])
+
+    def test_cursor_mode(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('event-list-update'), {'pagination': 'cursor', 'page_size': 3})
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertIn('cursor=', response.data['next'])
+        self.assertFalse([query for query in queries if 'COUNT(' in query['sql']])
+
+        events = self.walk(reverse('event-list-update'), {'pagination': 'cursor', 'page_size': 3})
+        self.assertEqual([event['id'] for event in events], [event.id for event in self.events])
+
+    def test_cursor_mode_with_filters(self):
+        events = self.walk(reverse('event-list-update'), {'pagination': 'cursor', 'page_size': 1, 'sid': 2})
+        self.assertEqual([event['src_addr'] for event in events], ['10.0.0.1', '10.0.0.6'])
+
+    def test_cursor_mode_of_other_lists(self):
+        rules = self.walk(reverse('rules-list'), {'pagination': 'cursor', 'page_size': 2})
+        self.assertEqual([rule['sid'] for rule in rules], [1, 2, 3, 4, 5])
+
+        params = {'pagination': 'cursor', 'page_size': 2, 'period_start': f'{self.start:%Y-%m-%d %H:%M:%S}',
+                  'period_stop': f'{self.start + timedelta(hours=1):%Y-%m-%d %H:%M:%S}'}
+        records = self.walk(reverse('performance-list'), params)
+        self.assertEqual([record['pegcounts']['a'] for record in records], list(range(7)))
+
+        requests = self.walk(reverse('request-list'), {
+            'pagination': 'cursor', 'page_size': 2, 'period_start': f'{timezone.localtime():%Y-%m-%d}',
+            'period_stop': f'{timezone.localtime() + timedelta(days=1):%Y-%m-%d}',
+        })
+        self.assertTrue(requests)
+        self.assertEqual(requests, sorted(requests, key=lambda request: request['id']))
+
+    def test_lists_without_cursor_use_pages(self):
+        params = {'pagination': 'cursor', 'delta': 'true', 'period_start': f'{self.start:%Y-%m-%d %H:%M:%S}',
+                  'period_stop': f'{self.start + timedelta(hours=1):%Y-%m-%d %H:%M:%S}'}
+        response = self.client.get(reverse('performance-list'), params)
+        self.assertEqual(response.data['count'], 2)
+
+        response = self.client.get(reverse('event-count-list'), {'type': 'sid', 'pagination': 'cursor'})
+        self.assertEqual(response.data['count'], 5)
@@ -0,0 +1,107 @@
+import threading
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from monitor.models import Event
+from monitor.partitions import create_partitions, drop_expired_partitions, get_partition_range, get_partitions
+from rule.models import Rule
+
+
+NOW = datetime(2024, 1, 13, 15, 30, tzinfo=timezone.utc)
+
+
+class EventPartitionsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.rule = Rule.objects.create(sid=1, rev=1, gid=1, action='alert')
+
+    def create_event(self, timestamp: datetime) -> Event:
+        return Event.objects.create(rule=self.rule, timestamp=timestamp, src_addr='10.0.0.1', src_port=1234,
+                                    dst_addr='10.0.0.2', dst_port=80, proto='TCP')
+
+    def get_partition_of(self, event: Event) -> str:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT tableoid::regclass::text FROM monitor_event WHERE id = %s', [event.id])
+            return cursor.fetchone()[0]
+
+    def test_get_partition_range(self):
+        self.assertEqual(get_partition_range(NOW, 1), (datetime(2024, 1, 13, tzinfo=timezone.utc),
+                                                       datetime(2024, 1, 14, tzinfo=timezone.utc)))
+        start, end = get_partition_range(NOW, 7)
+        self.assertTrue(start <= NOW < end)
+        self.assertEqual(end - start, timedelta(days=7))
+
+    def test_create_partitions(self):
+        self.assertEqual(create_partitions(2, NOW), ['monitor_event_p20240113', 'monitor_event_p20240114',
+                                                     'monitor_event_p20240115'])
+        self.assertEqual(create_partitions(3, NOW), ['monitor_event_p20240116'])
+        self.assertEqual(get_partitions()[0], ('monitor_event_p20240113', datetime(2024, 1, 13, tzinfo=timezone.utc),
+                                               datetime(2024, 1, 14, tzinfo=timezone.utc)))
+        event = self.create_event(NOW + timedelta(days=1))
+        self.assertEqual(self.get_partition_of(event), 'monitor_event_p20240114')
+
+    def test_events_are_moved_from_default_partition(self):
+        event = self.create_event(NOW)
+        old_event = self.create_event(NOW - timedelta(days=1))
+        with self.assertLogs('monitor', level='INFO'):
+            create_partitions(0, NOW)
+        self.assertEqual(self.get_partition_of(event), 'monitor_event_p20240113')
+        self.assertEqual(self.get_partition_of(old_event), 'monitor_event_default')
+        self.assertEqual(Event.objects.count(), 2)
+
+    def test_drop_expired_partitions(self):
+        create_partitions(1, NOW - timedelta(days=10))
+        self.create_event(NOW - timedelta(days=10))
+        self.create_event(NOW - timedelta(days=30))
+        kept = self.create_event(NOW - timedelta(days=1))
+        with connection.cursor() as cursor:
+            # deferred foreign key checks of the test transaction block DROP TABLE
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        dropped = drop_expired_partitions(7, NOW)
+        self.assertEqual(dropped, ['monitor_event_p20240103', 'monitor_event_p20240104'])
+        self.assertEqual(Event.objects.count(), 2)
+        self.assertTrue(Event.objects.filter(id=kept.id).exists())
+
+    def test_timestamp_filter_prunes_partitions(self):
+        create_partitions(1, NOW - timedelta(days=3))
+        queryset = Event.objects.filter(timestamp__gte=NOW - timedelta(days=1))
+        plan = queryset.explain()
+        self.assertNotIn('monitor_event_p20240110', plan)
+        self.assertIn('monitor_event_default', plan)
+
+    def test_partition_events_command(self):
+        out = StringIO()
+        call_command('partition_events', ahead=1, retention=7, stdout=out)
+        self.assertEqual(out.getvalue(), '2 partitions created, 0 partitions dropped.\n')
+
+
+class PartitionLockTest(TransactionTestCase):
+    def test_drop_skips_locked_partition(self):
+        create_partitions(0, NOW - timedelta(days=10))
+        locked, release = threading.Event(), threading.Event()
+
+        def read():
+            # like a long export, the reader keeps its transaction open
+            try:
+                with transaction.atomic():
+                    Event.objects.filter(timestamp__range=(NOW - timedelta(days=10), NOW - timedelta(days=9))).exists()
+                    locked.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        reader = threading.Thread(target=read)
+        reader.start()
+        try:
+            locked.wait(5)
+            with override_settings(PARTITION_LOCK_TIMEOUT=0.1), self.assertLogs('monitor', level='WARNING') as log:
+                self.assertEqual(drop_expired_partitions(7, NOW), [])
+            self.assertIn('Partition monitor_event_p20240103 is in use', log.output[0])
+        finally:
+            release.set()
+            reader.join()
+        self.assertEqual(drop_expired_partitions(7, NOW), ['monitor_event_p20240103'])
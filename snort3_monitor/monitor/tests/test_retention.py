@@ -0,0 +1,63 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from monitor.models import Event
+from performance_log.models import Performance
+from request_log.models import Request
+from rule.models import Rule
+from snort3_monitor.retention import RetentionPolicy, apply_retention, delete_in_chunks
+
+
+class RetentionTest(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        Performance.objects.bulk_create([
+            Performance(timestamp=now - timedelta(days=days), module='binder', pegcounts={})
+            for days in (40, 35, 20, 10, 1)
+        ])
+
+    def test_delete_in_chunks(self):
+        with CaptureQueriesContext(connection) as queries:
+            deleted = delete_in_chunks(Performance.objects.all(), chunk_size=2, pause=0)
+        self.assertEqual(deleted, 5)
+        self.assertFalse(Performance.objects.exists())
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('DELETE')]), 3)
+
+    def test_policy_by_age(self):
+        policy = RetentionPolicy('performance_log.Performance', date_field='timestamp', max_age_days=30)
+        report = apply_retention([policy], chunk_size=1, pause=0)
+        self.assertEqual(report[0]['model'], 'performance_log.Performance')
+        self.assertEqual(report[0]['deleted'], 2)
+        self.assertEqual(Performance.objects.count(), 3)
+
+    def test_policy_by_row_count(self):
+        newest = list(Performance.objects.order_by('-pk').values_list('pk', flat=True)[:2])
+        policy = RetentionPolicy('performance_log.Performance', max_rows=2)
+        self.assertEqual(apply_retention([policy], pause=0)[0]['deleted'], 3)
+        self.assertEqual(sorted(Performance.objects.values_list('pk', flat=True)), sorted(newest))
+
+    def test_policy_by_filters(self):
+        rule = Rule.objects.create(sid=1, rev=1, gid=1, action='alert', deprecated=True)
+        Rule.objects.create(sid=2, rev=1, gid=1, action='alert', deprecated=True)
+        Rule.objects.create(sid=3, rev=1, gid=1, action='alert')
+        Event.objects.create(rule=rule, timestamp=timezone.now(), src_addr='10.0.0.1', dst_addr='10.0.0.2', proto='TCP')
+        policy = RetentionPolicy('rule.Rule', filters={'deprecated': True, 'event__isnull': True})
+        self.assertEqual(apply_retention([policy], pause=0)[0]['deleted'], 1)
+        self.assertEqual(sorted(Rule.objects.values_list('sid', flat=True)), [1, 3])
+
+    def test_apply_retention_command(self):
+        Request.objects.create(user_addr='172.18.0.1', http_method='GET', endpoint='/api/v1/rules/', response=200,
+                               request_data={})
+        out = StringIO()
+        with self.assertLogs('monitor', level='INFO'):
+            call_command('apply_retention', pause=0, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertIn('performance_log.Performance: 2 rows deleted', lines[1])
+        self.assertIn('request_log.Request: 0 rows deleted', lines[2])
+        self.assertTrue(lines[-1].startswith('0 event partitions dropped, 2 rows deleted in'))
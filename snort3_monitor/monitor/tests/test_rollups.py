@@ -0,0 +1,187 @@
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone as django_timezone
+from rest_framework.test import APITestCase
+
+from monitor.ingest import copy_events
+from monitor.models import AddressRollup, Event, SidRollup
+from monitor.partitions import create_partition, drop_expired_partitions
+from monitor.rollups import count_by_address, count_by_sid, get_bucket, get_next_bucket
+from rule.models import Rule
+from snort3_monitor.retention import delete_in_chunks
+
+
+START = datetime(2024, 1, 13, tzinfo=timezone.utc)
+
+
+class RollupsTest(TestCase):
+    """Rollups count the same as a query of events after each kind of write"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.rules = Rule.objects.bulk_create([Rule(sid=sid, rev=1, gid=1, action='alert') for sid in (1, 2, 3)])
+        Event.objects.bulk_create([
+            Event(rule=cls.rules[i % 3], timestamp=START + timedelta(minutes=25 * i), src_addr=f'10.0.0.{i % 4}',
+                  dst_addr=None if i % 5 == 0 else '10.0.1.1', proto='TCP')
+            for i in range(40)
+        ])
+
+    def get_raw_counts(self, start: datetime = None) -> tuple:
+        """Get counts by sid and by pair of addresses from events"""
+        queryset = Event.objects.filter(mark_as_deleted=False)
+        if start is not None:
+            queryset = queryset.filter(timestamp__gte=start)
+        by_sid = queryset.values_list('rule__sid').annotate(count=Count('id'))
+        by_address = queryset.values_list('src_addr', 'dst_addr').annotate(count=Count('id'))
+        return (sorted(by_sid),
+                sorted((f'{src or ""}/{dst or ""}', count) for src, dst, count in by_address))
+
+    def get_rollup_counts(self, start: datetime = None) -> tuple:
+        """Get counts by sid and by pair of addresses from rollups"""
+        return (sorted((row['sid'], row['count']) for row in count_by_sid(start)),
+                sorted((row['addr_pair'], row['count']) for row in count_by_address(start)))
+
+    def assert_counts(self, start: datetime = None):
+        self.assertEqual(self.get_rollup_counts(start), self.get_raw_counts(start))
+
+    def test_get_bucket(self):
+        moment = START + timedelta(minutes=90)
+        self.assertEqual(get_bucket(moment), START + timedelta(hours=1))
+        self.assertEqual(get_next_bucket(moment), START + timedelta(hours=2))
+        self.assertEqual(get_next_bucket(START), START)
+
+    def test_insert(self):
+        self.assert_counts()
+        self.assertEqual(sum(SidRollup.objects.values_list('count', flat=True)), 40)
+        Event.objects.create(rule=self.rules[0], timestamp=START, src_addr='10.0.0.9', proto='UDP')
+        copy_events([(self.rules[1].id, START + timedelta(hours=30), '10.0.0.1', 1, '', 2, 'TCP')] * 3)
+        self.assert_counts()
+        self.assertEqual(AddressRollup.objects.get(bucket=START + timedelta(hours=30)).count, 3)
+
+    def test_start_inside_bucket(self):
+        for minutes in (0, 10, 60, 95, 400):
+            self.assert_counts(START + timedelta(minutes=minutes))
+
+    def test_update(self):
+        Event.objects.filter(rule=self.rules[0]).update(timestamp=START + timedelta(days=2), src_addr='10.9.9.9')
+        event = Event.objects.filter(rule=self.rules[1]).first()
+        event.rule = self.rules[2]
+        event.save()
+        self.assert_counts()
+        self.assert_counts(START + timedelta(days=1))
+
+    def test_mark_as_deleted(self):
+        Event.objects.filter(rule=self.rules[1]).update(mark_as_deleted=True)
+        self.assert_counts()
+        self.assertEqual([sid for sid, _ in self.get_rollup_counts()[0]], [1, 3])
+
+        response = self.client.patch(reverse('event-list-update'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_rollup_counts(), ([], []))
+
+    def test_delete(self):
+        delete_in_chunks(Event.objects.filter(timestamp__lt=START + timedelta(hours=5)), chunk_size=3, pause=0)
+        self.assert_counts()
+
+    def test_partitions(self):
+        create_partition(START, START + timedelta(days=1))
+        self.assert_counts()
+        drop_expired_partitions(0, now=START + timedelta(days=1))
+        self.assertFalse(SidRollup.objects.filter(bucket__lt=START + timedelta(days=1)).exists())
+        self.assert_counts()
+
+    def test_rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute('TRUNCATE monitor_sidrollup, monitor_addressrollup')
+        out = StringIO()
+        with self.assertLogs('monitor', level='INFO'):
+            call_command('rebuild_rollups', stdout=out)
+        self.assertEqual(out.getvalue(), 'Rollups are rebuilt from 40 events.\n')
+        self.assert_counts()
+
+
+class EventCountRollupsTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        rules = Rule.objects.bulk_create([Rule(sid=sid, rev=1, gid=1, action='alert') for sid in range(1, 6)])
+        Event.objects.bulk_create([
+            Event(rule=rules[i % 5], timestamp=START, src_addr='10.0.0.1', dst_addr='10.0.0.2', proto='TCP')
+            for i in range(15)
+        ])
+
+    def test_pages(self):
+        response = self.client.get(reverse('event-count-list'), {'type': 'sid', 'page_size': 2, 'page': 3})
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual(response.data['results'], [{'sid': '5', 'count': 3}])
+
+    def test_events_are_not_read(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('event-count-list'), {'type': 'addr', 'period': 'all'})
+        self.assertFalse([query for query in queries if 'monitor_event' in query['sql']])
+        self.assertEqual(response.data['results'], [{'addr_pair': '10.0.0.1/10.0.0.2', 'count': 15}])
+
+
+class EventCountGroupsTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        rules = Rule.objects.bulk_create([Rule(sid=sid, rev=1, gid=1, action='alert') for sid in (1, 2, 3)])
+        # sid 1 is the heavy hitter, events are spread over 10 hours from START
+        Event.objects.bulk_create([
+            Event(rule=rules[0 if i % 2 else i % 3], timestamp=START + timedelta(minutes=20 * i),
+                  src_addr=f'10.0.0.{i % 3}', dst_addr=None if i % 4 == 0 else '10.0.1.1', dst_port=80 + i % 2,
+                  proto='TCP' if i % 2 else 'UDP')
+            for i in range(30)
+        ])
+
+    def get_counts(self, params: dict) -> list:
+        response = self.client.get(reverse('event-count-list'), params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data['results']
+
+    def test_group_by(self):
+        results = self.get_counts({'group_by': 'sid,proto'})
+        self.assertEqual(results, [{'sid': 1, 'proto': 'UDP', 'count': 5}, {'sid': 2, 'proto': 'UDP', 'count': 5},
+                                   {'sid': 3, 'proto': 'UDP', 'count': 5}, {'sid': 1, 'proto': 'TCP', 'count': 15}])
+
+    def test_top(self):
+        results = self.get_counts({'group_by': 'sid', 'top': 2})
+        self.assertEqual(results, [{'sid': 1, 'count': 20}, {'sid': 2, 'count': 5}])
+        results = self.get_counts({'group_by': 'proto,sid', 'top': 1, 'period': 'all'})
+        self.assertEqual(results, [{'proto': 'TCP', 'sid': 1, 'count': 15}])
+
+    def test_time_bounds(self):
+        params = {'period_start': '2024-01-13 03:10', 'period_stop': '2024-01-13 07:30'}
+        queryset = Event.objects.filter(timestamp__gte=START + timedelta(hours=3, minutes=10),
+                                        timestamp__lte=START + timedelta(hours=7, minutes=30))
+        for group_by in ('sid', 'src_addr,dst_addr', 'dst_addr', 'proto,dst_port'):
+            with self.subTest(group_by=group_by), django_timezone.override(timezone.utc):
+                results = self.get_counts({'group_by': group_by, **params})
+                self.assertEqual(sum(row['count'] for row in results), queryset.count())
+        with django_timezone.override(timezone.utc):
+            results = self.get_counts({'group_by': 'src_addr,dst_addr', **params})
+        expected = queryset.values_list('src_addr', 'dst_addr').annotate(count=Count('id'))
+        self.assertEqual(sorted((row['src_addr'], row['dst_addr'], row['count']) for row in results),
+                         sorted((src, dst or '', count) for src, dst, count in expected))
+
+    def test_invalid_params(self):
+        errors = {
+            (('group_by', 'sid,port'),): "Unknown 'group_by' field, use sid, src_addr, dst_addr, dst_port, proto",
+            (('group_by', 'sid'), ('top', '0')): "'top' should be a positive integer",
+            (('group_by', 'sid'), ('top', '9' * 30)): "'top' should be at most 1000",
+            (('group_by', 'sid'), ('type', 'sid')): "Use either 'type' or 'group_by'",
+            (('type', 'sid'), ('top', '5')): "'top', 'period_start' and 'period_stop' are used with 'group_by'",
+            (('group_by', 'sid'), ('period_stop', '13.01.2024')):
+                "Use format YYYY-MM-DD HH:MM:SS (you can skip SS, MM, HH)",
+        }
+        for params, error in errors.items():
+            with self.subTest(params=params):
+                response = self.client.get(reverse('event-count-list'), dict(params))
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.data['error'], error)
@@ -1,7 +1,8 @@
 from django.test import TestCase
 from monitor.models import Event
 from rule.models import Rule
-from monitor.serializers import EventSerializer, EventCountAddressSerializer, EventCountRuleSerializer
+from monitor.serializers import (EVENT_ROW_FIELDS, EventSerializer, EventCountAddressSerializer,
+                                 EventCountRuleSerializer, serialize_event_rows)
 from django.utils import timezone
 
 
@@ -37,6 +38,11 @@ class EventSerializerTest(TestCase):
         self.assertEqual(serialized_data["src_addr"], self.event.src_addr)
         self.assertEqual(serialized_data["proto"], self.event.proto)
 
+    def test_serialize_event_rows(self):
+        unknown = Event.objects.create(rule=self.rule, timestamp=timezone.now(), src_addr='fe80::1', proto='')
+        rows = Event.objects.order_by('id').values(*EVENT_ROW_FIELDS)
+        self.assertEqual(serialize_event_rows(rows), EventSerializer([self.event, unknown], many=True).data)
+
     def test_invalid_data_validation(self):
         invalid_data = {
             'rule': 123,
@@ -0,0 +1,134 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase
+from rest_framework.test import APIRequestFactory
+
+from monitor.models import Event
+from monitor.views import EventCountList
+from performance_log.models import Performance
+from performance_log.views import PerformanceList
+from rule.models import Rule
+from snort3_monitor.singleflight import SingleFlight
+
+
+def request_concurrently(view, url: str, params: dict, count: int, table: str) -> tuple:
+    """Send identical requests from threads at once
+
+    Queries of table are slowed down, so all requests come
+    while the first one is running.
+    :return: Responses and SQL of queries of table
+    """
+    factory = APIRequestFactory()
+    barrier = threading.Barrier(count)
+    responses = [None] * count
+    queries = []
+
+    def slow_down(execute, sql, params, many, context):
+        if table in sql:
+            queries.append(sql)
+            time.sleep(0.3)
+        return execute(sql, params, many, context)
+
+    def send(number: int):
+        try:
+            barrier.wait()
+            with connection.execute_wrapper(slow_down):
+                responses[number] = view(factory.get(url, params))
+                responses[number].render()
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=send, args=(number,)) for number in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return responses, queries
+
+
+class SingleFlightTest(SimpleTestCase):
+    def test_concurrent_calls_share_execution(self):
+        flight = SingleFlight()
+        executed = []
+        barrier = threading.Barrier(5)
+        results = []
+
+        def func():
+            executed.append(1)
+            time.sleep(0.2)
+            return {'count': 1}
+
+        def call():
+            barrier.wait()
+            results.append(flight.do('key', func))
+
+        threads = [threading.Thread(target=call) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(executed), 1)
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(result is results[0] for result in results))
+
+        # finished call is not shared with later ones
+        flight.do('key', func)
+        self.assertEqual(len(executed), 2)
+        self.assertEqual(flight.calls, {})
+
+    def test_error_is_shared(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        errors = []
+
+        def fail():
+            started.set()
+            time.sleep(0.2)
+            raise ValueError('failed')
+
+        def call():
+            try:
+                flight.do('key', fail)
+            except ValueError as error:
+                errors.append(error)
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait()
+        follower = threading.Thread(target=call)
+        follower.start()
+        leader.join()
+        follower.join()
+        self.assertEqual(len(errors), 2)
+        self.assertEqual(flight.calls, {})
+
+
+class CoalescedListTest(TransactionTestCase):
+    def test_event_count(self):
+        rule = Rule.objects.create(sid=1, rev=1, gid=1, action='alert')
+        Event.objects.create(rule=rule, timestamp=datetime.now(timezone.utc), src_addr='10.0.0.1',
+                             dst_addr='10.0.0.2', proto='TCP')
+        responses, queries = request_concurrently(EventCountList.as_view(), '/api/v1/events/count/',
+                                                  {'type': 'addr', 'period': 'month'}, 10, 'monitor_addressrollup')
+        self.assertEqual([response.status_code for response in responses], [200] * 10)
+        self.assertTrue(all(response.data['results'] == [{'addr_pair': '10.0.0.1/10.0.0.2', 'count': 1}]
+                            for response in responses))
+        # one count of results and one page of them
+        self.assertEqual(len([sql for sql in queries if sql.startswith('SELECT COUNT(*)')]), 1)
+        self.assertEqual(len(queries), 2)
+
+    def test_performance_delta(self):
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        Performance.objects.bulk_create([
+            Performance(timestamp=start + timedelta(minutes=i), module='binder', pegcounts={'inspects': i})
+            for i in range(5)
+        ])
+        params = {'period_start': '2023-12-31', 'period_stop': '2024-01-02', 'delta': 'true'}
+        responses, queries = request_concurrently(PerformanceList.as_view(), '/api/v1/performance-log/', params, 10,
+                                                  'performance_log_performance')
+        self.assertTrue(all(response.data['results'] == [{'module': 'binder', 'pegcounts': {'inspects': 10}}]
+                            for response in responses))
+        self.assertEqual(len(queries), 1)
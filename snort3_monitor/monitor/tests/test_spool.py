@@ -0,0 +1,69 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from spool import Spool
+
+
+class SpoolTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'alert_json')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_empty_spool_without_directory(self):
+        spool = Spool(self.path)
+        self.assertTrue(spool.is_empty())
+        self.assertEqual(list(spool.read()), [])
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_append_and_read(self):
+        spool = Spool(self.path)
+        first = spool.append(([1, 2], [], {'offset': 10}))
+        second = spool.append(([3], [], {'offset': 20}))
+        self.assertLess(first, second)
+        self.assertEqual(list(spool.read()), [(first, ([1, 2], [], {'offset': 10})),
+                                              (second, ([3], [], {'offset': 20}))])
+        self.assertEqual([record for _, record in spool.read(after=first)], [([3], [], {'offset': 20})])
+        self.assertEqual(spool.records, 2)
+
+    def test_segments_are_removed_when_consumed(self):
+        spool = Spool(self.path, segment_size=1)
+        sequences = [spool.append(i) for i in range(3)]
+        self.assertEqual(len(spool.get_segments()), 3)
+        spool.remove_through(sequences[1])
+        self.assertEqual([record for _, record in spool.read()], [2])
+        self.assertEqual(spool.records, 1)
+        spool.remove_through(sequences[2])
+        self.assertTrue(spool.is_empty())
+        self.assertEqual(spool.size, 0)
+
+    def test_reopen_spool(self):
+        spool = Spool(self.path)
+        spool.append('first')
+        last = spool.append('last')
+        spool.close()
+        spool = Spool(self.path)
+        self.assertEqual((spool.records, spool.sequence, spool.last_record), (2, last, 'last'))
+        self.assertGreater(spool.append('next'), last)
+
+    def test_torn_record_is_cut_off(self):
+        spool = Spool(self.path)
+        spool.append('complete')
+        size = spool.size
+        spool.file.write(b'\x00\x00\x00')
+        spool.close()
+        with self.assertLogs('monitor', level='WARNING'):
+            spool = Spool(self.path)
+        self.assertEqual((spool.records, spool.size, spool.last_record), (1, size, 'complete'))
+        self.assertEqual(os.path.getsize(spool.get_segments()[0]), size)
+
+    def test_status(self):
+        spool = Spool(self.path)
+        self.assertEqual(Spool.read_status(self.path)['records'], 0)
+        spool.append('record')
+        spool.write_status()
+        status = Spool.read_status(self.path)
+        self.assertEqual((status['records'], status['segments']), (1, 1))
@@ -0,0 +1,173 @@
+import os
+import tempfile
+import threading
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+from tailer import Checkpoint, LatencyStats, Tailer
+from watcher_perf import is_complete_record
+
+
+class TailerTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'alert_json.txt')
+        with open(self.path, 'w') as f:
+            f.write('first\n')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def append_later(self, path: str, delay: float = 0.1):
+        def append():
+            time.sleep(delay)
+            with open(path, 'a') as f:
+                f.write('next\n')
+        threading.Thread(target=append).start()
+
+    def test_wait_returns_on_modification(self):
+        tailer = Tailer(self.path)
+        tailer.start()
+        self.assertIsNotNone(tailer.inotify)
+        self.append_later(self.path)
+        started = time.monotonic()
+        self.assertTrue(tailer.wait(5))
+        self.assertLess(time.monotonic() - started, 1)
+        tailer.close()
+
+    def test_wait_returns_on_creation_after_rotation(self):
+        tailer = Tailer(self.path)
+        os.rename(self.path, self.path + '.1')
+        tailer.wait(0.1)
+        self.append_later(self.path)
+        self.assertTrue(tailer.wait(5))
+        tailer.close()
+
+    def test_wait_timeout_without_changes(self):
+        tailer = Tailer(self.path)
+        self.assertFalse(tailer.wait(0.1))
+        tailer.close()
+
+    def test_polling_fallback(self):
+        tailer = Tailer(self.path, poll_interval=0.01)
+        with patch('tailer.Inotify', side_effect=OSError('not supported')):
+            self.assertFalse(tailer.wait(0.05))
+        self.assertIsNone(tailer.inotify)
+        self.append_later(self.path, delay=0.05)
+        self.assertTrue(tailer.wait(5))
+
+    def read_all(self, tailer: Tailer, checkpoint: Checkpoint):
+        chunks = list(tailer.read(checkpoint))
+        return b''.join(data for data, _ in chunks), chunks[-1][1] if chunks else checkpoint
+
+    def test_read_from_checkpoint(self):
+        tailer = Tailer(self.path)
+        data, checkpoint = self.read_all(tailer, Checkpoint())
+        self.assertEqual(data, b'first\n')
+        with open(self.path, 'a') as f:
+            f.write('second\n')
+        data, checkpoint = self.read_all(tailer, checkpoint)
+        self.assertEqual(data, b'second\n')
+        self.assertEqual(checkpoint.offset, 13)
+        self.assertEqual(checkpoint.inode, os.stat(self.path).st_ino)
+
+    def test_read_drains_rotated_file(self):
+        tailer = Tailer(self.path)
+        _, checkpoint = self.read_all(tailer, Checkpoint())
+        with open(self.path, 'a') as f:
+            f.write('last of old\n')
+        os.rename(self.path, self.path + '.1705152575')
+        with open(self.path, 'w') as f:
+            f.write('new\n')
+        data, checkpoint = self.read_all(tailer, checkpoint)
+        self.assertEqual(data, b'last of old\nnew\n')
+        self.assertEqual(checkpoint.inode, os.stat(self.path).st_ino)
+        self.assertEqual(checkpoint.offset, 4)
+
+    def test_read_truncated_file(self):
+        tailer = Tailer(self.path)
+        _, checkpoint = self.read_all(tailer, Checkpoint())
+        with open(self.path, 'w') as f:
+            f.write('a\n')
+        data, checkpoint = self.read_all(tailer, checkpoint)
+        self.assertEqual(data, b'a\n')
+        self.assertEqual(checkpoint.offset, 2)
+
+    def test_read_rewritten_file_with_same_size(self):
+        tailer = Tailer(self.path)
+        _, checkpoint = self.read_all(tailer, Checkpoint())
+        with open(self.path, 'w') as f:
+            f.write('other\nmore\n')
+        data, _ = self.read_all(tailer, checkpoint)
+        self.assertEqual(data, b'other\nmore\n')
+
+    def test_read_legacy_offset(self):
+        tailer = Tailer(self.path)
+        data, _ = self.read_all(tailer, Checkpoint.loads('3'))
+        self.assertEqual(data, b'st\n')
+        data, _ = self.read_all(tailer, Checkpoint.loads('100'))
+        self.assertEqual(data, b'first\n')
+
+    def test_read_in_chunks_of_complete_lines(self):
+        with open(self.path, 'a') as f:
+            f.write('second line\nthird\npartial')
+        tailer = Tailer(self.path, chunk_size=4)
+        chunks = list(tailer.read(Checkpoint()))
+        self.assertEqual([data for data, _ in chunks], [b'first\n', b'second line\n', b'third\n'])
+        self.assertEqual([checkpoint.offset for _, checkpoint in chunks], [6, 18, 24])
+
+    def test_partial_line_is_read_when_completed(self):
+        with open(self.path, 'a') as f:
+            f.write('part')
+        tailer = Tailer(self.path)
+        data, checkpoint = self.read_all(tailer, Checkpoint())
+        self.assertEqual(data, b'first\n')
+        with open(self.path, 'a') as f:
+            f.write('ial\n')
+        data, _ = self.read_all(tailer, checkpoint)
+        self.assertEqual(data, b'partial\n')
+
+    def test_partial_line_is_read_without_holding(self):
+        with open(self.path, 'a') as f:
+            f.write('{"last": 1}')
+        tailer = Tailer(self.path, hold_partial_line=False)
+        data, checkpoint = self.read_all(tailer, Checkpoint())
+        self.assertEqual(data, b'first\n{"last": 1}')
+        self.assertEqual(checkpoint.offset, 17)
+
+    def test_incomplete_record_is_held(self):
+        with open(self.path, 'a') as f:
+            f.write('[{"timestamp": 1, "binder": {"ins')
+        tailer = Tailer(self.path, is_complete=is_complete_record)
+        data, checkpoint = self.read_all(tailer, Checkpoint())
+        self.assertEqual(data, b'first\n')
+        with open(self.path, 'a') as f:
+            f.write('pects": 1}}')
+        data, checkpoint = self.read_all(tailer, checkpoint)
+        self.assertEqual(data, b'[{"timestamp": 1, "binder": {"inspects": 1}}')
+        self.assertEqual(checkpoint.offset, os.path.getsize(self.path))
+
+    def test_partial_line_of_rotated_file_is_drained(self):
+        tailer = Tailer(self.path)
+        _, checkpoint = self.read_all(tailer, Checkpoint())
+        with open(self.path, 'a') as f:
+            f.write('unfinished')
+        os.rename(self.path, self.path + '.1')
+        with open(self.path, 'w') as f:
+            f.write('new\n')
+        data, _ = self.read_all(tailer, checkpoint)
+        self.assertEqual(data, b'unfinishednew\n')
+
+    def test_checkpoint_serialization(self):
+        checkpoint = Checkpoint(1, 2, 3, 'abc')
+        self.assertEqual(Checkpoint.loads(checkpoint.dumps()), checkpoint)
+
+
+class LatencyStatsTest(TestCase):
+    def test_report(self):
+        stats = LatencyStats('Test watcher', report_interval=0)
+        with self.assertLogs('monitor', level='INFO') as log:
+            stats.add(10, 0.002)
+        self.assertIn('Test watcher: 10 records in 1 batches', log.output[0])
+        self.assertEqual(stats.records, 0)
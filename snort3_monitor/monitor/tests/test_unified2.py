@@ -0,0 +1,138 @@
+import os
+import socket
+import tempfile
+from unittest import TestCase as SimpleTestCase
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from alert_decoder import Alert
+from monitor.ingest import parse_unified2
+from monitor.models import DeadLetter, Event, LogCheckpoint
+from rule.models import Rule
+from tailer import Checkpoint
+from unified2 import (EVENT3, IDS_EVENT_VLAN, LEGACY_EVENTS, RECORD_HEADER, Unified2Reader, decode_event,
+                      get_complete_size, iter_records, pack_event, pack_packet)
+from watcher_alert import Unified2Watch
+
+
+def make_records(count: int, sid: int = 1, seconds: int = 1705152575) -> bytes:
+    records = []
+    for i in range(count):
+        records.append(pack_event(sid, 1, 1, seconds, '10.0.0.1', 1024 + i, '192.168.1.1', 80, 6, i))
+        records.append(pack_packet(seconds, b'\x00' * 60, i))
+    return b''.join(records)
+
+
+class DecodeUnified2Test(SimpleTestCase):
+    def test_decode_event3_ipv4(self):
+        record_type, body = next(iter_records(pack_event(2001, 3, 1, 1705152575, '10.0.0.1', 1234,
+                                                         '192.168.1.1', 80, 6)))
+        self.assertEqual(record_type, EVENT3)
+        self.assertEqual(decode_event(record_type, body),
+                         Alert(1705152575, 2001, 3, 1, '10.0.0.1', 1234, '192.168.1.1', 80, 'TCP', '', ''))
+
+    def test_decode_event3_ipv6_icmp(self):
+        _, body = next(iter_records(pack_event(1, 1, 1, 1705152575, 'fe80::1', 8, 'ff02::1', 0, 58)))
+        self.assertEqual(decode_event(EVENT3, body)[4:9], ('fe80::1', None, 'ff02::1', None, 'ICMP'))
+
+    def test_decode_legacy_event(self):
+        record, _ = LEGACY_EVENTS[IDS_EVENT_VLAN]
+        body = record.pack(0, 1, 1705152575, 0, 2001, 1, 3, 0, 3, socket.inet_aton('10.0.0.1'),
+                           socket.inet_aton('192.168.1.1'), 53, 53, 17, 0, 0, 0, 0, 0, 0)
+        self.assertEqual(decode_event(IDS_EVENT_VLAN, body),
+                         Alert(1705152575, 2001, 3, 1, '10.0.0.1', 53, '192.168.1.1', 53, 'UDP', '', ''))
+
+    def test_incomplete_record_is_left(self):
+        data = make_records(2)
+        self.assertEqual(get_complete_size(data[:-1]), len(data) - len(pack_packet(0, b'\x00' * 60)))
+        self.assertEqual(len(list(iter_records(data[:-1]))), 3)
+
+    def test_parse_unified2(self):
+        broken = RECORD_HEADER.pack(EVENT3, 4) + b'\x00' * 4
+        alerts, rejected = parse_unified2(make_records(2) + broken)
+        self.assertEqual([alert[1:6] for alert in alerts], [(1, 1, 1, '10.0.0.1', 1024), (1, 1, 1, '10.0.0.1', 1025)])
+        self.assertEqual(alerts[0][0].timestamp(), 1705152575)
+        self.assertEqual(rejected, [(DeadLetter.Reason.DECODE, 'Unified2 record of type 114, 4 bytes: 00000000')])
+
+
+class Unified2ReaderTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'unified2.log')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, timestamp: int, data: bytes):
+        with open(f'{self.path}.{timestamp}', 'ab') as f:
+            f.write(data)
+
+    def read_all(self, reader: Unified2Reader, checkpoint: Checkpoint):
+        chunks = list(reader.read(checkpoint))
+        return b''.join(data for data, _ in chunks), chunks[-1][1] if chunks else checkpoint
+
+    def test_files_are_read_in_order_of_timestamps(self):
+        self.write(1705152600, make_records(1, sid=3))
+        self.write(99, make_records(1, sid=1))
+        self.write(1705152575, make_records(1, sid=2))
+        self.write(1705152575, b'\x00\x00')
+        with open(self.path + '.bak', 'wb') as f:
+            f.write(b'not unified2')
+        reader = Unified2Reader(self.path, chunk_size=100)
+        with self.assertLogs('monitor', level='WARNING'):
+            data, checkpoint = self.read_all(reader, Checkpoint())
+        self.assertEqual([alert[1] for alert in parse_unified2(data)[0]], [1, 2, 3])
+        self.assertEqual(checkpoint.inode, os.stat(f'{self.path}.1705152600').st_ino)
+
+    def test_read_from_checkpoint_and_hold_incomplete_record(self):
+        self.write(1, make_records(2))
+        reader = Unified2Reader(self.path)
+        data, checkpoint = self.read_all(reader, Checkpoint())
+        self.assertEqual(len(parse_unified2(data)[0]), 2)
+
+        record = make_records(1, sid=5)
+        self.write(1, record[:10])
+        data, checkpoint = self.read_all(reader, checkpoint)
+        self.assertEqual(data, b'')
+        self.write(1, record[10:])
+        self.write(2, make_records(1, sid=6))
+        data, checkpoint = self.read_all(reader, checkpoint)
+        self.assertEqual([alert[1] for alert in parse_unified2(data)[0]], [5, 6])
+        self.assertEqual(self.read_all(reader, checkpoint)[0], b'')
+
+    def test_new_file_is_noticed(self):
+        reader = Unified2Reader(self.path)
+        reader.wait(0.1)
+        self.write(1705152575, make_records(1))
+        self.assertTrue(reader.wait(5))
+        self.assertEqual(reader.get_status()[0], f'{self.path}.1705152575')
+        reader.close()
+
+
+class Unified2WatchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.rule = Rule.objects.create(sid=1, rev=1, gid=1, action='alert')
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(self.directory.name, 'unified2.log')
+        with patch.object(Unified2Watch, 'watch_file', path), \
+                patch.object(Unified2Watch, 'spool_dir', os.path.join(self.directory.name, 'spool')):
+            self.watcher = Unified2Watch()
+        with open(path + '.1705152575', 'wb') as f:
+            f.write(make_records(3) + make_records(1, sid=2))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_read_data(self):
+        self.watcher.rules.load()
+        with self.assertLogs('monitor', level='INFO'):
+            saved = self.watcher.read_data()
+        self.assertEqual(saved, 4)
+        self.assertEqual(Event.objects.filter(rule=self.rule).count(), 3)
+        self.assertTrue(Rule.objects.get(sid=2).placeholder)
+        self.assertEqual(LogCheckpoint.get_position('unified2')['offset'], len(make_records(4)))
+        self.assertEqual(self.watcher.read_data(), 0)
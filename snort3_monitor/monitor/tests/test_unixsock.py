@@ -0,0 +1,91 @@
+import os
+import socket
+import tempfile
+from unittest import TestCase as SimpleTestCase
+from unittest.mock import patch
+
+from django.db import OperationalError
+from django.test import TestCase
+
+from alert_decoder import Alert, decode_alert_packet
+from monitor.ingest import RuleCache
+from monitor.models import DeadLetter, Event
+from receiver_unixsock import UnixSockWatch, parse_datagrams
+from rule.models import Rule
+from unixsock_harness import build_alert_packet
+
+
+class DecodeAlertPacketTest(SimpleTestCase):
+    def test_decode_ipv4(self):
+        datagram = build_alert_packet(2001, 3, 1, 'Test alert', '10.0.0.1', 1234, '192.168.1.1', 80, 'TCP', 1705152575)
+        self.assertEqual(decode_alert_packet(datagram),
+                         Alert(1705152575, 2001, 3, 1, '10.0.0.1', 1234, '192.168.1.1', 80, 'TCP', 'Test alert', ''))
+
+    def test_decode_ipv6(self):
+        alert = decode_alert_packet(build_alert_packet(1, src_addr='fe80::1', dst_addr='ff02::fb', src_port=5353,
+                                                       dst_port=5353, proto='UDP'))
+        self.assertEqual(alert[4:9], ('fe80::1', 5353, 'ff02::fb', 5353, 'UDP'))
+
+    def test_decode_icmp_without_ports(self):
+        alert = decode_alert_packet(build_alert_packet(1, proto='ICMP'))
+        self.assertEqual(alert[4:9], ('10.0.0.1', None, '192.168.1.1', None, 'ICMP'))
+
+    def test_decode_without_packet(self):
+        alert = decode_alert_packet(build_alert_packet(29456, 1, 116, seconds=1705152575, with_packet=False))
+        self.assertEqual(alert, Alert(1705152575, 29456, 1, 116, '', None, '', None, '', 'Synthetic alert', ''))
+
+    def test_decode_wrong_size(self):
+        with self.assertRaises(ValueError):
+            decode_alert_packet(b'\x00' * 100)
+
+
+class UnixSockWatchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.rule = Rule.objects.create(sid=1, rev=1, gid=1, action='alert')
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        with patch.object(UnixSockWatch, 'spool_dir', os.path.join(self.directory.name, 'spool')):
+            self.receiver = UnixSockWatch(batch_size=3)
+        self.receiver.socket_path = os.path.join(self.directory.name, 'snort_alert')
+        self.receiver.max_wait = 0.5
+        self.receiver.rules.load()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_parse_datagrams(self):
+        alerts, rejected = parse_datagrams([build_alert_packet(1, seconds=1705152575), b'short'])
+        self.assertEqual(alerts[0][1:4], (1, 1, 1))
+        self.assertEqual(alerts[0][0].timestamp(), 1705152575)
+        self.assertEqual(rejected, [(DeadLetter.Reason.DECODE, 'Datagram of 5 bytes: 73686f7274')])
+
+    def test_receive_and_save_batches(self):
+        with self.assertLogs('monitor', level='INFO'):
+            sock = self.receiver.bind()
+        sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            for port in range(4):
+                sender.sendto(build_alert_packet(1, src_port=port), self.receiver.socket_path)
+            first, received_at = self.receiver.receive_batch(sock)
+            second, _ = self.receiver.receive_batch(sock)
+            empty, _ = self.receiver.receive_batch(sock)
+        finally:
+            sender.close()
+            sock.close()
+        self.assertEqual((len(first), len(second), len(empty)), (3, 1, 0))
+        self.assertIsNotNone(received_at)
+
+        self.receiver.store(*parse_datagrams(first + second))
+        self.assertEqual(sorted(Event.objects.filter(rule=self.rule).values_list('src_port', flat=True)), [0, 1, 2, 3])
+
+    def test_run_starts_while_database_is_down(self):
+        self.receiver.rules = RuleCache()
+        with patch.object(RuleCache, 'load', side_effect=OperationalError('connection refused')), \
+                patch.object(UnixSockWatch, 'receive_batch', side_effect=KeyboardInterrupt):
+            with self.assertLogs('monitor', level='INFO') as log:
+                self.receiver.run()
+        self.assertIn('rules are not loaded', log.output[1])
+        self.assertIn('Unix socket alert receiver stopped.', log.output[-1])
+        self.assertFalse(os.path.exists(self.receiver.socket_path))
@@ -1,8 +1,14 @@
 from django.urls import path
 
-from monitor.views import EventListUpdate, EventCountList
+from monitor.views import (DeadLetterList, DeadLetterReprocess, EventCountList, EventExport, EventHistogram,
+                           EventListUpdate, SpoolStatus)
 
 urlpatterns = [
     path("", EventListUpdate.as_view(), name='event-list-update'),
     path("count/", EventCountList.as_view(), name='event-count-list'),
+    path("histogram/", EventHistogram.as_view(), name='event-histogram'),
+    path("export/", EventExport.as_view(), name='event-export'),
+    path("dead-letters/", DeadLetterList.as_view(), name='dead-letter-list'),
+    path("dead-letters/reprocess/", DeadLetterReprocess.as_view(), name='dead-letter-reprocess'),
+    path("spool/", SpoolStatus.as_view(), name='spool-status'),
 ]
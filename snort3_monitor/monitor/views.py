@@ -1,28 +1,50 @@
-from datetime import timedelta
+import ipaddress
+import logging
+import re
+import threading
+from datetime import datetime, timedelta
 
-from django.db.models import Count, Value
-from django.db.models.functions import Concat
-from django.db.models import F
+from django.conf import settings
+from django.db import connections
 from django.db.models.query import QuerySet
+from django.http import StreamingHttpResponse
 from django.utils import timezone
+from django.utils.timezone import make_aware
 from rest_framework import generics, status
 from rest_framework.exceptions import ValidationError
+from rest_framework.fields import DateTimeField
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from .models import Event
-from .serializers import EventSerializer, EventCountAddressSerializer, EventCountRuleSerializer
+from rule.models import Rule
+from snort3_monitor.cache import CachedListMixin, bump_data_version
+from snort3_monitor.pagination import MAX_PAGE_SIZE, PAGINATION_PARAMS
+from snort3_monitor.singleflight import CoalescedListMixin
+from spool import Spool
+from .export import FORMATS, export_events
+from .ingest import RuleCache, reprocess_dead_letters
+from .models import DeadLetter, Event
+from .rollups import (GROUP_FIELDS, AggregateList, count_by_address, count_by_fields, count_by_sid, count_by_time,
+                      get_bucket)
+from .serializers import (EVENT_ROW_FIELDS, DeadLetterSerializer, EventSerializer, EventCountAddressSerializer,
+                          EventCountGroupSerializer, EventCountRuleSerializer, serialize_event_rows)
+
+
+logger = logging.getLogger('monitor')
 
 
 class EventListUpdate(generics.UpdateAPIView, generics.ListAPIView):
     queryset = Event.objects.filter(mark_as_deleted=False)
     serializer_class = EventSerializer
+    cursor_ordering = ('id',)
 
     def get_queryset(self) -> QuerySet:
         """Perform filtering and ordering data
 
-        Client can use only allowed_params in query.
+        Client can use only allowed_params in query,
+        src_net and dst_net filter addresses by CIDR network.
         """
-        allowed_params = ['src_addr', 'src_port', 'dst_addr', 'dst_port', 'sid', 'proto']
+        allowed_params = ['src_addr', 'src_port', 'dst_addr', 'dst_port', 'sid', 'proto', 'src_net', 'dst_net']
         queryset = super().get_queryset()
 
         # if method=PATCH, we don't need to process queries
@@ -30,36 +52,49 @@ class EventListUpdate(generics.UpdateAPIView, generics.ListAPIView):
             return queryset
 
         params = self.request.query_params
-        params = {key: value for key, value in params.items()}
-        if params:
-            validate_params(params.keys(), allowed_params)
+        validate_params(params.keys(), allowed_params)
+        params = {key: value for key, value in params.items() if key not in PAGINATION_PARAMS}
 
-            # changing sid key
-            if params.get('sid') is not None:
-                params['rule__sid'] = params.pop('sid')
+        queryset = queryset.filter(**get_event_filters(params))
+        return queryset.order_by('id')
 
-            if params.get('page') is not None:
-                params.pop('page')
+    def list(self, request, *args, **kwargs) -> Response:
+        """Paginate events as flat rows
 
-            queryset = queryset.filter(**params)
-        return queryset.order_by('id')
+        A page costs a query of events and a query of their rules
+        (a join would stay in COUNT of page-number mode), it is
+        serialized without DRF fields like EventSerializer does.
+        """
+        queryset = self.get_queryset().values(*EVENT_ROW_FIELDS)
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(serialize_event_rows(queryset))
+        return self.get_paginated_response(serialize_event_rows(page))
 
     def patch(self, request, *args, **kwargs) -> Response:
         """Mark all events as deleted to exclude them"""
         queryset = self.get_queryset()
         queryset.update(mark_as_deleted=True)
+        bump_data_version(Event)
         return Response({"message": "All events are marked as deleted."}, status=status.HTTP_200_OK)
 
 
-class EventCountList(generics.ListAPIView):
-    queryset = Event.objects.filter(mark_as_deleted=False)
+class EventCountList(CachedListMixin, CoalescedListMixin, generics.ListAPIView):
+    cache_models = (Event, Rule)
+    # periods are counted back from now
+    cache_slot = 60
 
-    def get_queryset(self) -> QuerySet:
+    def get_queryset(self) -> AggregateList:
         """Perform filtering and ordering data
 
-        Client can use only allowed_params in query.
+        Client can use only allowed_params in query. Counts
+        are summed from hourly rollups, events of the first
+        incomplete hour of period are counted from the table.
+        Instead of type, group_by takes a comma separated list
+        of GROUP_FIELDS, these groups can be bounded by
+        period_start and period_stop and limited to top ones.
         """
-        queryset = super().get_queryset()
+        period_start = None
         periods = {
             'all': None,
             'day': timedelta(days=1),
@@ -67,21 +102,25 @@ class EventCountList(generics.ListAPIView):
             'month': timedelta(days=30)
         }
 
-        allowed_params = ['type', 'period']
+        allowed_params = ['type', 'period', 'group_by', 'top', 'period_start', 'period_stop']
         params = self.request.query_params
         params = {key: value for key, value in params.items()}
 
         # check existing type parameter
-        if params.get('type') is None:
-            raise ValidationError({"error": "You should define 'type' of filter (sid or addr)"})
+        if params.get('type') is None and params.get('group_by') is None:
+            raise ValidationError({"error": "You should define 'type' of filter (sid or addr) or 'group_by'"})
 
         validate_params(params.keys(), allowed_params)
 
+        if params.get('group_by') is not None:
+            return self.get_groups(params)
+        if {'top', 'period_start', 'period_stop'} & set(params):
+            raise ValidationError({"error": "'top', 'period_start' and 'period_stop' are used with 'group_by'"})
+
         # check if period is known and filter it
         if params.get('period') is not None:
             if periods.get(params.get('period')) is not None:
                 period_start = timezone.now() - periods[params.get('period')]
-                queryset = queryset.filter(timestamp__gte=period_start)
             else:
                 if params.get('period') != 'all':
                     raise ValidationError({"error": "Unknown 'period', use 'all', 'day', 'week' or 'month'"})
@@ -89,24 +128,190 @@ class EventCountList(generics.ListAPIView):
         # aggregation
         if params.get('type') == 'addr':
             EventCountList.serializer_class = EventCountAddressSerializer
-            queryset = (
-                queryset
-                .annotate(addr_pair=Concat('src_addr', Value('/'), 'dst_addr'))
-                .values('addr_pair')
-                .annotate(count=Count('addr_pair'))
-            )
+            return count_by_address(period_start)
         elif params.get('type') == 'sid':
             EventCountList.serializer_class = EventCountRuleSerializer
-            queryset = (
-                queryset
-                .values(sid=F('rule__sid'))
-                .annotate(count=Count('rule__sid'))
-            )
+            return count_by_sid(period_start)
         else:
             raise ValidationError(
                 {"error": "Unknown 'type', use 'sid' or 'addr'"})
 
-        return queryset.order_by('count')
+    @staticmethod
+    def get_groups(params: dict):
+        """Count events by group_by fields, top groups first if top is given"""
+        EventCountList.serializer_class = EventCountGroupSerializer
+        fields = list(dict.fromkeys(field.strip() for field in params['group_by'].split(',')))
+        if not set(fields) <= set(GROUP_FIELDS):
+            raise ValidationError({"error": f"Unknown 'group_by' field, use {', '.join(GROUP_FIELDS)}"})
+        if params.get('type') is not None:
+            raise ValidationError({"error": "Use either 'type' or 'group_by'"})
+
+        top = params.get('top')
+        if top is not None:
+            if not re.fullmatch(r'\d+', top) or int(top) == 0:
+                raise ValidationError({"error": "'top' should be a positive integer"})
+            top = int(top)
+            if top > MAX_PAGE_SIZE:
+                raise ValidationError({"error": f"'top' should be at most {MAX_PAGE_SIZE}"})
+
+        if params.get('period') is not None and params.get('period_start') is not None:
+            raise ValidationError({"error": "Use either 'period' or 'period_start'"})
+        start, stop = None, None
+        if params.get('period_start') is not None:
+            start = validate_date(params['period_start'])
+        elif params.get('period') not in (None, 'all'):
+            periods = {'day': timedelta(days=1), 'week': timedelta(days=7), 'month': timedelta(days=30)}
+            if params['period'] not in periods:
+                raise ValidationError({"error": "Unknown 'period', use 'all', 'day', 'week' or 'month'"})
+            start = timezone.now() - periods[params['period']]
+        if params.get('period_stop') is not None:
+            stop = validate_date(params['period_stop'])
+        return count_by_fields(fields, start, stop, top)
+
+
+class EventHistogram(APIView):
+    # bounds of interval param and units of it
+    MIN_INTERVAL = timedelta(minutes=1)
+    MAX_INTERVAL = timedelta(days=1)
+    UNITS = {'m': timedelta(minutes=1), 'h': timedelta(hours=1), 'd': timedelta(days=1)}
+    MAX_BUCKETS = 10000
+
+    def get(self, request, *args, **kwargs) -> Response:
+        """Count events from start till stop in buckets of interval
+
+        All buckets of the range are sent, empty ones with zero
+        count. Buckets are aligned to epoch in UTC, so the first
+        one can start before start.
+        """
+        allowed_params = ['start', 'stop', 'interval', 'sid', 'src_addr', 'dst_addr', 'src_net', 'dst_net']
+        params = {key: value for key, value in request.query_params.items() if key not in PAGINATION_PARAMS}
+        validate_params(params.keys(), allowed_params)
+
+        if not (params.get('start') and params.get('stop')):
+            raise ValidationError({"error": "You should define 'start' and 'stop'."})
+        start = validate_date(params.pop('start'))
+        stop = validate_date(params.pop('stop'))
+        if start > stop:
+            raise ValidationError({"error": "'start' should be before 'stop'"})
+        interval_param = params.pop('interval', '1h')
+        interval = self.validate_interval(interval_param)
+        if (stop - start) // interval >= self.MAX_BUCKETS:
+            raise ValidationError({"error": f"The range has to be less than {self.MAX_BUCKETS} intervals"})
+
+        counts = count_by_time(interval, start, stop, get_event_filters(params))
+        to_timestamp = DateTimeField().to_representation
+        buckets = []
+        bucket = get_bucket(start, interval)
+        while bucket <= stop:
+            buckets.append({'timestamp': to_timestamp(bucket), 'count': counts.get(bucket, 0)})
+            bucket += interval
+        return Response({'interval': interval_param, 'count': sum(counts.values()), 'buckets': buckets},
+                        status=status.HTTP_200_OK)
+
+    @classmethod
+    def validate_interval(cls, value: str) -> timedelta:
+        """Validate interval like 5m, 1h or 1d
+
+        1d is 1440m, longer numbers are not taken, so they do
+        not overflow timedelta.
+        """
+        match = re.fullmatch(r'(\d{1,4})([mhd])', value)
+        if match is not None:
+            interval = int(match[1]) * cls.UNITS[match[2]]
+            if cls.MIN_INTERVAL <= interval <= cls.MAX_INTERVAL:
+                return interval
+        raise ValidationError({"error": "'interval' should be from 1m to 1d, like 5m, 1h or 1d"})
+
+
+class EventExport(APIView):
+    def get(self, request, *args, **kwargs) -> StreamingHttpResponse:
+        """Stream events as a file of output format, ndjson or csv
+
+        Events are filtered like in EventListUpdate and bounded
+        by period_start and period_stop, the file is compressed
+        on the fly if gzip=true. Rows are read from a server-side
+        cursor in chunks of EXPORT_CHUNK_SIZE.
+        """
+        allowed_params = ['src_addr', 'src_port', 'dst_addr', 'dst_port', 'sid', 'proto', 'src_net', 'dst_net',
+                          'period_start', 'period_stop', 'output', 'gzip']
+        params = {key: value for key, value in request.query_params.items() if key not in PAGINATION_PARAMS}
+        validate_params(params.keys(), allowed_params)
+
+        output = params.pop('output', 'ndjson')
+        if output not in FORMATS:
+            raise ValidationError({"error": f"Unknown 'output', use {', '.join(FORMATS)}"})
+        compress = params.pop('gzip', 'false')
+        if compress not in ('true', 'false'):
+            raise ValidationError({"error": "'gzip' should be true or false"})
+
+        queryset = Event.objects.filter(mark_as_deleted=False)
+        if params.get('period_start') is not None:
+            queryset = queryset.filter(timestamp__gte=validate_date(params.pop('period_start')))
+        if params.get('period_stop') is not None:
+            queryset = queryset.filter(timestamp__lte=validate_date(params.pop('period_stop')))
+        queryset = queryset.filter(**get_event_filters(params)).order_by('id')
+
+        content_type, filename, stream = export_events(queryset, output, compress == 'true',
+                                                       settings.EXPORT_CHUNK_SIZE)
+        response = StreamingHttpResponse(stream, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class DeadLetterList(generics.ListAPIView):
+    queryset = DeadLetter.objects.all()
+    serializer_class = DeadLetterSerializer
+
+    def get_queryset(self) -> QuerySet:
+        """Perform filtering by reason
+
+        Client can use only allowed_params in query.
+        """
+        queryset = super().get_queryset()
+        params = self.request.query_params
+        validate_params(params.keys(), ['reason'])
+
+        reason = params.get('reason')
+        if reason is not None:
+            if reason not in DeadLetter.Reason.values:
+                raise ValidationError(
+                    {"error": f"Unknown 'reason', use {', '.join(DeadLetter.Reason.values)}"})
+            queryset = queryset.filter(reason=reason)
+        return queryset.order_by('id')
+
+
+class DeadLetterReprocess(APIView):
+    @staticmethod
+    def background_reprocess(reason: str):
+        """Perform background reprocessing of dead letters"""
+        db_connection = connections['default']
+        try:
+            rules = RuleCache()
+            rules.load()
+            saved, left = reprocess_dead_letters(rules, reason=reason)
+            logger.info(f'{saved} events saved from dead letters, {left} dead letters left.')
+        finally:
+            db_connection.close()
+
+    def post(self, request, *args, **kwargs) -> Response:
+        """Start reprocessing and send immediate response"""
+        reason = request.data.get('reason')
+        if reason is not None and reason not in DeadLetter.Reason.values:
+            raise ValidationError({"error": f"Unknown 'reason', use {', '.join(DeadLetter.Reason.values)}"})
+        threading.Thread(target=self.background_reprocess, args=(reason,), name='Reprocessing dead letters').start()
+        return Response({'message': 'Reprocessing started.'}, status=status.HTTP_202_ACCEPTED)
+
+
+class SpoolStatus(APIView):
+    def get(self, request, *args, **kwargs) -> Response:
+        """Send depth and drain rate of spool of each alert watcher"""
+        spools = {
+            'alert_json': settings.ALERT_SPOOL_DIR,
+            'unified2': settings.UNIFIED2_SPOOL_DIR,
+            'alert_unixsock': settings.UNIXSOCK_SPOOL_DIR,
+        }
+        return Response({name: Spool.read_status(directory) for name, directory in spools.items()},
+                        status=status.HTTP_200_OK)
 
 
 def error404(request, exception):
@@ -117,11 +322,77 @@ def error404(request, exception):
 def validate_params(entered, allowed: list) -> None:
     """Validate query parameters
 
+    Pagination params are always allowed.
     :param entered: Params of query, which user entered
     :param allowed: Params that are allowed in endpoint
     """
     allowed.append('page')
-    only_allowed_params_present = set(entered).issubset(set(allowed))
+    only_allowed_params_present = set(entered).issubset(set(allowed) | set(PAGINATION_PARAMS))
     if not only_allowed_params_present:
         raise ValidationError(
             {"error": f"You can use only {', '.join(allowed)} as query filters."})
+
+
+def get_event_filters(params: dict) -> dict:
+    """Get lookups of Event for query params of events filters
+
+    sid is a field of rule, addresses are validated, src_net
+    and dst_net filter addresses by CIDR network.
+    :param params: Filters of query, other params are removed
+    """
+    params = dict(params)
+
+    # changing sid key
+    if params.get('sid') is not None:
+        if re.fullmatch(r'[0-9]+', params['sid']) is None:
+            raise ValidationError({"error": "'sid' should be an integer."})
+        params['rule__sid'] = params.pop('sid')
+
+    for key in ('src_addr', 'dst_addr'):
+        if params.get(key) is not None:
+            params[key] = validate_address(key, params[key])
+    for key in ('src_net', 'dst_net'):
+        if params.get(key) is not None:
+            addr_key = key.replace('_net', '_addr')
+            params[f'{addr_key}__net_contained_or_equal'] = validate_network(key, params.pop(key))
+    return params
+
+
+def validate_date(date: str) -> datetime:
+    """Validate date format
+
+    Only formats(list) are allowed in query.
+    """
+    formats = ["%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d %H", "%Y-%m-%d"]
+    for frmt in formats:
+        try:
+            return make_aware(datetime.strptime(date, frmt))
+        except ValueError:
+            pass
+    raise ValidationError({"error": "Use format YYYY-MM-DD HH:MM:SS (you can skip SS, MM, HH)"})
+
+
+def validate_address(name: str, value: str) -> str:
+    """Validate IP address given in query parameter
+
+    :param name: Name of query parameter
+    :param value: Value of query parameter
+    :return: Normalized address
+    """
+    try:
+        return str(ipaddress.ip_address(value))
+    except ValueError:
+        raise ValidationError({"error": f"'{name}' should be an IP address."})
+
+
+def validate_network(name: str, value: str) -> str:
+    """Validate CIDR network given in query parameter, like 10.0.0.0/8
+
+    :param name: Name of query parameter
+    :param value: Value of query parameter
+    :return: Normalized network
+    """
+    try:
+        return str(ipaddress.ip_network(value, strict=False))
+    except ValueError:
+        raise ValidationError({"error": f"'{name}' should be a network in CIDR notation, like 10.0.0.0/8."})
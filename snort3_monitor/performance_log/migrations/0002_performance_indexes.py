@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:43
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # indexes are built without locking writes of performance watcher
+    atomic = False
+
+    dependencies = [
+        ('performance_log', '0001_initial'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='performance',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['timestamp'], name='performance_timestamp_brin'),
+        ),
+        AddIndexConcurrently(
+            model_name='performance',
+            index=models.Index(fields=['module', 'timestamp'], name='performance_module_timestamp',
+                               opclasses=['text_pattern_ops', 'timestamptz_ops']),
+        ),
+    ]
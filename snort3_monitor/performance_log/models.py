@@ -1,3 +1,4 @@
+from django.contrib.postgres.indexes import BrinIndex
 from django.db import models
 
 
@@ -5,3 +6,12 @@ class Performance(models.Model):
     timestamp = models.DateTimeField()
     module = models.CharField(max_length=128)
     pegcounts = models.JSONField()
+
+    class Meta:
+        indexes = [
+            # records are appended in order of time, BRIN stays tiny
+            BrinIndex(fields=['timestamp'], name='performance_timestamp_brin'),
+            # serves module__startswith (LIKE 'prefix%') together with timestamp range
+            models.Index(fields=['module', 'timestamp'], opclasses=['text_pattern_ops', 'timestamptz_ops'],
+                         name='performance_module_timestamp'),
+        ]
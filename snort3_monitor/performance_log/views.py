@@ -5,14 +5,20 @@ from django.db.models import QuerySet
 from django.utils.timezone import make_aware
 from rest_framework import generics
 from rest_framework.exceptions import ValidationError
-from rest_framework.response import Response
 
 from performance_log.models import Performance
 from performance_log.serializers import PerformanceSerializer, PerformanceDeltaSerializer
+from snort3_monitor.pagination import PAGINATION_PARAMS
+from snort3_monitor.singleflight import CoalescedListMixin
 
 
-class PerformanceList(generics.ListAPIView):
+class PerformanceList(CoalescedListMixin, generics.ListAPIView):
     queryset = Performance.objects.all()
+    cursor_ordering = ('timestamp', 'id')
+
+    def is_coalesced(self, request) -> bool:
+        """Coalesce delta mode, which sums all records of period"""
+        return request.query_params.get('delta') == 'true'
 
     def get_queryset(self):
         """Process query params"""
@@ -47,16 +53,6 @@ class PerformanceList(generics.ListAPIView):
 
         return queryset
 
-    def list(self, request, *args, **kwargs) -> Response:
-        """Paginate and serialize queryset and send response"""
-        queryset = self.filter_queryset(self.get_queryset())
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
-
     @staticmethod
     def validate_date(date: str) -> datetime:
         """Validate date format
@@ -76,11 +72,12 @@ class PerformanceList(generics.ListAPIView):
     def validate_params(entered: list, allowed: list) -> None:
         """Validate query parameters
 
+        Pagination params are always allowed.
         :param entered: Params of query, which user entered
         :param allowed: Params that are allowed in endpoint
         """
         allowed.append('page')
-        only_allowed_params_present = set(entered).issubset(set(allowed))
+        only_allowed_params_present = set(entered).issubset(set(allowed) | set(PAGINATION_PARAMS))
         if not only_allowed_params_present:
             raise ValidationError(
                 {"error": f"You can use only {', '.join(allowed)} as query filters."})
@@ -0,0 +1,120 @@
+import argparse
+import logging
+import os
+import socket
+import time
+
+import django
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "snort3_monitor.settings")
+django.setup()
+from alert_decoder import ALERT_PKT, decode_alert_packet
+from monitor.ingest import COPY_THRESHOLD, make_alert_row
+from monitor.models import DeadLetter
+from tailer import LatencyStats
+from watcher_alert import OnMyWatch
+
+
+logger = logging.getLogger('monitor')
+
+
+def parse_datagrams(datagrams: list) -> tuple:
+    """Parse Alertpkt datagrams into alert rows like parse_alerts
+
+    :return: List of alert rows and list of rejected
+    datagrams as (reason, description) pairs
+    """
+    alerts = []
+    rejected = []
+    for datagram in datagrams:
+        try:
+            alerts.append(make_alert_row(decode_alert_packet(datagram)))
+        except (ValueError, IndexError, OverflowError, OSError):
+            rejected.append((DeadLetter.Reason.DECODE, f'Datagram of {len(datagram)} bytes: {datagram[:64].hex()}'))
+    return alerts, rejected
+
+
+class UnixSockWatch(OnMyWatch):
+    """Receive alerts from Snort alert_unixsock
+
+    Snort sends each alert as a datagram to snort_alert socket
+    in its log directory. Datagrams are collected into batches
+    of batch_size, but a batch waits not longer than max_delay
+    seconds after its first datagram. Batches are saved like
+    chunks of alert file, there is no position to save.
+    socket_path -- path of datagram socket to bind
+    receive_buffer -- size of socket receive buffer in bytes
+    max_delay -- seconds to wait for more datagrams of batch
+    """
+    socket_path: str = '/var/log/snort/snort_alert'
+    checkpoint_name: str = 'alert_unixsock'
+    spool_dir: str = settings.UNIXSOCK_SPOOL_DIR
+    receive_buffer: int = 32 * 1024 * 1024
+    max_delay: float = 0.2
+
+    def run(self):
+        """Receive datagrams until interrupted"""
+        logger.info('Unix socket alert receiver running.')
+        connection_created.connect(self.set_statement_timeout)
+        self.load_rules()
+        latency = LatencyStats('Unix socket receiver')
+        sock = self.bind()
+        try:
+            while True:
+                self.drain_spool()
+                datagrams, received_at = self.receive_batch(sock)
+                if datagrams:
+                    saved = self.store(*parse_datagrams(datagrams))
+                    latency.add(saved, time.monotonic() - received_at)
+        except KeyboardInterrupt:
+            logger.info('Unix socket alert receiver stopped.')
+        finally:
+            sock.close()
+            os.unlink(self.socket_path)
+            self.spool.close()
+
+    def bind(self) -> socket.socket:
+        """Bind datagram socket, removing socket of previous run"""
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.receive_buffer)
+        sock.bind(self.socket_path)
+        logger.info(f'Listening on {self.socket_path}.')
+        return sock
+
+    def receive_batch(self, sock: socket.socket) -> tuple:
+        """Receive datagrams of one batch
+
+        :return: List of datagrams and monotonic time when the first was received
+        """
+        datagrams = []
+        received_at = None
+        timeout = self.retry_interval if not self.spool.is_empty() else self.max_wait
+        while len(datagrams) < self.batch_size:
+            sock.settimeout(timeout)
+            try:
+                datagrams.append(sock.recv(ALERT_PKT.size + 1))
+            except socket.timeout:
+                break
+            if received_at is None:
+                received_at = time.monotonic()
+            timeout = received_at + self.max_delay - time.monotonic()
+            if timeout <= 0:
+                break
+        return datagrams, received_at
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Receive Snort alert_unixsock alerts and save them into database.')
+    parser.add_argument('--socket', default=UnixSockWatch.socket_path, help='path of datagram socket')
+    parser.add_argument('--batch-size', type=int, default=1000, help='count of alerts per batch')
+    parser.add_argument('--copy-threshold', type=int, default=COPY_THRESHOLD,
+                        help='minimal count of events in a batch to load them with COPY')
+    args = parser.parse_args()
+
+    UnixSockWatch.socket_path = args.socket
+    receiver = UnixSockWatch(batch_size=args.batch_size, copy_threshold=args.copy_threshold)
+    receiver.run()
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:43
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # index is built without locking writes of logged requests
+    atomic = False
+
+    dependencies = [
+        ('request_log', '0001_initial'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='request',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['timestamp'], name='request_timestamp_brin'),
+        ),
+    ]
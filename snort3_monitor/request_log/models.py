@@ -1,3 +1,4 @@
+from django.contrib.postgres.indexes import BrinIndex
 from django.db import models
 
 
@@ -8,3 +9,8 @@ class Request(models.Model):
     endpoint = models.CharField(max_length=128)
     response = models.IntegerField()
     request_data = models.JSONField()
+
+    class Meta:
+        indexes = [
+            BrinIndex(fields=['timestamp'], name='request_timestamp_brin'),
+        ]
@@ -7,11 +7,13 @@ from rest_framework.exceptions import ValidationError
 
 from request_log.models import Request
 from request_log.serializers import RequestSerializer
+from snort3_monitor.pagination import PAGINATION_PARAMS
 
 
 class RequestList(generics.ListAPIView):
     queryset = Request.objects.all()
     serializer_class = RequestSerializer
+    cursor_ordering = ('id',)
 
     def get_queryset(self) -> QuerySet:
         """Perform filtering and ordering data
@@ -60,11 +62,12 @@ class RequestList(generics.ListAPIView):
     def validate_params(entered, allowed: list) -> None:
         """Validate query parameters
 
+        Pagination params are always allowed.
         :param entered: Params of query, which user entered
         :param allowed: Params that are allowed in endpoint
         """
         allowed.append('page')
-        only_allowed_params_present = set(entered).issubset(set(allowed))
+        only_allowed_params_present = set(entered).issubset(set(allowed) | set(PAGINATION_PARAMS))
         if not only_allowed_params_present:
             raise ValidationError(
                 {"error": f"You can use only {', '.join(allowed)} as query filters."})
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rule', '0003_alter_rule_data_json_alter_rule_message'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rule',
+            name='placeholder',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:43
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def merge_duplicates(apps, schema_editor):
+    """Merge rules with the same sid, gid and rev into one
+
+    Full rules are kept over placeholders and deprecated ones,
+    events of merged rules are moved to the kept rule.
+    """
+    Rule = apps.get_model('rule', 'Rule')
+    Event = apps.get_model('monitor', 'Event')
+    duplicates = (
+        Rule.objects
+        .values('sid', 'gid', 'rev')
+        .annotate(count=Count('id'))
+        .filter(count__gt=1)
+    )
+    for key in duplicates:
+        ids = list(
+            Rule.objects
+            .filter(sid=key['sid'], gid=key['gid'], rev=key['rev'])
+            .order_by('placeholder', 'deprecated', 'id')
+            .values_list('id', flat=True)
+        )
+        Event.objects.filter(rule_id__in=ids[1:]).update(rule_id=ids[0])
+        Rule.objects.filter(id__in=ids[1:]).delete()
+    # deferred foreign key checks would block adding the constraint
+    schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rule', '0004_rule_placeholder'),
+        ('monitor', '0009_compact_event'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='rule',
+            constraint=models.UniqueConstraint(fields=('sid', 'gid', 'rev'), name='rule_rule_sid_gid_rev_unique'),
+        ),
+    ]
@@ -10,6 +10,13 @@ class Rule(models.Model):
     message = models.TextField(null=True, blank=True)
     data_json = models.JSONField(null=True, blank=True)
     deprecated = models.BooleanField(default=False)
+    placeholder = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            # also serves lookups of get_rule and by (sid, gid) of rules dump
+            models.UniqueConstraint(fields=['sid', 'gid', 'rev'], name='rule_rule_sid_gid_rev_unique'),
+        ]
 
     @staticmethod
     def get_rule(sid: int, rev: int, gid: int) -> 'Rule':
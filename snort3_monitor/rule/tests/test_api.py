@@ -98,3 +98,19 @@ class RuleUpdateAPITests(TransactionTestCase):
             time.sleep(0.2)
             self.assertListEqual([True, False], [rule.deprecated for rule in Rule.objects.all()])
             self.assertIn('marked as deprecated.', log.output[0])
+
+    @patch('rule.views.update_pulledpork_rules', return_value=None)
+    @patch('update_rules.os.system', side_effect=(0, 0, 0))
+    def test_post_rule_fills_placeholder(self, patched_system, patched_update):
+        Rule.objects.create(gid=116, sid=150, rev=1, action='allow', message='(decode) loopback', placeholder=True)
+        url = reverse('rules-create')
+
+        with self.assertLogs(self.logger, level='INFO') as log:
+            with patch('update_rules.open', mock_open(
+                    read_data='{"gid": 116, "sid": 150, "rev": 1, "action": "alert", "msg": "(decode) loopback IP"}')):
+                self.client.post(url)
+            time.sleep(0.2)
+            rule = Rule.objects.get(sid=150, gid=116)
+            self.assertFalse(rule.placeholder)
+            self.assertEqual((rule.action, rule.message), ('alert', '(decode) loopback IP'))
+            self.assertIn('1 new rules have been added.', log.output[0])
@@ -10,6 +10,8 @@ from rest_framework.views import APIView
 
 from rule.serializers import RuleSerializer
 from rule.models import Rule
+from snort3_monitor.cache import CachedListMixin
+from snort3_monitor.pagination import PAGINATION_PARAMS
 from update_rules import update_pulledpork_rules, dump_rules
 
 
@@ -36,9 +38,11 @@ class RuleCreate(APIView):
         return Response({'message': 'Update process started.'}, status=status.HTTP_202_ACCEPTED)
 
 
-class RuleListView(generics.ListAPIView):
+class RuleListView(CachedListMixin, generics.ListAPIView):
     queryset = Rule.objects.all()
     serializer_class = RuleSerializer
+    cursor_ordering = ('sid', 'gid', 'rev')
+    cache_models = (Rule,)
 
     def get_queryset(self) -> QuerySet:
         """Perform filtering and ordering data
@@ -66,11 +70,12 @@ class RuleListView(generics.ListAPIView):
     def validate_params(entered: list, allowed: list) -> None:
         """Validate query parameters
 
+        Pagination params are always allowed.
         :param entered: Params of query, which user entered
         :param allowed: Params that are allowed in endpoint
         """
         allowed.append('page')
-        only_allowed_params_present = set(entered).issubset(set(allowed))
+        only_allowed_params_present = set(entered).issubset(set(allowed) | set(PAGINATION_PARAMS))
         if not only_allowed_params_present:
             raise ValidationError(
                 {"error": f"You can use only {', '.join(allowed)} as query filters."})
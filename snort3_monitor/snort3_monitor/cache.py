@@ -0,0 +1,80 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def normalize_params(request) -> tuple:
+    """Get query params of request in order of names and values"""
+    return tuple(sorted((key, value) for key, values in request.query_params.lists() for value in values))
+
+
+def get_version_key(model) -> str:
+    return f'data-version:{model._meta.label}'
+
+
+def get_data_version(model) -> int:
+    """Get version of data of model, a new one if cache has none"""
+    key = get_version_key(model)
+    version = time.time_ns()
+    cache.add(key, version, timeout=None)
+    return cache.get(key, version)
+
+
+def bump_data_version(*models) -> None:
+    """Change version of data of models when transaction is committed
+
+    Cached responses made from data of the previous versions
+    are not used anymore. Processes share versions through
+    the cache backend.
+    """
+    def bump():
+        for model in models:
+            cache.set(get_version_key(model), time.time_ns(), timeout=None)
+    transaction.on_commit(bump)
+
+
+def bump_on_save(sender, **kwargs) -> None:
+    """Receiver of post_save, bulk writes bump versions themselves"""
+    bump_data_version(sender)
+
+
+class CachedListMixin:
+    """Cache of list responses by query params and versions of data
+
+    Key of a response is its ETag, so a client which sends it
+    in If-None-Match gets 304 without a query of data. Models
+    whose data the list shows are in cache_models, results
+    depending on current time are kept for cache_slot seconds.
+    """
+    cache_models = ()
+    cache_slot = None
+
+    def get_cache_key(self, request) -> str:
+        params = normalize_params(request)
+        versions = [get_data_version(model) for model in self.cache_models]
+        slot = None if self.cache_slot is None else int(time.time() // self.cache_slot)
+        key = repr((request.get_host(), request.path, params, versions, slot))
+        return hashlib.md5(key.encode()).hexdigest()
+
+    @staticmethod
+    def is_not_modified(request, etag: str) -> bool:
+        """Check if client has the response of etag already"""
+        tags = request.headers.get('If-None-Match', '')
+        return any(tag.strip().removeprefix('W/') in (etag, '*') for tag in tags.split(','))
+
+    def list(self, request, *args, **kwargs) -> Response:
+        key = self.get_cache_key(request)
+        etag = f'"{key}"'
+        if self.is_not_modified(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        data = cache.get(f'response:{key}')
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            cache.set(f'response:{key}', data, timeout=settings.RESPONSE_CACHE_TIMEOUT)
+        return Response(data, headers={'ETag': etag})
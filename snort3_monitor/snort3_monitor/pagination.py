@@ -0,0 +1,66 @@
+from django.db.models import QuerySet
+from rest_framework.pagination import BasePagination, CursorPagination, PageNumberPagination
+
+
+# Query params of pagination, list views accept them besides their filters
+PAGINATION_PARAMS = ('page', 'page_size', 'cursor', 'pagination')
+MAX_PAGE_SIZE = 1000
+
+
+class PagePagination(PageNumberPagination):
+    """Page-number pagination with count of all results"""
+    page_size_query_param = 'page_size'
+    max_page_size = MAX_PAGE_SIZE
+
+
+class KeysetPagination(CursorPagination):
+    """Cursor pagination by cursor_ordering of the view
+
+    Next page is taken after the last row of the previous one,
+    so there is no COUNT and no growing OFFSET scan.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = MAX_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view) -> tuple:
+        return tuple(view.cursor_ordering)
+
+
+class ListPagination(BasePagination):
+    """Page-number pagination, or cursor pagination on request
+
+    Cursor mode is chosen with pagination=cursor for the first
+    page, next and previous links carry cursor param. It is
+    available for views with cursor_ordering attribute, which
+    paginate a queryset, other lists are paginated by pages.
+    """
+
+    def __init__(self):
+        self.paginator = PagePagination()
+
+    @staticmethod
+    def is_cursor_requested(request) -> bool:
+        """Check if client asked for cursor mode"""
+        return request.query_params.get('pagination') == 'cursor' or 'cursor' in request.query_params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        has_cursor = getattr(view, 'cursor_ordering', None) and isinstance(queryset, QuerySet)
+        if has_cursor and self.is_cursor_requested(request):
+            self.paginator = KeysetPagination()
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.paginator.get_paginated_response_schema(schema)
+
+    def get_results(self, data):
+        return self.paginator.get_results(data)
+
+    def to_html(self):
+        return self.paginator.to_html()
+
+    @property
+    def display_page_controls(self) -> bool:
+        return getattr(self.paginator, 'display_page_controls', False)
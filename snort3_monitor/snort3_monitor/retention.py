@@ -0,0 +1,100 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from snort3_monitor.cache import bump_data_version
+
+
+logger = logging.getLogger('monitor')
+
+
+class RetentionPolicy:
+    """Which rows of a model are kept
+
+    Rows older than max_age_days by date_field and rows beyond
+    the newest max_rows (by primary key) are deleted, None turns
+    a limit off. Policy applies only to rows matching filters,
+    if it has no limits, all of these rows are deleted.
+    """
+
+    def __init__(self, model: str, date_field: str = None, max_age_days: int = None, max_rows: int = None,
+                 filters: dict = None):
+        self.model = apps.get_model(model)
+        self.date_field = date_field
+        self.max_age_days = max_age_days
+        self.max_rows = max_rows
+        self.filters = filters or {}
+
+    def __str__(self) -> str:
+        return self.model._meta.label
+
+    def get_expired(self, now=None) -> list:
+        """Get querysets of rows to delete"""
+        queryset = self.model.objects.filter(**self.filters)
+        if self.max_age_days is None and self.max_rows is None:
+            return [queryset]
+
+        expired = []
+        if self.max_age_days is not None:
+            cutoff = (now or timezone.now()) - timedelta(days=self.max_age_days)
+            expired.append(queryset.filter(**{f'{self.date_field}__lt': cutoff}))
+        if self.max_rows is not None:
+            newest = queryset.order_by('-pk').values_list('pk', flat=True)[self.max_rows:self.max_rows + 1]
+            if newest:
+                expired.append(queryset.filter(pk__lte=newest[0]))
+        return expired
+
+
+def get_policies() -> list:
+    """Get retention policies from RETENTION_POLICIES setting"""
+    return [RetentionPolicy(model, **options) for model, options in settings.RETENTION_POLICIES.items()]
+
+
+def delete_in_chunks(queryset: QuerySet, chunk_size: int, pause: float) -> int:
+    """Delete rows of queryset in chunks of primary key ranges
+
+    Each chunk is deleted in its own transaction and followed
+    by a pause, so inserts are not blocked for long.
+    :return: Count of deleted rows
+    """
+    queryset = queryset.order_by('pk')
+    deleted = 0
+    start = queryset.values_list('pk', flat=True).first()
+    while start is not None:
+        chunk = queryset.filter(pk__gte=start)
+        next_start = list(chunk.values_list('pk', flat=True)[chunk_size:chunk_size + 1])
+        if next_start:
+            chunk = chunk.filter(pk__lt=next_start[0])
+        with transaction.atomic():
+            count, _ = chunk.delete()
+        deleted += count
+        if not next_start:
+            break
+        start = next_start[0]
+        time.sleep(pause)
+    return deleted
+
+
+def apply_retention(policies: list = None, chunk_size: int = None, pause: float = None) -> list:
+    """Delete rows which are not kept by retention policies
+
+    :return: List of dicts with model, count of deleted rows and seconds of each policy
+    """
+    chunk_size = chunk_size or settings.RETENTION_CHUNK_SIZE
+    pause = settings.RETENTION_PAUSE if pause is None else pause
+    report = []
+    for policy in policies if policies is not None else get_policies():
+        started = time.monotonic()
+        deleted = sum(delete_in_chunks(queryset, chunk_size, pause) for queryset in policy.get_expired())
+        seconds = time.monotonic() - started
+        if deleted:
+            bump_data_version(policy.model)
+        logger.info(f'Retention of {policy}: {deleted} rows deleted in {seconds:.1f} sec.')
+        report.append({'model': str(policy), 'deleted': deleted, 'seconds': seconds})
+    return report
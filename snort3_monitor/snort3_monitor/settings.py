@@ -138,10 +138,48 @@ STATIC_URL = "static/"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'snort3_monitor.pagination.ListPagination',
     'PAGE_SIZE': 100,
 }
 
+# Cached responses and versions of data, the cache is
+# shared by server and watchers, they bump versions of data in it
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': '/var/tmp/snort3_monitor_cache',
+    }
+}
+RESPONSE_CACHE_TIMEOUT = 600
+
+# Events are exported from a server-side cursor in chunks of this count of rows
+EXPORT_CHUNK_SIZE = 2000
+
+# Alert watchers keep alerts here while database is not available
+ALERT_SPOOL_DIR = '/var/log/snort/spool/alert_json'
+UNIFIED2_SPOOL_DIR = '/var/log/snort/spool/unified2'
+UNIXSOCK_SPOOL_DIR = '/var/log/snort/spool/alert_unixsock'
+
+# Events are kept in range partitions of this count of days,
+# partitions older than retention are dropped by partition_events
+EVENT_PARTITION_DAYS = 1
+EVENT_RETENTION_DAYS = 7
+# seconds to wait for readers of an expired partition before its drop is skipped
+PARTITION_LOCK_TIMEOUT = 5
+
+# Rows older than max_age_days by date_field or beyond the newest max_rows
+# are deleted by apply_retention command in chunks of RETENTION_CHUNK_SIZE
+# rows with RETENTION_PAUSE seconds between them
+RETENTION_POLICIES = {
+    'monitor.Event': {'date_field': 'timestamp', 'max_age_days': EVENT_RETENTION_DAYS},
+    'performance_log.Performance': {'date_field': 'timestamp', 'max_age_days': 30, 'max_rows': 1000000},
+    'request_log.Request': {'date_field': 'timestamp', 'max_age_days': 30, 'max_rows': 1000000},
+    'shell.Profiler': {'date_field': 'start_time', 'max_age_days': 90, 'max_rows': 10000},
+    'rule.Rule': {'filters': {'deprecated': True, 'event__isnull': True}},
+}
+RETENTION_CHUNK_SIZE = 5000
+RETENTION_PAUSE = 0.5
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -12,3 +12,8 @@ DATABASES = {
         "PORT": "5432",
     }
 }
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    }
+}
@@ -0,0 +1,72 @@
+import threading
+
+from rest_framework.response import Response
+
+from snort3_monitor.cache import normalize_params
+
+
+class Call:
+    """Execution of a function which callers of the same key wait for"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Concurrent calls with the same key share one execution
+
+    The first caller executes the function, callers coming
+    while it runs wait and get its result or exception. The
+    next call after it is finished executes again.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, func):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.result
+
+
+flight = SingleFlight()
+
+
+class CoalescedListMixin:
+    """Identical concurrent list requests share one query of data
+
+    Requests are identical by host, path and query params in
+    any order, responses share data of one execution, so it
+    must not be changed after it is made.
+    """
+
+    def is_coalesced(self, request) -> bool:
+        return True
+
+    def list(self, request, *args, **kwargs) -> Response:
+        if not self.is_coalesced(request):
+            return super().list(request, *args, **kwargs)
+        key = (request.get_host(), request.path, normalize_params(request))
+        data = flight.do(key, lambda: super(CoalescedListMixin, self).list(request, *args, **kwargs).data)
+        return Response(data)
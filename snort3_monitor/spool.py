@@ -0,0 +1,160 @@
+import json
+import logging
+import os
+import pickle
+import struct
+import time
+
+
+logger = logging.getLogger('monitor')
+
+FRAME_HEADER = struct.Struct('>QI')
+SEGMENT_SUFFIX = '.spool'
+STATUS_FILE = 'status.json'
+
+
+class Spool:
+    """Segmented append-only spool of records on local disk
+
+    Records are pickled into frames (sequence, length, data)
+    and appended to segment files, a new segment is started
+    when the current one is bigger than segment_size bytes.
+    Sequences grow across restarts (they are based on time),
+    so consumer can remember the last one it has processed.
+    Torn frame at the end of the last segment (after a crash)
+    is cut off. Directory is created with the first record.
+    records -- count of records in spool
+    size -- count of bytes in spool
+    """
+
+    def __init__(self, directory: str, segment_size: int = 64 * 1024 * 1024):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.records = 0
+        self.size = 0
+        self.sequence = 0
+        self.last_record = None
+        self.file = None
+        self.drain_rate = 0.0
+        for path in self.get_segments():
+            self.scan_segment(path)
+
+    def get_segments(self) -> list:
+        """Get paths of segments in order of writing"""
+        try:
+            names = sorted(name for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX))
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.directory, name) for name in names]
+
+    def scan_segment(self, path: str):
+        """Count records of segment, cutting off torn frame
+
+        Only the last record of spool is unpickled.
+        """
+        start = end = 0
+        with open(path, 'r+b') as file:
+            for sequence, _, frame_end in self.read_frames(file, load=False):
+                self.records += 1
+                self.sequence = sequence
+                start, end = end, frame_end
+            if end < os.fstat(file.fileno()).st_size:
+                logger.warning(f'Cutting off torn record at {end} of spool segment {path}.')
+                file.truncate(end)
+            if end:
+                file.seek(start)
+                _, self.last_record, _ = next(self.read_frames(file))
+        self.size += end
+
+    @staticmethod
+    def read_frames(file, load: bool = True):
+        """Yield (sequence, record, end offset) of complete frames of segment
+
+        Record is None if load is False.
+        """
+        offset = 0
+        while True:
+            header = file.read(FRAME_HEADER.size)
+            if len(header) < FRAME_HEADER.size:
+                return
+            sequence, length = FRAME_HEADER.unpack(header)
+            data = file.read(length)
+            if len(data) < length:
+                return
+            offset += FRAME_HEADER.size + length
+            yield sequence, pickle.loads(data) if load else None, offset
+
+    def is_empty(self) -> bool:
+        """Check if spool has no records"""
+        return self.records == 0
+
+    def append(self, record) -> int:
+        """Append record and return its sequence"""
+        self.sequence = max(time.time_ns(), self.sequence + 1)
+        data = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        if self.file is None or self.file.tell() >= self.segment_size:
+            self.open_segment()
+        self.file.write(FRAME_HEADER.pack(self.sequence, len(data)) + data)
+        self.file.flush()
+        self.records += 1
+        self.size += FRAME_HEADER.size + len(data)
+        self.last_record = record
+        return self.sequence
+
+    def open_segment(self):
+        """Start new segment named after its first sequence"""
+        self.close()
+        os.makedirs(self.directory, exist_ok=True)
+        self.file = open(os.path.join(self.directory, f'{self.sequence:020d}{SEGMENT_SUFFIX}'), 'ab')
+
+    def read(self, after: int = 0):
+        """Yield (sequence, record) of records with sequence bigger than after
+
+        Segment which is being written is closed first,
+        so the next record starts a new segment.
+        """
+        self.close()
+        for path in self.get_segments():
+            with open(path, 'rb') as file:
+                for sequence, record, _ in self.read_frames(file):
+                    if sequence > after:
+                        yield sequence, record
+
+    def remove_through(self, sequence: int):
+        """Remove segments whose records are all consumed up to sequence"""
+        self.close()
+        for path in self.get_segments():
+            with open(path, 'rb') as file:
+                frames = [frame_sequence for frame_sequence, _, _ in self.read_frames(file, load=False)]
+            if frames and frames[-1] > sequence:
+                break
+            self.records -= len(frames)
+            self.size -= os.path.getsize(path)
+            os.remove(path)
+        if self.records == 0:
+            self.last_record = None
+
+    def write_status(self):
+        """Write depth and drain rate for other processes"""
+        status = {'records': self.records, 'bytes': self.size, 'segments': len(self.get_segments()),
+                  'drain_rate': round(self.drain_rate, 1), 'updated': time.time()}
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, STATUS_FILE)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(status, f)
+        os.replace(path + '.tmp', path)
+
+    @staticmethod
+    def read_status(directory: str) -> dict:
+        """Read status written by spool owner"""
+        try:
+            with open(os.path.join(directory, STATUS_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'records': 0, 'bytes': 0, 'segments': 0, 'drain_rate': 0.0, 'updated': None}
+
+    def close(self):
+        """Close segment which is being written"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
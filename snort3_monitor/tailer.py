@@ -0,0 +1,365 @@
+import ctypes
+import ctypes.util
+import hashlib
+import json
+import logging
+import os
+import select
+import struct
+import time
+
+
+logger = logging.getLogger('monitor')
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+FINGERPRINT_SIZE = 1024
+EVENT_HEADER = struct.Struct('iIII')
+FILE_MASK = IN_MODIFY | IN_ATTRIB | IN_MOVE_SELF | IN_DELETE_SELF
+DIRECTORY_MASK = IN_CREATE | IN_MOVED_TO
+
+
+class Inotify:
+    """Minimal ctypes wrapper around Linux inotify
+
+    Raise OSError when inotify is not available.
+    """
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library('c')
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self.libc, 'inotify_init1'):
+            raise OSError('inotify is not supported.')
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed.')
+
+    def add_watch(self, path: str, mask: int) -> int:
+        """Watch path and return watch descriptor"""
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f'Can not watch {path}.')
+        return wd
+
+    def read_events(self, timeout: float) -> list:
+        """Wait up to timeout seconds and return list of (wd, mask, name)"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0').decode('utf-8', 'replace')
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        """Close inotify descriptor"""
+        os.close(self.fd)
+
+
+class Checkpoint:
+    """Identity of a log file and position in it
+
+    device, inode -- identify file, so rotation can be noticed
+    offset -- count of bytes which were already processed
+    fingerprint -- hash of first bytes of file, so reused inode
+    of a new file is not taken for the old one
+    """
+
+    def __init__(self, device: int = 0, inode: int = 0, offset: int = 0, fingerprint: str = ''):
+        self.device = device
+        self.inode = inode
+        self.offset = offset
+        self.fingerprint = fingerprint
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Checkpoint) and self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        return f'Checkpoint({self.device}:{self.inode} at {self.offset})'
+
+    def to_dict(self) -> dict:
+        """Represent checkpoint as dict"""
+        return {'device': self.device, 'inode': self.inode, 'offset': self.offset, 'fingerprint': self.fingerprint}
+
+    def dumps(self) -> str:
+        """Serialize checkpoint into string"""
+        return json.dumps(self.to_dict())
+
+    @classmethod
+    def loads(cls, data: str) -> 'Checkpoint':
+        """Deserialize checkpoint
+
+        Plain integer (format of old position files) is taken
+        as offset in a file with unknown identity.
+        """
+        data = json.loads(data)
+        if isinstance(data, int):
+            return cls(offset=data)
+        return cls(**data)
+
+    def is_file_identity_known(self) -> bool:
+        """Check if checkpoint was bound to a concrete file"""
+        return bool(self.device or self.inode)
+
+    def is_same_file(self, stat: os.stat_result, file) -> bool:
+        """Check if opened binary file is the one of checkpoint"""
+        if (stat.st_dev, stat.st_ino) != (self.device, self.inode):
+            return False
+        if stat.st_size < self.offset:
+            return False
+        return get_fingerprint(file, self.offset) == self.fingerprint
+
+
+def get_fingerprint(file, offset: int) -> str:
+    """Hash first bytes of binary file up to offset
+
+    Position of file is not changed.
+    """
+    size = min(offset, FINGERPRINT_SIZE)
+    return hashlib.sha1(os.pread(file.fileno(), size, 0)).hexdigest()
+
+
+class Tailer:
+    """Wait for changes in a log file and read new data
+
+    Block on inotify events of the file (and of its directory,
+    to notice creation or rotation of the file). When inotify
+    is not available, poll file status every poll_interval seconds.
+    New data is read from a Checkpoint, following rotation and
+    truncation of the file, in chunks of whole lines, so memory
+    stays bounded whatever the backlog is.
+    chunk_size -- count of bytes read at once
+    hold_partial_line -- keep back line without trailing newline at
+    the end of the file until it is completed
+    is_complete -- function of held back line, which tells if it is
+    a complete record that can be read before its newline is written
+    changed_at -- monotonic time when last change was noticed
+    """
+
+    def __init__(self, path: str, poll_interval: float = 1.0, chunk_size: int = 1024 * 1024,
+                 hold_partial_line: bool = True, is_complete=None):
+        self.path = path
+        self.directory = os.path.dirname(os.path.abspath(path))
+        self.name = os.path.basename(path)
+        self.poll_interval = poll_interval
+        self.chunk_size = chunk_size
+        self.hold_partial_line = hold_partial_line
+        self.is_complete = is_complete
+        self.changed_at = time.monotonic()
+        self.file_wd = None
+        self.inotify = None
+        self.is_started = False
+        self.last_status = self.get_status()
+
+    def start(self):
+        """Set up inotify or fall back to polling"""
+        self.is_started = True
+        try:
+            self.inotify = Inotify()
+            self.inotify.add_watch(self.directory, DIRECTORY_MASK)
+            self.watch_file()
+            logger.info(f'Tailing {self.path} with inotify.')
+        except OSError as e:
+            self.inotify = None
+            logger.info(f'Tailing {self.path} with polling: {e}')
+
+    def watch_file(self):
+        """Add watch on the file itself if it exists"""
+        try:
+            self.file_wd = self.inotify.add_watch(self.path, FILE_MASK)
+        except OSError:
+            self.file_wd = None
+
+    def read(self, checkpoint: Checkpoint):
+        """Yield new data of the file as (bytes, Checkpoint) pairs
+
+        Each chunk of data ends with a complete line and checkpoint
+        points right after it. If the file of checkpoint was rotated, rest of the rotated
+        file is drained first, then the new file is read from its
+        beginning. Truncated file is read from its beginning too.
+        Raise FileNotFoundError if the file does not exist.
+        """
+        with open(self.path, 'rb') as file:
+            stat = os.fstat(file.fileno())
+            if not checkpoint.is_file_identity_known():
+                offset = checkpoint.offset if checkpoint.offset <= stat.st_size else 0
+            elif checkpoint.is_same_file(stat, file):
+                offset = checkpoint.offset
+            else:
+                yield from self.drain_rotated(checkpoint)
+                logger.info(f'Switched to a new file {self.path}.')
+                offset = 0
+            yield from self.read_file(file, stat, offset)
+
+    def drain_rotated(self, checkpoint: Checkpoint):
+        """Yield rest of rotated file of checkpoint if it can be found"""
+        rotated_path = self.find_rotated(checkpoint)
+        if rotated_path is None:
+            return
+        logger.info(f'Draining rotated file {rotated_path}.')
+        with open(rotated_path, 'rb') as file:
+            stat = os.fstat(file.fileno())
+            if checkpoint.is_same_file(stat, file):
+                yield from self.read_file(file, stat, checkpoint.offset, is_rotated=True)
+
+    def find_rotated(self, checkpoint: Checkpoint):
+        """Find file of checkpoint among rotated files in directory"""
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError:
+            return None
+        for entry in entries:
+            if entry.name == self.name or self.name not in entry.name:
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            if (stat.st_dev, stat.st_ino) == (checkpoint.device, checkpoint.inode):
+                return entry.path
+        return None
+
+    def read_file(self, file, stat: os.stat_result, offset: int, is_rotated: bool = False):
+        """Yield chunks of complete lines of opened file from offset
+
+        Rotated file will not grow anymore, so its partial
+        last line is not held back, nor is a line which
+        is_complete accepts.
+        """
+        file.seek(offset)
+        pending = b''
+        while True:
+            chunk = file.read(self.chunk_size)
+            data = pending + chunk
+            if not chunk:
+                if data and (is_rotated or not self.hold_partial_line or self.is_line_complete(data)):
+                    offset += len(data)
+                    yield data, Checkpoint(stat.st_dev, stat.st_ino, offset, get_fingerprint(file, offset))
+                return
+
+            end = data.rfind(b'\n') + 1
+            pending = data[end:]
+            if end:
+                offset += end
+                yield data[:end], Checkpoint(stat.st_dev, stat.st_ino, offset, get_fingerprint(file, offset))
+
+    def is_line_complete(self, line: bytes) -> bool:
+        """Check if partial last line is a complete record"""
+        return self.is_complete is not None and self.is_complete(line)
+
+    def wait(self, timeout: float) -> bool:
+        """Block until the file changes or timeout expires
+
+        :return: True if change was noticed
+        """
+        if not self.is_started:
+            self.start()
+        if self.inotify is None:
+            changed = self.poll(timeout)
+        else:
+            changed = self.wait_inotify(timeout)
+        if changed:
+            self.changed_at = time.monotonic()
+        return changed
+
+    def wait_inotify(self, timeout: float) -> bool:
+        """Wait for inotify events related to the file"""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            changed = False
+            for wd, mask, name in self.inotify.read_events(remaining):
+                if wd == self.file_wd:
+                    changed = True
+                    if mask & (IN_MOVE_SELF | IN_DELETE_SELF | IN_IGNORED):
+                        self.file_wd = None
+                elif self.is_watched_name(name):
+                    changed = True
+                    self.watch_file()
+            if changed:
+                return True
+
+    def is_watched_name(self, name: str) -> bool:
+        """Check if file created in directory is the watched one"""
+        return name == self.name
+
+    def poll(self, timeout: float) -> bool:
+        """Compare file status every poll_interval seconds"""
+        deadline = time.monotonic() + timeout
+        while True:
+            status = self.get_status()
+            if status != self.last_status:
+                self.last_status = status
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(self.poll_interval, remaining))
+
+    def get_status(self):
+        """Get inode, size and modification time of the file"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def close(self):
+        """Stop watching"""
+        if self.inotify is not None:
+            self.inotify.close()
+
+
+class LatencyStats:
+    """Accumulate ingest latency and log it periodically"""
+
+    def __init__(self, name: str, report_interval: float = 60.0):
+        self.name = name
+        self.report_interval = report_interval
+        self.reset()
+
+    def reset(self):
+        """Start new reporting period"""
+        self.started_at = time.monotonic()
+        self.batches = 0
+        self.records = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def add(self, records: int, latency: float):
+        """Add latency of one saved batch and report if it is time"""
+        if records:
+            self.batches += 1
+            self.records += records
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+        if time.monotonic() - self.started_at >= self.report_interval:
+            self.report()
+
+    def report(self):
+        """Log accumulated latency"""
+        if self.batches:
+            average = self.total_latency / self.batches * 1000
+            logger.info(f'{self.name}: {self.records} records in {self.batches} batches, '
+                        f'ingest latency avg {average:.1f} ms, max {self.max_latency * 1000:.1f} ms.')
+        self.reset()
@@ -0,0 +1,238 @@
+import logging
+import os
+import socket
+import struct
+
+from alert_decoder import IP_PROTOCOLS, Alert
+from tailer import FILE_MASK, Checkpoint, Tailer, get_fingerprint
+
+
+logger = logging.getLogger('monitor')
+
+PACKET = 2
+IDS_EVENT = 7
+IDS_EVENT_IPV6 = 72
+IDS_EVENT_VLAN = 104
+IDS_EVENT_IPV6_VLAN = 105
+EXTRA_DATA = 110
+EVENT3 = 114
+
+RECORD_HEADER = struct.Struct('!II')
+# sensor_id, event_id, event_second, event_microsecond, signature_id, generator_id,
+# signature_revision, classification_id, priority_id, ip_source, ip_destination,
+# sport_itype, dport_icode, protocol, impact_flag, impact, blocked (+ mpls_label, vlan_id, pad for VLAN)
+LEGACY_EVENTS = {
+    IDS_EVENT: (struct.Struct('!9I4s4sHHBBBB'), socket.AF_INET),
+    IDS_EVENT_VLAN: (struct.Struct('!9I4s4sHHBBBBIHH'), socket.AF_INET),
+    IDS_EVENT_IPV6: (struct.Struct('!9I16s16sHHBBBB'), socket.AF_INET6),
+    IDS_EVENT_IPV6_VLAN: (struct.Struct('!9I16s16sHHBBBBIHH'), socket.AF_INET6),
+}
+# snort_id, event_id, event_second, event_microsecond, rule_gid, rule_sid, rule_rev,
+# rule_class, rule_priority, policy_id_context, policy_id_inspect, policy_id_detect,
+# pkt_src_ip, pkt_dst_ip, pkt_mpls_label, pkt_src_port_itype, pkt_dst_port_icode,
+# pkt_vlan_id, unused, pkt_ip_ver, pkt_ip_proto, snort_status, snort_action, app_name
+EVENT3_RECORD = struct.Struct('!12I16s16sIHHHHBBBB64s')
+# only fields which are stored: event_second, rule_gid, rule_sid, rule_rev, pkt_src_ip,
+# pkt_dst_ip, pkt_src_port_itype, pkt_dst_port_icode, pkt_ip_ver, pkt_ip_proto
+EVENT3_FIELDS = struct.Struct('!8xI4x3I20x16s16s4x2H4x2B66x')
+# sensor_id, event_id, event_second, packet_second, packet_microsecond, linktype, packet_length
+PACKET_HEADER = struct.Struct('!7I')
+
+
+def iter_records(data: bytes, offset: int = 0):
+    """Yield (type, body) of complete records in data"""
+    end = len(data)
+    while offset + RECORD_HEADER.size <= end:
+        record_type, length = RECORD_HEADER.unpack_from(data, offset)
+        body_start = offset + RECORD_HEADER.size
+        if body_start + length > end:
+            return
+        yield record_type, data[body_start:body_start + length]
+        offset = body_start + length
+
+
+def get_complete_size(data: bytes) -> int:
+    """Get count of bytes of complete records at start of data"""
+    offset = 0
+    while offset + RECORD_HEADER.size <= len(data):
+        _, length = RECORD_HEADER.unpack_from(data, offset)
+        if offset + RECORD_HEADER.size + length > len(data):
+            break
+        offset += RECORD_HEADER.size + length
+    return offset
+
+
+def decode_event(record_type: int, body: bytes) -> Alert:
+    """Decode unified2 event record into Alert
+
+    Ports are set for TCP and UDP only, for ICMP these fields
+    hold type and code. Raise struct.error on wrong size.
+    """
+    if record_type == EVENT3:
+        seconds, gid, sid, rev, src, dst, src_port, dst_port, ip_version, protocol = EVENT3_FIELDS.unpack(body)
+        if ip_version >> 4 == 4:
+            src_addr = socket.inet_ntoa(src[12:])
+            dst_addr = socket.inet_ntoa(dst[12:])
+        elif ip_version >> 4 == 6:
+            src_addr = socket.inet_ntop(socket.AF_INET6, src)
+            dst_addr = socket.inet_ntop(socket.AF_INET6, dst)
+        else:
+            src_addr = dst_addr = ''
+    else:
+        record, family = LEGACY_EVENTS[record_type]
+        fields = record.unpack(body)
+        seconds, _, sid, gid, rev = fields[2:7]
+        src_addr = socket.inet_ntop(family, fields[9])
+        dst_addr = socket.inet_ntop(family, fields[10])
+        src_port, dst_port, protocol = fields[11:14]
+
+    proto = IP_PROTOCOLS.get(protocol, 'IP') if src_addr else ''
+    if protocol != 6 and protocol != 17:
+        src_port = dst_port = None
+    return Alert(seconds, sid, rev, gid, src_addr, src_port, dst_addr, dst_port, proto, '', '')
+
+
+def decode_events(data: bytes) -> tuple:
+    """Decode event records of complete records in data
+
+    Packet, extra-data and other records are skipped.
+    :return: List of Alerts and list of (type, body) of event
+    records which can not be decoded
+    """
+    alerts = []
+    errors = []
+    unpack_header = RECORD_HEADER.unpack_from
+    offset, end = 0, len(data)
+    while offset + RECORD_HEADER.size <= end:
+        record_type, length = unpack_header(data, offset)
+        body_start = offset + RECORD_HEADER.size
+        offset = body_start + length
+        if offset > end:
+            break
+        if record_type == PACKET or (record_type != EVENT3 and record_type not in LEGACY_EVENTS):
+            continue
+        body = data[body_start:offset]
+        try:
+            alerts.append(decode_event(record_type, body))
+        except (struct.error, ValueError):
+            errors.append((record_type, body))
+    return alerts, errors
+
+
+def pack_event(sid: int, rev: int, gid: int, seconds: int, src_addr: str, src_port: int,
+               dst_addr: str, dst_port: int, protocol: int, event_id: int = 1) -> bytes:
+    """Pack Snort 3 event record (EVENT3) with its header"""
+    if ':' in src_addr:
+        src = socket.inet_pton(socket.AF_INET6, src_addr)
+        dst = socket.inet_pton(socket.AF_INET6, dst_addr)
+        ip_version = 0x66
+    else:
+        src = b'\x00' * 10 + b'\xff\xff' + socket.inet_aton(src_addr)
+        dst = b'\x00' * 10 + b'\xff\xff' + socket.inet_aton(dst_addr)
+        ip_version = 0x44
+    body = EVENT3_RECORD.pack(0, event_id, seconds, 0, gid, sid, rev, 0, 3, 0, 0, 0, src, dst, 0,
+                              src_port, dst_port, 0, 0, ip_version, protocol, 0, 0, b'')
+    return RECORD_HEADER.pack(EVENT3, len(body)) + body
+
+
+def pack_packet(seconds: int, packet: bytes, event_id: int = 1) -> bytes:
+    """Pack packet record with its header"""
+    body = PACKET_HEADER.pack(0, event_id, seconds, seconds, 0, 1, len(packet)) + packet
+    return RECORD_HEADER.pack(PACKET, len(body)) + body
+
+
+class Unified2Reader(Tailer):
+    """Read records of unified2 files of Snort
+
+    Snort writes <path>.<timestamp> files and starts a new one
+    when the current one reaches its limit. Files are read in
+    order of timestamps from the file of checkpoint, in chunks
+    of complete records. If file of checkpoint is gone, reading
+    starts from the oldest file.
+    """
+
+    def __init__(self, path: str, poll_interval: float = 1.0, chunk_size: int = 1024 * 1024):
+        super().__init__(path, poll_interval, chunk_size)
+        self.watched_path = None
+
+    def find_files(self) -> list:
+        """Get paths of unified2 files in order of their timestamps"""
+        prefix = self.name + '.'
+        try:
+            names = [name for name in os.listdir(self.directory)
+                     if name.startswith(prefix) and name[len(prefix):].isdigit()]
+        except FileNotFoundError:
+            return []
+        names.sort(key=lambda name: int(name[len(prefix):]))
+        return [os.path.join(self.directory, name) for name in names]
+
+    def read(self, checkpoint: Checkpoint):
+        """Yield new records of unified2 files as (bytes, Checkpoint) pairs"""
+        files = self.find_files()
+        start, offset = 0, 0
+        if checkpoint.is_file_identity_known():
+            for index, path in enumerate(files):
+                with open(path, 'rb') as file:
+                    if checkpoint.is_same_file(os.fstat(file.fileno()), file):
+                        start, offset = index, checkpoint.offset
+                        break
+            else:
+                if files:
+                    logger.warning(f'File of {checkpoint} is not found, reading from {files[0]}.')
+
+        for index in range(start, len(files)):
+            is_last = index == len(files) - 1
+            try:
+                with open(files[index], 'rb') as file:
+                    yield from self.read_records(file, offset, is_last)
+            except FileNotFoundError:
+                logger.warning(f'{files[index]} was removed before it was read.')
+            offset = 0
+
+    def read_records(self, file, offset: int, is_last: bool):
+        """Yield chunks of complete records of opened file from offset
+
+        Incomplete record at the end of a file which is not
+        the last one will never be completed, it is skipped.
+        """
+        stat = os.fstat(file.fileno())
+        file.seek(offset)
+        pending = b''
+        while True:
+            chunk = file.read(self.chunk_size)
+            data = pending + chunk
+            if not chunk:
+                if data and not is_last:
+                    logger.warning(f'Skipping incomplete record of {len(data)} bytes at the end of {file.name}.')
+                return
+            end = get_complete_size(data)
+            pending = data[end:]
+            if end:
+                offset += end
+                yield data[:end], Checkpoint(stat.st_dev, stat.st_ino, offset, get_fingerprint(file, offset))
+
+    def watch_file(self):
+        """Add watch on the newest unified2 file"""
+        files = self.find_files()
+        self.watched_path = files[-1] if files else None
+        self.file_wd = None
+        if self.watched_path is not None:
+            try:
+                self.file_wd = self.inotify.add_watch(self.watched_path, FILE_MASK)
+            except OSError:
+                self.file_wd = None
+
+    def is_watched_name(self, name: str) -> bool:
+        """Check if name of created file is a new unified2 file"""
+        return name.startswith(self.name + '.')
+
+    def get_status(self):
+        """Get name, size and modification time of the newest file"""
+        files = self.find_files()
+        if not files:
+            return None
+        try:
+            stat = os.stat(files[-1])
+        except OSError:
+            return None
+        return files[-1], stat.st_size, stat.st_mtime_ns
@@ -0,0 +1,74 @@
+import argparse
+import logging
+import random
+import socket
+import struct
+import time
+
+from alert_decoder import ALERT_PKT, NOPACKET_STRUCT, PKT_OFFSET
+
+
+ETHERNET_HEADER = struct.Struct('!6s6sH')
+IPV4_HEADER = struct.Struct('!BBHHHBBH4s4s')
+IPV6_HEADER = struct.Struct('!IHBB16s16s')
+PROTOCOL_NUMBERS = {'ICMP': 1, 'TCP': 6, 'UDP': 17}
+
+logger = logging.getLogger('monitor')
+
+
+def build_packet(src_addr: str, src_port: int, dst_addr: str, dst_port: int, proto: str) -> tuple:
+    """Build Ethernet frame with IP and TCP/UDP headers
+
+    :return: Packet and offsets of network and transport headers
+    """
+    protocol = PROTOCOL_NUMBERS[proto]
+    if ':' in src_addr:
+        ethernet = ETHERNET_HEADER.pack(b'\x00' * 6, b'\x00' * 6, 0x86dd)
+        ip = IPV6_HEADER.pack(6 << 28, 8, protocol, 64,
+                              socket.inet_pton(socket.AF_INET6, src_addr), socket.inet_pton(socket.AF_INET6, dst_addr))
+    else:
+        ethernet = ETHERNET_HEADER.pack(b'\x00' * 6, b'\x00' * 6, 0x0800)
+        ip = IPV4_HEADER.pack(0x45, 0, IPV4_HEADER.size + 8, 0, 0, 64, protocol, 0,
+                              socket.inet_aton(src_addr), socket.inet_aton(dst_addr))
+    transport = struct.pack('!HHI', src_port, dst_port, 0)
+    return ethernet + ip + transport, len(ethernet), len(ethernet) + len(ip)
+
+
+def build_alert_packet(sid: int, rev: int = 1, gid: int = 1, msg: str = 'Synthetic alert',
+                       src_addr: str = '10.0.0.1', src_port: int = 1234, dst_addr: str = '192.168.1.1',
+                       dst_port: int = 80, proto: str = 'TCP', seconds: int = None,
+                       with_packet: bool = True) -> bytes:
+    """Build datagram in layout of Snort alert_unixsock Alertpkt"""
+    seconds = int(time.time()) if seconds is None else seconds
+    packet, nethdr, transhdr = b'', 0, 0
+    if with_packet:
+        packet, nethdr, transhdr = build_packet(src_addr, src_port, dst_addr, dst_port, proto)
+    datagram = bytearray(ALERT_PKT.size)
+    ALERT_PKT.pack_into(
+        datagram, 0, msg.encode()[:255], seconds, 0, len(packet), len(packet),
+        0, nethdr, transhdr, 0, 0 if with_packet else NOPACKET_STRUCT,
+        gid, sid, rev, 0, 3, 1, 1, seconds, 0,
+    )
+    datagram[PKT_OFFSET:PKT_OFFSET + len(packet)] = packet
+    return bytes(datagram)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Send synthetic Snort alert_unixsock datagrams.')
+    parser.add_argument('--socket', default='/var/log/snort/snort_alert', help='path of receiver socket')
+    parser.add_argument('--count', type=int, default=10000, help='count of datagrams')
+    parser.add_argument('--sids', type=int, nargs='+', default=[1], help='sids of alerts, gid and rev are 1')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(asctime)s %(name)s: %(message)s')
+
+    datagrams = [
+        build_alert_packet(random.choice(args.sids), src_addr=f'10.0.{i % 256}.{i % 200 + 1}',
+                           src_port=1024 + i % 60000, proto=random.choice(['TCP', 'UDP']))
+        for i in range(min(args.count, 1000))
+    ]
+    sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    started = time.perf_counter()
+    for i in range(args.count):
+        sender.sendto(datagrams[i % len(datagrams)], args.socket)
+    elapsed = time.perf_counter() - started
+    logger.info(f'Sent {args.count} datagrams at {args.count / elapsed:.0f} datagrams/sec.')
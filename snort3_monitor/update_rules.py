@@ -10,6 +10,7 @@ from django.http import Http404
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "snort3_monitor.settings")
 django.setup()
 from rule.models import Rule
+from snort3_monitor.cache import bump_data_version
 
 
 logger = logging.getLogger('monitor')
@@ -76,15 +77,26 @@ def update_pulledpork_rules():
 
 
 def process_data(data: list) -> int:
-    """Processing of rules"""
+    """Processing of rules
+
+    Placeholder rules created by alert watcher are filled
+    with dumped data and counted as new ones.
+    """
     count = 0
 
     for line in data:
         rule = json.loads(line)
         try:
             try:
-                # if rule exists, skip it
-                Rule.get_rule(sid=rule['sid'], rev=rule['rev'], gid=rule['gid'])
+                # if rule exists, skip it, unless it is a placeholder
+                existing_rule = Rule.get_rule(sid=rule['sid'], rev=rule['rev'], gid=rule['gid'])
+                if existing_rule.placeholder:
+                    existing_rule.action = rule['action']
+                    existing_rule.message = rule['msg']
+                    existing_rule.data_json = rule
+                    existing_rule.placeholder = False
+                    existing_rule.save()
+                    count += 1
                 continue
             except Http404:
                 # else check if deprecated rules exist and if it
@@ -104,6 +116,8 @@ def process_data(data: list) -> int:
                 count += 1
         except KeyError:
             logger.error(f"Rule's data is not full: {rule}")
+    # saved rules bump it too, deleted ones do not
+    bump_data_version(Rule)
     return count
 
 
@@ -1,22 +1,34 @@
-import json
+import argparse
 import logging
+import multiprocessing
 import os
 import threading
 import time
-from datetime import datetime
-from json import JSONDecodeError
+from collections import deque
 
 import django
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, connection, connections, transaction
+from django.db.backends.signals import connection_created
 from django.http import Http404
-from django.utils.timezone import make_aware
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "snort3_monitor.settings")
 django.setup()
-from monitor.models import Event
-from rule.models import Rule
+from monitor.ingest import (COPY_THRESHOLD, DATA_ERRORS, RuleCache, dump_alert, parse_alerts, parse_unified2,
+                            save_events)
+from monitor.models import DeadLetter, LogCheckpoint
+from spool import Spool
+from tailer import Checkpoint, LatencyStats, Tailer
+from unified2 import Unified2Reader
 
 
 logger = logging.getLogger('monitor')
+DATABASE_ERRORS = (OperationalError, InterfaceError)
+
+
+def parse_chunk(data: bytes) -> tuple:
+    """Parse chunk of alert file in parser worker"""
+    return parse_alerts(data.splitlines())
 
 
 class OnMyWatch:
@@ -24,86 +36,364 @@ class OnMyWatch:
 
     Responsible to check log file for changes.
     watch_file -- location of log file
-    current_position_file -- name of file with current position
+    current_position_file -- name of file with position of old versions
+    checkpoint_name -- name of LogCheckpoint with current position
+    batch_size -- count of events per INSERT statement
+    copy_threshold -- minimal count of events to load them with COPY
+    workers -- count of parser processes, 1 parses in watcher itself
+    max_wait -- seconds to wait for changes before checking file anyway
+    provision_rules -- create placeholder Rule for alerts of unknown rules,
+    otherwise such alerts are saved as dead letters
+    spool_dir -- directory of spool for alerts which database did not take
+    db_timeout -- seconds a statement may take before database is
+    considered lagging and alerts are spooled
+    drain_batch_size -- minimal count of spooled events saved at once
+    retry_interval -- seconds between attempts to drain spool
+    tailer_class -- reader of new data of watch_file
+    parse -- function which parses chunk of data into alert rows
+    and rejected lines, it runs in parser workers
     """
     watch_file: str = '/var/log/snort/alert_json.txt'
     current_position_file: str = '/var/log/snort/current_alerts.txt'
+    checkpoint_name: str = 'alert_json'
+    max_wait: float = 5.0
+    provision_rules: bool = True
+    spool_dir: str = settings.ALERT_SPOOL_DIR
+    db_timeout: float = 10.0
+    drain_batch_size: int = 20000
+    retry_interval: float = 5.0
+    tailer_class: type = Tailer
+    parse = staticmethod(parse_chunk)
 
-    def __init__(self):
-        """Create Lock for instance"""
+    def __init__(self, batch_size: int = 1000, copy_threshold: int = COPY_THRESHOLD, workers: int = 1):
+        """Create Lock, Tailer, Spool and Rule cache for instance"""
         self.lock = threading.Lock()
+        self.batch_size = batch_size
+        self.copy_threshold = copy_threshold
+        self.workers = workers
+        self.pool = None
+        self.rules = RuleCache()
+        self.tailer = self.tailer_class(self.watch_file)
+        self.spool = Spool(self.spool_dir)
+        self.position = None
+        self.retry_at = 0.0
 
     def run(self):
         """Start watch in log file"""
         logger.info('Alert watcher running.')
+        connection_created.connect(self.set_statement_timeout)
+        if self.workers > 1:
+            self.start_pool()
+        self.load_rules()
+        latency = LatencyStats('Alert watcher')
         try:
             while True:
-                if os.path.exists(self.watch_file):
-                    self.read_data()
+                self.drain_spool()
+                if self.tailer.get_status() is not None:
+                    saved = self.read_data()
+                    latency.add(saved, time.monotonic() - self.tailer.changed_at)
                 else:
                     logger.error(f'{self.watch_file} file does not exist.')
-                time.sleep(5)
+                self.tailer.wait(self.retry_interval if not self.spool.is_empty() else self.max_wait)
         except KeyboardInterrupt:
             logger.info('Alert watcher stopped.')
+        finally:
+            self.tailer.close()
+            self.spool.close()
+            self.stop_pool()
+
+    def set_statement_timeout(self, sender, connection, **kwargs):
+        """Limit time of statements, so lagging database is noticed"""
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET statement_timeout = %s', [int(self.db_timeout * 1000)])
 
-    def read_data(self):
-        """Open file and read data"""
+    @staticmethod
+    def close_broken_connection():
+        """Close connection broken by database failure, so it is reopened"""
+        if connection.connection is not None and not connection.is_usable():
+            connection.close()
+
+    def load_rules(self):
+        """Load rule cache at start, if database is available"""
         try:
-            with self.lock:
-                with open(self.watch_file, encoding='latin-1') as file:
-                    file.seek(self.get_current_position())
-                    new_data = file.readlines()
-                    self.save_current_position(file.tell())
+            self.rules.load()
+        except DATABASE_ERRORS as e:
+            # rule cache is loaded on the first miss, alerts are spooled meanwhile
+            logger.warning(f'Database is not available, rules are not loaded: {e}')
+            self.close_broken_connection()
 
-                if new_data:
-                    self.save_data(new_data)
+    def start_pool(self):
+        """Start parser workers
+
+        Database connections are closed first, so forked
+        workers do not share them.
+        """
+        connections.close_all()
+        self.pool = multiprocessing.Pool(self.workers)
+        logger.info(f'Alert watcher uses {self.workers} parser workers.')
+
+    def stop_pool(self):
+        """Stop parser workers"""
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def read_data(self) -> int:
+        """Read new data, following rotation of file
+
+        :return: Count of saved events
+        """
+        saved = 0
+        try:
+            with self.lock:
+                chunks = self.tailer.read(self.get_position())
+                if self.pool is None:
+                    for new_data, checkpoint in chunks:
+                        saved += self.store(*self.parse(new_data), checkpoint)
+                else:
+                    saved += self.save_in_pipeline(chunks)
 
+        except FileNotFoundError:
+            logger.error(f'{self.watch_file} file does not exist.')
         except PermissionError:
             logger.error(f'Set up permissions for {self.watch_file}!')
+        except DATABASE_ERRORS as e:
+            logger.error(f'Database is not available: {e}')
+            self.close_broken_connection()
+        return saved
 
-    @staticmethod
-    def save_data(data: list):
-        """Save data into database"""
-        for line in data:
+    def save_in_pipeline(self, chunks) -> int:
+        """Parse chunks in parser workers and save them in order
+
+        Watcher reads chunks and submits them to workers, while
+        it saves parsed chunks. At most 2 chunks per worker are
+        pending, so reading waits for writing (backpressure).
+        :param chunks: Iterator of (bytes, Checkpoint)
+        :return: Count of saved events
+        """
+        saved = 0
+        pending = deque()
+        for new_data, checkpoint in chunks:
+            pending.append((self.pool.apply_async(self.parse, (new_data,)), checkpoint))
+            if len(pending) >= 2 * self.workers:
+                result, parsed_checkpoint = pending.popleft()
+                saved += self.store(*result.get(), parsed_checkpoint)
+        while pending:
+            result, parsed_checkpoint = pending.popleft()
+            saved += self.store(*result.get(), parsed_checkpoint)
+        return saved
+
+    def save_data(self, data: list, checkpoint: Checkpoint = None) -> int:
+        """Save data into database
+
+        Lines are parsed into events and inserted in batches
+        within a single transaction, together with checkpoint
+        of position after these lines.
+        :return: Count of saved events
+        """
+        return self.store(*parse_alerts(data), checkpoint)
+
+    def store(self, alerts: list, rejected: list, checkpoint: Checkpoint = None) -> int:
+        """Save parsed alerts or append them to spool
+
+        Alerts go to spool if database fails or lags, and while
+        spool is not empty, so they are saved in order.
+        :param alerts: Rows made by parse_alerts
+        :param rejected: (reason, line) pairs of lines which were not parsed
+        :param checkpoint: Position after these alerts
+        :return: Count of saved events
+        """
+        for reason, line in rejected:
+            logger.error(f'{DeadLetter.Reason(reason).label}: {line}')
+
+        if self.spool.is_empty():
             try:
-                event_data = json.loads(line)
-
-                # drop unuseful fields
-                allowed_fields = ['src_addr', 'src_port', 'dst_addr', 'dst_port',
-                                  'proto', 'seconds', 'sid', 'rev', 'gid']
-                event_data = {key: value for key, value in event_data.items() if key in allowed_fields}
-
-                # save event
-                timestamp = make_aware(datetime.fromtimestamp(event_data.pop('seconds')))
-                rule = Rule.get_rule(event_data.pop('sid'), event_data.pop('rev'), event_data.pop('gid'))
-                new_event = Event(**event_data)
-                new_event.rule = rule
-                new_event.timestamp = timestamp
-                new_event.save()
-
-            except KeyError:
-                logger.error(f'Event has no full required information: {line}')
-            except Http404:
-                logger.error(f'There is no Rule matches with event: {line}')
-            except JSONDecodeError:
-                logger.error(f'There is decoding error: {line}')
+                saved = self.save_alerts(alerts, rejected, checkpoint)
+                self.position = checkpoint or self.position
+                return saved
+            except DATABASE_ERRORS as e:
+                logger.warning(f'Database is not available, alerts are spooled: {e}')
+                self.close_broken_connection()
+                self.retry_at = time.monotonic() + self.retry_interval
+
+        self.spool.append((alerts, rejected, checkpoint.to_dict() if checkpoint else None))
+        self.spool.write_status()
+        self.position = checkpoint or self.position
+        return self.drain_spool()
+
+    def drain_spool(self) -> int:
+        """Save spooled alerts in big batches
+
+        Sequence of the last saved spool record is saved in the
+        same transaction, so nothing is saved twice after restart.
+        Attempts are made not more often than retry_interval.
+        :return: Count of saved events
+        """
+        if self.spool.is_empty() or time.monotonic() < self.retry_at:
+            return 0
+        saved = 0
+        started = time.monotonic()
+        try:
+            drained = LogCheckpoint.get_position(self.spool_checkpoint_name)
+            records = self.spool.read(drained['offset'] if drained else 0)
+            alerts, rejected, checkpoint, last_sequence = [], [], None, None
+            for sequence, (record_alerts, record_rejected, position) in records:
+                alerts += record_alerts
+                rejected += record_rejected
+                checkpoint = position or checkpoint
+                last_sequence = sequence
+                if len(alerts) >= self.drain_batch_size:
+                    saved += self.save_spooled(alerts, rejected, checkpoint, sequence)
+                    alerts, rejected, last_sequence = [], [], None
+            if last_sequence is not None:
+                saved += self.save_spooled(alerts, rejected, checkpoint, last_sequence)
+            self.spool.remove_through(self.spool.sequence)
+        except DATABASE_ERRORS as e:
+            logger.warning(f'Database is not available, {self.spool.records} records stay in spool: {e}')
+            self.close_broken_connection()
+            self.retry_at = time.monotonic() + self.retry_interval
+
+        if saved:
+            self.spool.drain_rate = saved / (time.monotonic() - started)
+            logger.info(f'Drained {saved} events from spool at {self.spool.drain_rate:.0f} events/sec, '
+                        f'{self.spool.records} records left.')
+        self.spool.write_status()
+        return saved
+
+    def save_spooled(self, alerts: list, rejected: list, position: dict, sequence: int) -> int:
+        """Save spooled alerts with sequence of the last spool record"""
+        with transaction.atomic():
+            saved = self.save_alerts(alerts, rejected, Checkpoint(**position) if position else None)
+            LogCheckpoint.save_position(self.spool_checkpoint_name, {'offset': sequence})
+        self.spool.remove_through(sequence)
+        return saved
+
+    @property
+    def spool_checkpoint_name(self) -> str:
+        """Name of LogCheckpoint with sequence of the last saved spool record"""
+        return f'{self.checkpoint_name}.spool'
+
+    def save_alerts(self, alerts: list, rejected: list, checkpoint: Checkpoint = None) -> int:
+        """Map parsed alerts to rules and save them as events
+
+        Rejected lines and alerts of unknown rules are saved
+        into dead-letter table. If database rejects values of
+        the batch, its alerts are saved one by one and only the
+        rejected ones become dead letters, so a bad alert does not
+        stop reading of the file and does not take others. Rule cache
+        is reloaded once if cached rules were deleted meanwhile.
+        :param alerts: Rows made by parse_alerts
+        :param rejected: (reason, line) pairs of lines which were not parsed
+        :param checkpoint: Position after these alerts
+        :return: Count of saved events
+        """
+        try:
+            return self.rules.call_with_reload(self.save_mapped, alerts, rejected, checkpoint)
+        except DATA_ERRORS as e:
+            logger.error(f'Database rejected values of {len(alerts)} alerts, they are saved one by one: {e}')
+            # placeholder rules made for the batch are rolled back
+            self.rules.load()
+            return self.save_one_by_one(alerts, rejected, checkpoint)
+
+    def save_one_by_one(self, alerts: list, rejected: list, checkpoint: Checkpoint = None) -> int:
+        """Save alerts each in its own savepoint
+
+        Only alerts which database rejects are saved as dead letters.
+        """
+        saved = 0
+        rejected = list(rejected)
+        with transaction.atomic():
+            for alert in alerts:
+                try:
+                    saved += self.rules.call_with_reload(self.save_mapped, [alert], [])
+                except DATA_ERRORS as e:
+                    logger.error(f'Database rejected values of alert, it is saved as dead letter: {e}')
+                    self.rules.load()
+                    rejected.append((DeadLetter.Reason.INVALID, dump_alert(alert)))
+            save_events([], self.batch_size, self.checkpoint_name, checkpoint, rejected=rejected)
+        return saved
+
+    def save_mapped(self, alerts: list, rejected: list, checkpoint: Checkpoint = None) -> int:
+        """Map alerts to rules and save them in one transaction"""
+        rows = []
+        rejected = list(rejected)
+        with transaction.atomic():
+            for alert in alerts:
+                timestamp, sid, rev, gid, src_addr, src_port, dst_addr, dst_port, proto, msg, action = alert
+                try:
+                    rule_id = self.rules.get_rule_id(sid, rev, gid)
+                except Http404:
+                    if not self.provision_rules:
+                        logger.error(f'There is no Rule matches with event: sid {sid}, rev {rev}, gid {gid}')
+                        rejected.append((DeadLetter.Reason.NO_RULE, dump_alert(alert)))
+                        continue
+                    rule_id = self.rules.provision(sid, rev, gid, msg, action)
+                rows.append((rule_id, timestamp, src_addr, src_port, dst_addr, dst_port, proto))
+            return save_events(rows, self.batch_size, self.checkpoint_name, checkpoint, self.copy_threshold,
+                               rejected)
+
+    def get_position(self) -> Checkpoint:
+        """Get position to read from
+
+        It is kept in memory, at start it is taken from the last
+        spooled record or from database.
+        """
+        if self.position is None:
+            if not self.spool.is_empty() and self.spool.last_record[2] is not None:
+                self.position = Checkpoint(**self.spool.last_record[2])
+            else:
+                self.position = self.get_current_position()
+        return self.position
 
     @classmethod
-    def get_current_position(cls) -> int:
-        """Get current position from file if it already exists."""
+    def get_current_position(cls) -> Checkpoint:
+        """Get current position from database
+
+        Position file of old versions is used if database
+        has no position yet.
+        """
+        position = LogCheckpoint.get_position(cls.checkpoint_name)
+        if position is not None:
+            return Checkpoint(**position)
+        if cls.current_position_file is None:
+            return Checkpoint()
         try:
             with open(cls.current_position_file, 'r') as f:
-                return int(f.read().strip())
+                return Checkpoint.loads(f.read().strip())
         except FileNotFoundError:
-            return 0
+            return Checkpoint()
 
-    @classmethod
-    def save_current_position(cls, position: int):
-        """Save current position"""
-        with open(cls.current_position_file, 'w') as f:
-            f.write(str(position))
+
+class Unified2Watch(OnMyWatch):
+    """Watch unified2 files of Snort
+
+    Snort unified2 logger writes binary records into files
+    <watch_file>.<timestamp>, they are read in order of their
+    timestamps. Event records are saved like lines of alert_json,
+    but they have no message and action, so placeholder rules
+    provisioned for them are filled by the next rule update.
+    """
+    watch_file: str = '/var/log/snort/unified2.log'
+    current_position_file: str = None
+    checkpoint_name: str = 'unified2'
+    spool_dir: str = settings.UNIFIED2_SPOOL_DIR
+    tailer_class: type = Unified2Reader
+    parse = staticmethod(parse_unified2)
 
 
 if __name__ == '__main__':
-    watcher = OnMyWatch()
+    parser = argparse.ArgumentParser(description='Watch Snort alerts and save them into database.')
+    parser.add_argument('--batch-size', type=int, default=1000, help='count of events per INSERT statement')
+    parser.add_argument('--copy-threshold', type=int, default=COPY_THRESHOLD,
+                        help='minimal count of events in a chunk to load them with COPY')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='count of parser processes, more than 1 turns on pipeline mode')
+    parser.add_argument('--format', choices=['json', 'unified2'], default='json',
+                        help='read alert_json file or unified2 files of Snort')
+    args = parser.parse_args()
+
+    watcher_class = Unified2Watch if args.format == 'unified2' else OnMyWatch
+    watcher = watcher_class(batch_size=args.batch_size, copy_threshold=args.copy_threshold, workers=args.workers)
     watcher.run()
@@ -7,11 +7,14 @@ from datetime import datetime
 from json import JSONDecodeError
 
 import django
+from django.db import transaction
 from django.utils.timezone import make_aware
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "snort3_monitor.settings")
 django.setup()
+from monitor.models import LogCheckpoint
 from performance_log.models import Performance
+from tailer import Checkpoint, LatencyStats, Tailer
 
 
 logger = logging.getLogger('monitor')
@@ -20,74 +23,99 @@ logger = logging.getLogger('monitor')
 class OnMyWatch:
     log_file: str = '/var/log/snort/perf_monitor_base.json'
     current_position_file: str = '/var/log/snort/current_perf.txt'
+    checkpoint_name: str = 'perf_monitor_base'
+    max_wait: float = 20.0
 
     def __init__(self):
         self.lock = threading.Lock()
-        self.log_size = 0
+        self.tailer = Tailer(self.log_file, is_complete=is_complete_record)
 
     def run(self):
         """Watch into a log file"""
         logger.info('Performance watcher running.')
+        latency = LatencyStats('Performance watcher')
         try:
             while True:
                 try:
-                    self.check_if_file_was_replaced()
-                    self.read_data()
+                    saved = self.read_data()
+                    latency.add(saved, time.monotonic() - self.tailer.changed_at)
                 except FileNotFoundError:
                     logger.error(f'{self.log_file} does not exist.')
                 finally:
-                    time.sleep(20)
+                    self.tailer.wait(self.max_wait)
         except KeyboardInterrupt:
             logger.info('Performance watcher stopped.')
+        finally:
+            self.tailer.close()
 
-    def read_data(self):
-        """Open file, read and prepare data for saving"""
+    def read_data(self) -> int:
+        """Read new data, following rotation of file, and prepare it for saving
+
+        :return: Count of saved records
+        """
+        saved = 0
         try:
             with self.lock:
-                with open(self.log_file, encoding='latin-1') as file:
-                    file.seek(self.get_current_position())
-                    new_data = file.read()
-                    self.save_current_position(file.tell())
-                new_data = new_data.strip('[],\n ')
-                if new_data:
-                    self.save_data('[' + new_data + ']')
+                for new_data, checkpoint in self.tailer.read(self.get_current_position()):
+                    new_data = new_data.decode('latin-1').strip('[],\n ')
+                    saved += self.save_data('[' + new_data + ']', checkpoint)
         except PermissionError:
             logger.error(f'Set up permissions for {self.log_file}!')
+        return saved
+
+    def save_data(self, data: str, checkpoint: Checkpoint = None) -> int:
+        """Save data into a database
 
-    @staticmethod
-    def save_data(data: str):
-        """Save data into a database"""
+        Records are saved in one transaction together
+        with checkpoint of position after them.
+        :return: Count of saved records
+        """
+        records = []
         try:
             data = json.loads(data)
             for record in data:
                 timestamp = make_aware(datetime.fromtimestamp(record.pop('timestamp')))
                 for module, pegcounts in record.items():
-                    Performance.objects.create(timestamp=timestamp, module=module, pegcounts=pegcounts)
+                    records.append(Performance(timestamp=timestamp, module=module, pegcounts=pegcounts))
         except JSONDecodeError as e:
             logger.error(e)
 
-    def check_if_file_was_replaced(self):
-        """Check if new file was created and update log size"""
-        new_log_size = os.path.getsize(self.log_file)
-        if new_log_size < self.log_size:
-            self.save_current_position(0)
-            logger.info('Switched to a new file')
-        self.log_size = new_log_size
+        with transaction.atomic():
+            Performance.objects.bulk_create(records)
+            if checkpoint is not None:
+                LogCheckpoint.save_position(self.checkpoint_name, checkpoint.to_dict())
+        return len(records)
 
     @classmethod
-    def get_current_position(cls) -> int:
-        """Get current position from file if it already exists."""
+    def get_current_position(cls) -> Checkpoint:
+        """Get current position from database
+
+        Position file of old versions is used if database
+        has no position yet.
+        """
+        position = LogCheckpoint.get_position(cls.checkpoint_name)
+        if position is not None:
+            return Checkpoint(**position)
         try:
             with open(cls.current_position_file, 'r') as f:
-                return int(f.read().strip())
+                return Checkpoint.loads(f.read().strip())
         except FileNotFoundError:
-            return 0
+            return Checkpoint()
 
-    @classmethod
-    def save_current_position(cls, position: int):
-        """Save current position"""
-        with open(cls.current_position_file, 'w') as f:
-            f.write(str(position))
+
+def is_complete_record(line: bytes) -> bool:
+    """Check if last line of perf log is a whole JSON record
+
+    Snort writes the newline of a record before the next one,
+    so a record is read once it can be decoded, while a record
+    which is still being written is held back.
+    """
+    data = line.decode('latin-1').strip('[],\n ')
+    try:
+        json.loads(data)
+    except JSONDecodeError:
+        return False
+    return True
 
 
 if __name__ == '__main__':